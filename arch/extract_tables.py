@@ -5,6 +5,7 @@ using Camelot and convert to a structured JSON format.
 
 Dependencies:
     - camelot-py
+    - pypdf (installed with camelot-py)
     - opencv-python
     - ghostscript
     - pdf2image
@@ -12,29 +13,218 @@ Dependencies:
 """
 
 import camelot
+import hashlib
 import json
+import os
+import pickle
 import sys
 import argparse
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from pypdf import PdfReader
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
 
-def extract_tables(pdf_path, output_path):
+# Pages extracted by default; the table_N.csv numbering follows from them
+DEFAULT_PAGES = "1-7"
+
+# Camelot parameters; changing them re-extracts every page
+CAMELOT_PARAMS = {
+    "flavor": "lattice",  # Use lattice for table with lines
+    "line_scale": 40,     # Adjust based on the PDF's table lines
+}
+
+# Format version of cached pages
+CACHE_VERSION = 2
+
+# Page attributes that change how a page is laid out, besides its content and resources
+PAGE_GEOMETRY = ("/MediaBox", "/CropBox", "/Rotate")
+
+# File in the cache directory recording the hash of each output file's last extracted text
+OUTPUT_HASHES = "outputs.json"
+
+
+def _hash_object(obj, digest, seen):
+    """Feed a PDF object, following references and stream data, into a hash."""
+    if isinstance(obj, IndirectObject):
+        ref = (obj.idnum, obj.generation)
+        if ref in seen:
+            digest.update(b"R")
+            return
+        seen.add(ref)
+        obj = obj.get_object()
+    if isinstance(obj, StreamObject):
+        digest.update(b"S")
+        digest.update(obj.get_data())
+    if isinstance(obj, DictionaryObject):
+        digest.update(b"D")
+        for key in sorted(obj):
+            digest.update(key.encode())
+            _hash_object(obj.raw_get(key), digest, seen)
+        digest.update(b"E")
+    elif isinstance(obj, ArrayObject):
+        digest.update(b"A")
+        for item in obj:
+            _hash_object(item, digest, seen)
+        digest.update(b"E")
+    else:
+        digest.update(repr(obj).encode())
+
+
+def _page_hashes(pdf_path):
+    """Return the SHA-256 of each page's content stream, resources and geometry, in page order."""
+    hashes = []
+    for page in PdfReader(pdf_path).pages:
+        digest = hashlib.sha256()
+        contents = page.get_contents()
+        digest.update(contents.get_data() if contents is not None else b"")
+        # PdfReader copies attributes inherited from the page tree onto each page
+        for name in ("/Resources",) + PAGE_GEOMETRY:
+            digest.update(name.encode())
+            _hash_object(page.raw_get(name) if name in page else None, digest, set())
+        hashes.append(digest.hexdigest())
+    return hashes
+
+
+def _page_key(page_hash, params):
+    """Return the cache key of a page: the page's own contents and the Camelot parameters."""
+    key = json.dumps({"version": CACHE_VERSION, "page": page_hash, "params": params}, sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def parse_pages(text):
+    """Parse a page list such as "1-3,7" into page numbers."""
+    pages = []
+    for part in text.split(","):
+        first, _, last = part.partition("-")
+        pages.extend(range(int(first), int(last or first) + 1))
+    return pages
+
+
+def _extract_page(pdf_path, page, params):
+    """Extract the tables of one page (runs in a worker process).
+
+    Returns:
+        The DataFrame of each table on the page, in order
+    """
+    tables = camelot.read_pdf(str(pdf_path), pages=str(page), **params)
+    return [table.df for table in tables]
+
+
+def _load_output_hashes(cache_dir):
+    """Return the recorded output hashes (resolved path -> SHA-256), empty if unreadable."""
+    try:
+        with open(Path(cache_dir) / OUTPUT_HASHES) as f:
+            hashes = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return hashes if isinstance(hashes, dict) else {}
+
+
+def _save_output_hashes(cache_dir, hashes):
+    path = Path(cache_dir) / OUTPUT_HASHES
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(hashes, indent=2, sort_keys=True))
+    os.replace(tmp_path, path)
+
+
+def _write_if_changed(path, text, output_hashes):
+    """Write text to path unless it is what the previous extraction wrote there.
+
+    The comparison is against the recorded hash of the previous extraction
+    output, not the file, so hand corrections to a file survive rebuilds
+    until the extraction itself changes.
+
+    Returns:
+        Whether the file was written
+    """
+    path = Path(path)
+    key = str(path.resolve())
+    text_hash = hashlib.sha256(text.encode()).hexdigest()
+    if output_hashes.get(key) == text_hash and path.exists():
+        return False
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(text)
+    os.replace(tmp_path, path)
+    output_hashes[key] = text_hash
+    return True
+
+
+def extract_page_tables(pdf_path, cache_dir, pages=None, params=CAMELOT_PARAMS, jobs=None):
+    """
+    Extract the tables of each page, re-running Camelot only for pages not in the cache.
+
+    Pages are extracted in a process pool. Each page's DataFrames are cached
+    under a key made from a hash of that page's content stream, resources
+    and geometry, and the Camelot parameters, so editing one page of the PDF
+    or the parameters only re-extracts the pages they affect.
+
+    Args:
+        pdf_path: Path to the unSP Instruction Set Summary PDF
+        cache_dir: Directory to cache extracted pages in
+        pages: The page numbers (from 1) to extract (default: DEFAULT_PAGES)
+        params: The Camelot parameters
+        jobs: The number of worker processes (default: all cores)
+
+    Returns:
+        The DataFrames of all tables, in page order
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    page_hashes = _page_hashes(pdf_path)
+    if pages is None:
+        pages = parse_pages(DEFAULT_PAGES)
+    for page in pages:
+        if not 1 <= page <= len(page_hashes):
+            raise ValueError(f"page {page} is out of range (the PDF has {len(page_hashes)} pages)")
+    cache_files = {page: cache_dir / f"{_page_key(page_hashes[page - 1], params)}.pickle" for page in pages}
+
+    page_tables = {}
+    missing = []
+    for page in pages:
+        try:
+            with open(cache_files[page], 'rb') as f:
+                page_tables[page] = pickle.load(f)
+        except Exception:
+            # Unreadable, truncated or written by incompatible library versions
+            missing.append(page)
+
+    print(f"{len(pages) - len(missing)} pages cached, extracting {len(missing)}...")
+    if missing:
+        with ProcessPoolExecutor(max_workers=min(jobs or os.cpu_count() or 1, len(missing))) as executor:
+            futures = {page: executor.submit(_extract_page, pdf_path, page, params) for page in missing}
+            for page, future in futures.items():
+                page_tables[page] = future.result()
+                cache_file = cache_files[page]
+                tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+                with open(tmp_file, 'wb') as f:
+                    pickle.dump(page_tables[page], f)
+                os.replace(tmp_file, cache_file)
+
+    return [df for page in pages for df in page_tables[page]]
+
+
+def extract_tables(pdf_path, output_path, cache_dir=None, jobs=None, pages=None):
     """
     Extract tables from the PDF and convert to JSON format.
+
+    Only pages that changed since the last run are re-extracted, and an
+    output file is only rewritten when the extraction produces something
+    different from last time, leaving hand corrections in place otherwise.
     
     Args:
         pdf_path: Path to the unSP Instruction Set Summary PDF
         output_path: Path to save the output JSON file
+        cache_dir: Directory to cache extracted pages in (default: __pycache__/tables next to the output)
+        jobs: The number of worker processes (default: all cores)
+        pages: The page numbers (from 1) to extract (default: DEFAULT_PAGES)
     """
     print(f"Extracting tables from {pdf_path}...")
     
-    # Extract tables from all pages (PDF only has 7 pages total)
-    tables = camelot.read_pdf(
-        pdf_path, 
-        pages='1-7',
-        flavor='lattice',  # Use lattice for table with lines
-        line_scale=40,     # Adjust based on the PDF's table lines
-    )
+    if cache_dir is None:
+        cache_dir = output_path.parent / "__pycache__" / "tables"
+    tables = extract_page_tables(pdf_path, cache_dir, pages, jobs=jobs)
+    output_hashes = _load_output_hashes(cache_dir)
     
     print(f"Found {len(tables)} tables")
     
@@ -45,12 +235,11 @@ def extract_tables(pdf_path, output_path):
     }
     
     # Process each table
-    for i, table in enumerate(tables):
+    for i, df in enumerate(tables):
         print(f"Processing table {i+1}...")
-        df = table.df
         
         # Save raw CSV for debugging
-        df.to_csv(f"{output_path.parent}/table_{i+1}.csv")
+        _write_if_changed(f"{output_path.parent}/table_{i+1}.csv", df.to_csv(), output_hashes)
         
         # Process the table based on its structure
         # This will need to be customized based on the actual table structure
@@ -59,12 +248,14 @@ def extract_tables(pdf_path, output_path):
         elif "register" in df.iloc[0, 0].lower():  # Register table
             process_register_table(df, instruction_set)
     
-    # Save the extracted data to JSON
-    with open(output_path, 'w') as f:
-        json.dump(instruction_set, f, indent=2)
-    
-    print(f"Saved instruction set data to {output_path}")
-    print(f"Please manually review and correct the JSON data!")
+    # Save the extracted data to JSON, leaving the file (and any corrections to it)
+    # untouched if the extraction is the same as last time
+    if _write_if_changed(output_path, json.dumps(instruction_set, indent=2), output_hashes):
+        print(f"Saved instruction set data to {output_path}")
+        print(f"Please manually review and correct the JSON data!")
+    else:
+        print(f"{output_path} is up to date")
+    _save_output_hashes(cache_dir, output_hashes)
 
 
 def process_instruction_table(df, instruction_set):
@@ -139,6 +330,11 @@ def main():
     parser.add_argument("pdf_file", help="Path to the unSP Instruction Set Summary PDF")
     parser.add_argument("-o", "--output", default="unsp_instruction_set.json",
                         help="Output JSON file path (default: unsp_instruction_set.json)")
+    parser.add_argument("--cache-dir", help="Directory to cache extracted pages in "
+                                            "(default: __pycache__/tables next to the output)")
+    parser.add_argument("--jobs", type=int, default=0, help="Number of worker processes (default: 0, all cores)")
+    parser.add_argument("--pages", type=parse_pages,
+                        help=f"Pages to extract, such as 1-3,7 (default: {DEFAULT_PAGES})")
     
     args = parser.parse_args()
     
@@ -149,7 +345,7 @@ def main():
         print(f"Error: PDF file not found: {pdf_path}")
         sys.exit(1)
     
-    extract_tables(pdf_path, output_path)
+    extract_tables(pdf_path, output_path, args.cache_dir, args.jobs or None, args.pages)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+"""
+Recursive-descent code discovery and cross-references for unSP images.
+
+Starting from entry points (the interrupt vectors and/or user-supplied
+addresses), the engine follows CALL/GOTO A22 targets and conditional branch
+displacements, stops at returns and indirect jumps, and groups the decoded
+instructions into basic blocks and functions. Unlike the linear sweep of
+``UnSPDisassembler.disassemble_file`` it does not decode data as code.
+
+Every word is decoded at most once: a bitmap marks words that belong to a
+decoded instruction, and tracing stops as soon as it reaches one. Block
+boundaries are only computed after tracing, so blocks never need splitting.
+
+The cross-reference index is built from decoded operands in a single sweep
+and answers "who references X" and "what does X reference" with bisection
+over sorted arrays, so no text output ever needs to be searched.
+"""
+
+import argparse
+import bisect
+import os
+from array import array
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from unsp_disassembler import (
+    UnSPDisassembler, mapped_words,
+    FLOW_NONE, FLOW_CALL, FLOW_JUMP, FLOW_BRANCH, FLOW_RETURN, FLOW_INDIRECT_JUMP,
+)
+
+
+# Interrupt vector table: word addresses holding 16-bit handler word addresses
+VECTORS = {
+    "BREAK": 0xFFF5,
+    "FIQ": 0xFFF6,
+    "RESET": 0xFFF7,
+    "IRQ0": 0xFFF8,
+    "IRQ1": 0xFFF9,
+    "IRQ2": 0xFFFA,
+    "IRQ3": 0xFFFB,
+    "IRQ4": 0xFFFC,
+    "IRQ5": 0xFFFD,
+    "IRQ6": 0xFFFE,
+    "IRQ7": 0xFFFF,
+}
+
+# Flow kinds after which execution does not continue with the next instruction
+_ENDS_TRACE = (FLOW_JUMP, FLOW_RETURN, FLOW_INDIRECT_JUMP)
+
+# Cross-reference kinds
+XREF_CALL = 0     # CALL A22
+XREF_JUMP = 1     # GOTO A22, or an unconditional relative branch
+XREF_BRANCH = 2   # conditional relative branch
+XREF_DATA = 3     # A16 memory operand
+
+XREF_NAMES = ("call", "jump", "branch", "data")
+
+_XREF_BY_FLOW = {FLOW_CALL: XREF_CALL, FLOW_JUMP: XREF_JUMP, FLOW_BRANCH: XREF_BRANCH}
+
+
+class BasicBlock:
+    """A maximal straight-line run of instructions with one entry."""
+
+    __slots__ = ("start", "end", "successors", "calls")
+
+    def __init__(self, start: int, end: int = 0):
+        self.start = start
+        self.end = end                        # address after the last instruction
+        self.successors: List[int] = []       # addresses of blocks control can flow to
+        self.calls: List[int] = []            # direct call targets made from the block
+
+    def __repr__(self) -> str:
+        return f"BasicBlock(0x{self.start:x}-0x{self.end:x})"
+
+
+class Function:
+    """The blocks reachable from an entry point without following calls."""
+
+    __slots__ = ("entry", "blocks")
+
+    def __init__(self, entry: int, blocks: List[int]):
+        self.entry = entry
+        self.blocks = blocks                  # block start addresses, sorted
+
+    def __repr__(self) -> str:
+        return f"Function(0x{self.entry:x}, {len(self.blocks)} blocks)"
+
+
+class BlockMap:
+    """Non-overlapping basic blocks ordered by address, with interval lookups."""
+
+    def __init__(self, blocks: Iterable[BasicBlock]):
+        self._blocks = sorted(blocks, key=lambda block: block.start)
+        self._starts = array("Q", (block.start for block in self._blocks))
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def __iter__(self) -> Iterator[BasicBlock]:
+        return iter(self._blocks)
+
+    def __getitem__(self, start: int) -> BasicBlock:
+        block = self.block_at(start)
+        if block is None or block.start != start:
+            raise KeyError(start)
+        return block
+
+    def block_at(self, address: int) -> Optional[BasicBlock]:
+        """Find the block containing an address.
+
+        Args:
+            address: The address to look up
+
+        Returns:
+            The block covering the address, or None
+        """
+        i = bisect.bisect_right(self._starts, address) - 1
+        if i >= 0 and address < self._blocks[i].end:
+            return self._blocks[i]
+        return None
+
+
+class CodeDiscovery:
+    """Worklist-driven recursive-descent disassembly of one image."""
+
+    def __init__(self, disassembler: UnSPDisassembler, words: Sequence[int], base_address: int = 0):
+        """Prepare to trace an image.
+
+        Args:
+            disassembler: The disassembler whose decoders are used
+            words: The image as a sequence of 16-bit words
+            base_address: The address of words[0]
+        """
+        self.disassembler = disassembler
+        self.base_address = base_address
+        self.entry_points: List[int] = []
+        self.call_targets: Set[int] = set()
+        self.external_targets: Set[int] = set()   # targets outside the image
+        self.invalid: Set[int] = set()            # traced addresses that do not decode
+        self.conflicts: Set[int] = set()          # traced addresses inside another instruction
+        self.blocks = BlockMap(())
+        self.functions: Dict[int, Function] = {}
+
+        self._words = words
+        self._count = len(words)
+        self._visited = bytearray(len(words))     # 1 for every word of a decoded instruction
+        self._sizes = bytearray(len(words))       # instruction size in words, at its first word
+        self._starts = array("I")                 # word indexes of decoded instructions
+        self._flow: Dict[int, Tuple[int, Optional[int]]] = {}
+        self._leaders: Set[int] = set()
+        self._worklist: deque = deque()
+
+    def _index(self, address: int) -> Optional[int]:
+        """Convert an address to a word index in the image, or None if outside it."""
+        offset = address - self.base_address
+        if offset < 0 or offset & 1 or offset // 2 >= self._count:
+            return None
+        return offset // 2
+
+    def add_entry_point(self, address: int):
+        """Queue an address to be traced as a function entry."""
+        self.entry_points.append(address)
+        index = self._index(address)
+        if index is None:
+            self.external_targets.add(address)
+            return
+        self._leaders.add(index)
+        self._worklist.append(index)
+
+    def add_vector_entry_points(self) -> Dict[str, int]:
+        """Queue the handlers of the interrupt vectors the image covers.
+
+        Returns:
+            The handler address of each vector found in the image, by name
+        """
+        handlers = {}
+        for name, vector in VECTORS.items():
+            index = self._index(2 * vector)
+            if index is not None:
+                handlers[name] = 2 * self._words[index]
+                self.add_entry_point(handlers[name])
+        return handlers
+
+    def run(self):
+        """Trace everything reachable from the queued entry points, then build blocks and functions."""
+        while self._worklist:
+            self._trace(self._worklist.popleft())
+        self._build_blocks()
+        self._build_functions()
+
+    def _trace(self, index: int):
+        """Decode forward from a word until control no longer falls through."""
+        words = self._words
+        table = self.disassembler.decoder_table
+        visited = self._visited
+        count = len(words)
+        base_address = self.base_address
+
+        while index < count:
+            if visited[index]:
+                # Joined an already traced path, or landed inside an instruction
+                if self._sizes[index]:
+                    self._leaders.add(index)
+                else:
+                    self.conflicts.add(base_address + 2 * index)
+                return
+
+            word = words[index]
+            decoder = table[word]
+            size = 0 if decoder is None else decoder.size // 2
+            if size == 0 or index + size > count:
+                self.invalid.add(base_address + 2 * index)
+                return
+            if size == 2 and visited[index + 1]:
+                self.conflicts.add(base_address + 2 * index)
+                return
+
+            visited[index] = 1
+            if size == 2:
+                visited[index + 1] = 1
+            self._sizes[index] = size
+            self._starts.append(index)
+
+            address = base_address + 2 * index
+            operands = decoder.decode(word, words[index + 1] if size == 2 else 0)
+            kind, target = decoder.control_flow(address, operands)
+            if kind != FLOW_NONE:
+                self._flow[index] = (kind, target)
+
+            if target is not None:
+                target_index = self._index(target)
+                if kind == FLOW_CALL:
+                    self.call_targets.add(target)
+                if target_index is None:
+                    self.external_targets.add(target)
+                else:
+                    self._leaders.add(target_index)
+                    if not visited[target_index]:
+                        self._worklist.append(target_index)
+                    elif not self._sizes[target_index]:
+                        self.conflicts.add(target)
+
+            index += size
+            if kind in _ENDS_TRACE:
+                return
+            if kind == FLOW_BRANCH:
+                self._leaders.add(index)
+
+    def _build_blocks(self):
+        """Split the traced instructions into basic blocks."""
+        base_address = self.base_address
+        blocks = []
+        block = None
+        next_index = -1
+
+        for index in sorted(self._starts):
+            if block is not None and (index != next_index or index in self._leaders):
+                # Falls through into a new leader; a gap means tracing stopped
+                if index == next_index:
+                    block.successors.append(base_address + 2 * index)
+                blocks.append(block)
+                block = None
+
+            if block is None:
+                block = BasicBlock(base_address + 2 * index)
+            next_index = index + self._sizes[index]
+            block.end = base_address + 2 * next_index
+
+            kind, target = self._flow.get(index, (FLOW_NONE, None))
+            if kind == FLOW_CALL and target is not None:
+                block.calls.append(target)
+            elif kind in (FLOW_BRANCH, FLOW_JUMP, FLOW_RETURN, FLOW_INDIRECT_JUMP):
+                if target is not None:
+                    block.successors.append(target)
+                if kind == FLOW_BRANCH:
+                    block.successors.append(block.end)
+                blocks.append(block)
+                block = None
+
+        if block is not None:
+            blocks.append(block)
+        self.blocks = BlockMap(blocks)
+
+    def _build_functions(self):
+        """Group blocks into functions by walking successors from each entry."""
+        entries = set(self.entry_points) | self.call_targets
+        for entry in sorted(entries):
+            if self.blocks.block_at(entry) is None or self.blocks.block_at(entry).start != entry:
+                continue
+
+            members = set()
+            worklist = deque([entry])
+            while worklist:
+                start = worklist.popleft()
+                if start in members:
+                    continue
+                block = self.blocks.block_at(start)
+                if block is None or block.start != start:
+                    continue
+                members.add(start)
+                for successor in block.successors:
+                    # Jumps to another function's entry are tail calls
+                    if successor not in entries or successor == entry:
+                        worklist.append(successor)
+
+            self.functions[entry] = Function(entry, sorted(members))
+
+    def instruction_starts(self) -> Iterator[int]:
+        """Yield the address of every decoded instruction, in address order."""
+        for index in sorted(self._starts):
+            yield self.base_address + 2 * index
+
+    def is_code(self, address: int) -> bool:
+        """Whether an address lies within a decoded instruction."""
+        index = self._index(address & ~1)
+        return index is not None and bool(self._visited[index])
+
+
+class XrefIndex:
+    """Cross-references stored as parallel sorted arrays.
+
+    References are kept sorted by source and, separately, by target, so both
+    directions are answered by bisection. Addresses are byte addresses as in
+    the listing: A22 and A16 operands (word addresses) are doubled. A
+    backward branch near the start of the image can target a negative address.
+    """
+
+    def __init__(self):
+        self.sources = array("q")
+        self.targets = array("q")
+        self.kinds = array("B")
+        # The same references ordered by target
+        self._target_order_targets = array("q")
+        self._target_order_sources = array("q")
+        self._target_order_kinds = array("B")
+
+    def __len__(self) -> int:
+        return len(self.sources)
+
+    def add(self, source: int, target: int, kind: int):
+        """Record a reference (call finalize before querying)."""
+        self.sources.append(source)
+        self.targets.append(target)
+        self.kinds.append(kind)
+
+    def finalize(self):
+        """Sort the references for lookups by source and by target."""
+        if any(a > b for a, b in zip(self.sources, self.sources[1:])):
+            order = sorted(range(len(self.sources)), key=self.sources.__getitem__)
+            self.sources = array("q", (self.sources[i] for i in order))
+            self.targets = array("q", (self.targets[i] for i in order))
+            self.kinds = array("B", (self.kinds[i] for i in order))
+
+        order = sorted(range(len(self.targets)), key=self.targets.__getitem__)
+        self._target_order_targets = array("q", (self.targets[i] for i in order))
+        self._target_order_sources = array("q", (self.sources[i] for i in order))
+        self._target_order_kinds = array("B", (self.kinds[i] for i in order))
+
+    def refs_to(self, target: int, end: Optional[int] = None) -> List[Tuple[int, int, int]]:
+        """Find the references to an address (or to every address in [target, end)).
+
+        Returns:
+            (source, target, kind) tuples, ordered by target then source
+        """
+        targets = self._target_order_targets
+        lo = bisect.bisect_left(targets, target)
+        hi = bisect.bisect_left(targets, target + 1 if end is None else end)
+        return list(zip(self._target_order_sources[lo:hi], targets[lo:hi], self._target_order_kinds[lo:hi]))
+
+    def refs_from(self, source: int, end: Optional[int] = None) -> List[Tuple[int, int, int]]:
+        """Find the references made from an address (or from every address in [source, end)).
+
+        Returns:
+            (source, target, kind) tuples, ordered by source
+        """
+        lo = bisect.bisect_left(self.sources, source)
+        hi = bisect.bisect_left(self.sources, source + 1 if end is None else end)
+        return list(zip(self.sources[lo:hi], self.targets[lo:hi], self.kinds[lo:hi]))
+
+
+def build_xrefs(disassembler: UnSPDisassembler, source: Union[str, os.PathLike, bytes],
+                base_address: int = 0) -> XrefIndex:
+    """Build the cross-reference index of an image in one linear sweep.
+
+    Only instructions that can reference an address have their operands
+    decoded; nothing is rendered as text.
+
+    Args:
+        disassembler: The disassembler whose decoders are used
+        source: A file path, or the binary data itself (any buffer)
+        base_address: The address of the first byte of the image
+
+    Returns:
+        The finalized XrefIndex
+    """
+    xrefs = XrefIndex()
+    table = disassembler.decoder_table
+
+    # For each decoder: whether it has a direct target, and its A16 operand index
+    has_target = [decoder.flow in _XREF_BY_FLOW for decoder in disassembler.decoders]
+    a16_operand = [decoder.field_index.get("A16") for decoder in disassembler.decoders]
+
+    with mapped_words(source) as words:
+        count = len(words)
+        index = 0
+        while index < count:
+            decoder = table[words[index]]
+            if decoder is None:
+                index += 1
+                continue
+
+            size = decoder.size // 2
+            if index + size > count:
+                break
+
+            a16 = a16_operand[decoder.index]
+            if has_target[decoder.index] or a16 is not None:
+                address = base_address + 2 * index
+                operands = decoder.decode(words[index], words[index + 1] if size == 2 else 0)
+                kind, target = decoder.control_flow(address, operands)
+                if target is not None:
+                    xrefs.add(address, target, _XREF_BY_FLOW[kind])
+                if a16 is not None:
+                    xrefs.add(address, 2 * operands[a16], XREF_DATA)
+
+            index += size
+
+    xrefs.finalize()
+    return xrefs
+
+
+def discover_code(disassembler: UnSPDisassembler, source: Union[str, os.PathLike, bytes],
+                  base_address: int = 0, entry_points: Iterable[int] = (),
+                  vectors: bool = True) -> CodeDiscovery:
+    """Run recursive-descent code discovery over an image.
+
+    Args:
+        disassembler: The disassembler whose decoders are used
+        source: A file path, or the binary data itself (any buffer)
+        base_address: The address of the first byte of the image
+        entry_points: Addresses to start tracing from
+        vectors: Whether to also start from the interrupt vector handlers
+
+    Returns:
+        The finished CodeDiscovery, with blocks and functions built
+    """
+    with mapped_words(source) as words:
+        discovery = CodeDiscovery(disassembler, words, base_address)
+        if vectors:
+            discovery.add_vector_entry_points()
+        for address in entry_points:
+            discovery.add_entry_point(address)
+        discovery.run()
+        # Results must not keep the mapped image alive
+        discovery._words = ()
+    return discovery
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find unSP code, blocks and functions by recursive descent")
+    parser.add_argument("input_file", help="The binary file to analyze")
+    parser.add_argument("-b", "--base-address", type=lambda x: int(x, 0), default=0,
+                        help="The base address of the image (default: 0)")
+    parser.add_argument("-e", "--entry", type=lambda x: int(x, 0), action="append", default=[],
+                        help="Entry point address (can be repeated)")
+    parser.add_argument("--no-vectors", action="store_true",
+                        help="Do not start from the interrupt vector handlers")
+    parser.add_argument("--xrefs-to", type=lambda x: int(x, 0), action="append", default=[],
+                        help="List the references to an address instead (can be repeated)")
+    parser.add_argument("--xrefs-from", type=lambda x: int(x, 0), action="append", default=[],
+                        help="List the references from an address instead (can be repeated)")
+    parser.add_argument("-j", "--json", default="unsp_instruction_set.json",
+                        help="Path to the instruction set JSON file")
+
+    args = parser.parse_args()
+
+    disassembler = UnSPDisassembler(args.json)
+
+    if args.xrefs_to or args.xrefs_from:
+        xrefs = build_xrefs(disassembler, args.input_file, args.base_address)
+        refs = [ref for address in args.xrefs_to for ref in xrefs.refs_to(address)]
+        refs += [ref for address in args.xrefs_from for ref in xrefs.refs_from(address)]
+        for source, target, kind in refs:
+            print(f"{source:08x} -> {target:08x}  {XREF_NAMES[kind]}")
+        return
+    discovery = discover_code(disassembler, args.input_file, args.base_address, args.entry,
+                              not args.no_vectors)
+
+    for entry, function in sorted(discovery.functions.items()):
+        print(f"function {entry:08x}: {len(function.blocks)} blocks")
+        for start in function.blocks:
+            block = discovery.blocks[start]
+            successors = ", ".join(f"{successor:08x}" for successor in block.successors)
+            print(f"    {block.start:08x}-{block.end:08x}  -> {successors}")
+
+    print(f"{len(discovery.blocks)} blocks, {len(discovery.functions)} functions, "
+          f"{len(discovery.invalid)} invalid and {len(discovery.conflicts)} conflicting targets")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Batch disassembly of many unSP firmware dumps.
+
+Files are spread over a pool of worker processes, each of which loads the
+instruction set once and then disassembles whole files, so a batch scales
+with the number of cores instead of paying interpreter and spec start-up per
+file. Listings go either to one output file per input, or to a single
+combined output in which every line is tagged with its file. The combined
+output is written by a separate thread while the workers keep decoding.
+
+Per-file progress and timing, and a summary, are reported on stderr.
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterable, List, Optional, TextIO
+
+from unsp_disassembler import OUTPUT_BUFFER_SIZE, init_worker, worker_disassembler
+
+
+class BatchResult:
+    """The outcome of disassembling one file in a batch."""
+
+    __slots__ = ("input_file", "output_file", "size", "seconds", "error")
+
+    def __init__(self, input_file: str, output_file: Optional[str], size: int = 0, seconds: float = 0.0,
+                 error: Optional[str] = None):
+        self.input_file = input_file
+        self.output_file = output_file
+        self.size = size
+        self.seconds = seconds
+        self.error = error
+
+
+def expand_inputs(patterns: Iterable[str]) -> List[str]:
+    """Expand glob patterns (``**`` included) into a list of files, keeping their order.
+
+    A pattern without matches is kept as a path so that it is reported as
+    missing rather than skipped silently. Duplicates are removed, including
+    different spellings of the same file (``a.bin`` and ``./a.bin``, or a
+    symlink), which would otherwise race to write the same output.
+    """
+    files = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            real_path = os.path.realpath(path)
+            if os.path.isdir(path) or real_path in seen:
+                continue
+            seen.add(real_path)
+            files.append(path)
+    return files
+
+
+def output_paths(input_files: List[str], output_dir: str, suffix: str = ".asm") -> List[str]:
+    """Map input files to outputs in output_dir, mirroring their relative layout."""
+    directories = [os.path.dirname(os.path.abspath(path)) for path in input_files]
+    root = os.path.commonpath(directories) if directories else ""
+    return [os.path.join(output_dir, os.path.relpath(os.path.abspath(path), root) + suffix)
+            for path in input_files]
+
+
+def _disassemble_one(input_file: str, output_file: str, base_address: int) -> BatchResult:
+    """Disassemble one file to output_file (runs in a worker process)."""
+    start = time.perf_counter()
+    try:
+        size = os.path.getsize(input_file)
+        os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+        with open(output_file, 'w', buffering=OUTPUT_BUFFER_SIZE) as f:
+            worker_disassembler().write_listing(input_file, f, base_address)
+    except (OSError, ValueError) as e:
+        return BatchResult(input_file, output_file, error=str(e))
+    return BatchResult(input_file, output_file, size, time.perf_counter() - start)
+
+
+def _append_tagged(listing_file: str, tag: str, output: TextIO, first: bool):
+    """Copy a listing to the combined output, prefixing each line with its file."""
+    with open(listing_file, 'r', buffering=OUTPUT_BUFFER_SIZE) as f:
+        for line in f:
+            if not first:
+                output.write("\n")
+            first = False
+            output.write(tag)
+            output.write("\t")
+            output.write(line.rstrip("\n"))
+    return first
+
+
+def disassemble_batch(instruction_set_file: str, input_files: List[str], output_dir: Optional[str] = None,
+                      combined: Optional[TextIO] = None, base_address: int = 0, jobs: Optional[int] = None,
+                      progress: Optional[TextIO] = None) -> List[BatchResult]:
+    """Disassemble many files over a pool of worker processes.
+
+    Exactly one of output_dir and combined is used. In the combined output
+    each line is ``<input file>\\t<address>: <text>``, files appear in input
+    order, and lines are separated (not terminated) by newlines.
+
+    Args:
+        instruction_set_file: The instruction set JSON file
+        input_files: The files to disassemble
+        output_dir: The directory to write one listing per input to
+        combined: A text stream to write one tagged listing of all inputs to
+        base_address: The base address of every image
+        jobs: The number of worker processes (default: all cores)
+        progress: Where to report progress (None for no reports)
+
+    Returns:
+        The result of each file, in input order
+    """
+    if (output_dir is None) == (combined is None):
+        raise ValueError("Exactly one of output_dir and combined must be given")
+
+    jobs = jobs or os.cpu_count() or 1
+    scratch = tempfile.mkdtemp(prefix="unsp-batch-") if combined is not None else None
+    if combined is not None:
+        targets = [os.path.join(scratch, f"{i}.asm") for i in range(len(input_files))]
+    else:
+        targets = output_paths(input_files, output_dir)
+
+    results: List[Optional[BatchResult]] = [None] * len(input_files)
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                                 initargs=(os.path.abspath(instruction_set_file),)) as executor:
+            futures = [executor.submit(_disassemble_one, path, target, base_address)
+                       for path, target in zip(input_files, targets)]
+
+            writer = None
+            writer_errors: List[BaseException] = []
+            if combined is not None:
+                def write_combined():
+                    # Waits for each file in input order while later ones are still decoding
+                    first = True
+                    try:
+                        for path, future in zip(input_files, futures):
+                            result = future.result()
+                            if result.error is None:
+                                first = _append_tagged(result.output_file, path, combined, first)
+                                os.unlink(result.output_file)
+                    except BaseException as e:
+                        writer_errors.append(e)
+
+                writer = threading.Thread(target=write_combined, name="unsp-batch-writer")
+                writer.start()
+
+            index_of = {future: i for i, future in enumerate(futures)}
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                results[index_of[future]] = result
+                if progress is not None:
+                    if result.error is not None:
+                        print(f"[{done}/{len(futures)}] {result.input_file}: error: {result.error}", file=progress)
+                    else:
+                        rate = result.size / result.seconds / 1e6 if result.seconds else 0.0
+                        print(f"[{done}/{len(futures)}] {result.input_file}: {result.size} bytes in "
+                              f"{result.seconds:.3f} s ({rate:.2f} MB/s)", file=progress)
+
+            if writer is not None:
+                writer.join()
+                if writer_errors:
+                    raise writer_errors[0]
+    finally:
+        if scratch is not None:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    if progress is not None:
+        elapsed = time.perf_counter() - started
+        total = sum(result.size for result in results)
+        failed = sum(result.error is not None for result in results)
+        print(f"{len(results) - failed} files, {total} bytes in {elapsed:.3f} s "
+              f"({total / elapsed / 1e6 if elapsed else 0.0:.2f} MB/s) with {jobs} workers"
+              + (f", {failed} failed" if failed else ""), file=progress)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Disassemble many unSP binary files at once")
+    parser.add_argument("inputs", nargs="*", help="Files or glob patterns (quote them to use ** recursion)")
+    parser.add_argument("-l", "--list", help="Read more input files from this file, one per line ('-' for stdin)")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("-O", "--output-dir", help="Write one listing per input file to this directory")
+    output.add_argument("-o", "--output", help="Write a single listing with file-tagged lines ('-' for stdout)")
+    parser.add_argument("-b", "--base-address", type=lambda x: int(x, 0), default=0,
+                        help="The base address of every image (default: 0)")
+    parser.add_argument("-j", "--json", default="unsp_instruction_set.json",
+                        help="Path to the instruction set JSON file")
+    parser.add_argument("--jobs", type=int, default=0, help="Number of worker processes (default: 0, all cores)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Do not report progress")
+
+    args = parser.parse_args()
+
+    patterns = list(args.inputs)
+    if args.list:
+        with (sys.stdin if args.list == "-" else open(args.list)) as f:
+            patterns.extend(line.strip() for line in f if line.strip())
+    input_files = expand_inputs(patterns)
+    if not input_files:
+        parser.error("no input files")
+
+    progress = None if args.quiet else sys.stderr
+    if args.output_dir:
+        results = disassemble_batch(args.json, input_files, output_dir=args.output_dir,
+                                    base_address=args.base_address, jobs=args.jobs, progress=progress)
+    elif args.output == "-":
+        results = disassemble_batch(args.json, input_files, combined=sys.stdout,
+                                    base_address=args.base_address, jobs=args.jobs, progress=progress)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output, 'w', buffering=OUTPUT_BUFFER_SIZE) as f:
+            results = disassemble_batch(args.json, input_files, combined=f,
+                                        base_address=args.base_address, jobs=args.jobs, progress=progress)
+
+    if any(result.error is not None for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
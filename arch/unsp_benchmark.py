@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the unSP disassembler.
+
+Synthetic firmware images are generated from the instruction set with a fixed
+seed: a realistic mix of opcodes (two-word instructions included) interleaved
+with data blobs such as text, pointer tables and erased flash. Each
+disassembly mode is timed on each image size in a fresh process, which also
+gives its peak memory, and the time per word is compared across sizes: a ratio
+that stays near 1.0 as the size grows means the mode scales linearly.
+
+Results can be written as JSON and compared against a stored baseline; the
+exit status is non-zero when a mode got slower than the baseline allows.
+
+Dependencies:
+    - numpy
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from unsp_disassembler import UnSPDisassembler
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Relative frequency of instructions in generated code; others get OTHER_WEIGHT
+OPCODE_MIX = {
+    "Base+Disp6": 24.0,
+    "IMM6": 20.0,
+    "Branch": 14.0,
+    "16 bits Shift": 6.0,
+    "CALL": 6.0,
+    "RETF": 4.0,
+    "Memory BITOP": 4.0,
+    "Register BITOP": 3.0,
+    "JMPF": 2.0,
+    "MUL": 2.0,
+    "MULS": 1.0,
+    "DSI6": 1.0,
+    "DS Access": 1.0,
+    "NOP": 1.0,
+}
+OTHER_WEIGHT = 0.2
+
+# Share of an image taken by data blobs, and their mean length in words
+DATA_FRACTION = 0.15
+MEAN_BLOB_WORDS = 256
+
+# Benchmark modes, in the order they run
+MODES = ("instruction", "file", "parallel", "listing", "bulk", "cached")
+
+# Allowed slowdown against the baseline before it counts as a regression
+DEFAULT_TOLERANCE = 0.10
+
+
+def generate_image(disassembler: UnSPDisassembler, size: int, seed: int = 0,
+                   data_fraction: float = DATA_FRACTION) -> bytes:
+    """Generate a synthetic firmware image.
+
+    Code is drawn from ``OPCODE_MIX`` with random operands (and random second
+    words), and is cut at instruction boundaries by data blobs: random bytes,
+    zeros, erased flash (0xFFFF), ASCII text and tables of ROM word addresses.
+    The interrupt vectors point into ROM. The same seed always gives the same
+    image.
+
+    Args:
+        disassembler: The disassembler whose instruction set is used
+        size: The image size in bytes
+        seed: The random seed
+        data_fraction: The share of the image taken by data blobs
+
+    Returns:
+        The image
+    """
+    # Imported here so that measured processes do not carry NumPy in their peak memory
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    count = size // 2
+    decoders = disassembler.decoders
+
+    # Every first word that decodes to each instruction, given the priority rules
+    table = np.array(disassembler.opcode_table, dtype=np.int16)
+    order = np.argsort(table, kind="stable")
+    bounds = np.searchsorted(table[order], np.arange(len(decoders) + 1))
+    candidates = [order[bounds[i]:bounds[i + 1]].astype(np.uint16) for i in range(len(decoders))]
+
+    weights = np.array([OPCODE_MIX.get(decoder.name, OTHER_WEIGHT) if len(candidates[decoder.index]) else 0.0
+                        for decoder in decoders])
+    weights /= weights.sum()
+    two_word = np.array([decoder.size == 4 for decoder in decoders])
+
+    # Code: enough instructions for the code share, cut back to a boundary
+    code_words = int(count * (1 - data_fraction))
+    ids = rng.choice(len(decoders), size=code_words, p=weights)
+    sizes = np.where(two_word[ids], 2, 1)
+    ends = np.cumsum(sizes)
+    kept = int(np.searchsorted(ends, code_words, side="right"))
+    ids, sizes, ends = ids[:kept], sizes[:kept], ends[:kept]
+    starts = ends - sizes
+
+    code = np.empty(int(ends[-1]) if kept else 0, dtype=np.uint16)
+    for index in range(len(decoders)):
+        rows = np.flatnonzero(ids == index)
+        if len(rows):
+            code[starts[rows]] = candidates[index][rng.integers(0, len(candidates[index]), len(rows))]
+    seconds = starts[two_word[ids]] + 1
+    code[seconds] = rng.integers(0, 0x10000, len(seconds), dtype=np.uint16)
+
+    # Data blobs, inserted between instructions
+    data_words = count - len(code)
+    blob_count = max(1, data_words // MEAN_BLOB_WORDS) if data_words else 0
+    lengths = rng.geometric(1 / MEAN_BLOB_WORDS, blob_count).astype(np.float64)
+    lengths = np.maximum(1, np.round(lengths * data_words / lengths.sum())).astype(np.int64) if blob_count else lengths
+    if blob_count:
+        lengths[-1] = max(0, data_words - int(lengths[:-1].sum()))
+
+    rom_end = min(count, 0x400000)
+    blobs = []
+    for length in lengths.tolist():
+        kind = rng.integers(5)
+        if kind == 0:
+            blob = rng.integers(0, 0x10000, length, dtype=np.uint16)
+        elif kind == 1:
+            blob = np.zeros(length, dtype=np.uint16)
+        elif kind == 2:
+            blob = np.full(length, 0xFFFF, dtype=np.uint16)
+        elif kind == 3:
+            text = rng.integers(0x20, 0x7F, 2 * length, dtype=np.uint16)
+            blob = text[0::2] | (text[1::2] << 8)
+        else:
+            blob = rng.integers(min(0x4000, rom_end - 1), rom_end, length).astype(np.uint16)
+        blobs.append(blob)
+
+    points = np.sort(rng.choice(starts, size=min(blob_count, len(starts)), replace=False)) if kept else []
+    pieces = []
+    previous = 0
+    for point, blob in zip(np.asarray(points).tolist(), blobs):
+        pieces.append(code[previous:point])
+        pieces.append(blob)
+        previous = point
+    pieces.append(code[previous:])
+    pieces.extend(blobs[len(points):])
+    words = np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.uint16)
+
+    # Erased flash fills whatever rounding left over
+    if len(words) < count:
+        words = np.concatenate([words, np.full(count - len(words), 0xFFFF, dtype=np.uint16)])
+    words = words[:count]
+
+    if count > 0xFFFF:
+        words[0xFFF5:0x10000] = rng.integers(0x4000, min(count, 0x10000), 11)
+
+    image = words.astype("<u2").tobytes()
+    return image + bytes(size - len(image))
+
+
+def _peak_rss() -> Optional[int]:
+    """Return this process's peak resident set size in bytes, if available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _run_mode(instruction_set_file: str, mode: str, input_file: str, jobs: int, work_dir: str) -> Dict[str, Any]:
+    """Time one mode over one image (run in a fresh process).
+
+    Returns:
+        The elapsed seconds and the process's peak RSS in bytes
+    """
+    disassembler = UnSPDisassembler(instruction_set_file)
+    output_file = os.path.join(work_dir, f"{mode}.asm")
+
+    if mode == "instruction":
+        with open(input_file, 'rb') as f:
+            data = f.read()
+        start = time.perf_counter()
+        offset = 0
+        end = len(data) - 1
+        while offset < end:
+            _, size = disassembler.disassemble_instruction(data, offset, offset)
+            offset += size
+    elif mode == "file":
+        start = time.perf_counter()
+        disassembler.disassemble_file(input_file, output_file)
+    elif mode == "parallel":
+        start = time.perf_counter()
+        disassembler.disassemble_file(input_file, output_file, jobs=jobs)
+    elif mode == "listing":
+        start = time.perf_counter()
+        disassembler.disassemble_listing(input_file)
+    elif mode == "bulk":
+        import unsp_bulk
+        start = time.perf_counter()
+        unsp_bulk.decode_array(disassembler, input_file)
+    elif mode == "cached":
+        from unsp_cache import DisassemblyCache
+        cache = DisassemblyCache(os.path.join(work_dir, "cache"), max_size=1 << 40)
+        # Fill the cache first; the timed run is served from it
+        disassembler.disassemble_file(input_file, output_file, cache=cache)
+        start = time.perf_counter()
+        disassembler.disassemble_file(input_file, output_file, cache=cache)
+    else:
+        raise ValueError(f"Unknown benchmark mode: {mode}")
+
+    return {"seconds": time.perf_counter() - start, "peak_rss": _peak_rss()}
+
+
+def measure(instruction_set_file: str, mode: str, input_file: str, jobs: int, work_dir: str) -> Dict[str, Any]:
+    """Run one mode in a freshly spawned process so its memory is its own."""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(_run_mode, instruction_set_file, mode, input_file, jobs, work_dir).result()
+
+
+def measure_startup(instruction_set_file: str, work_dir: str, repeat: int = 5) -> Dict[str, float]:
+    """Time the command line tool on an empty image, and constructing a disassembler.
+
+    Returns:
+        The best of ``repeat`` runs: the whole CLI, a bare interpreter, and
+        ``UnSPDisassembler()`` in-process (all in seconds)
+    """
+    empty_file = os.path.join(work_dir, "empty.bin")
+    open(empty_file, 'wb').close()
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "unsp_disassembler.py")
+
+    def best(command):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    init_times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        UnSPDisassembler(instruction_set_file)
+        init_times.append(time.perf_counter() - start)
+
+    return {
+        "cli_seconds": best([sys.executable, script, empty_file, "-j", instruction_set_file]),
+        "interpreter_seconds": best([sys.executable, "-c", "pass"]),
+        "init_seconds": min(init_times),
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Find modes and sizes that got slower than the baseline allows.
+
+    Args:
+        results: The current results
+        baseline: Results loaded from the baseline file
+        tolerance: The allowed slowdown as a fraction (0.10 is 10%)
+
+    Returns:
+        A description of each regression
+    """
+    regressions = []
+    previous = {(r["mode"], r["size"]): r for r in baseline.get("results", [])}
+    for result in results["results"]:
+        old = previous.get((result["mode"], result["size"]))
+        if old is None:
+            continue
+        if result["words_per_second"] < old["words_per_second"] * (1 - tolerance):
+            regressions.append(f"{result['mode']} at {result['size']} bytes: "
+                               f"{result['words_per_second']:,.0f} words/s "
+                               f"(baseline {old['words_per_second']:,.0f})")
+
+    old_startup = baseline.get("startup", {}).get("cli_seconds")
+    new_startup = results.get("startup", {}).get("cli_seconds")
+    if old_startup and new_startup and new_startup > old_startup * (1 + tolerance):
+        regressions.append(f"startup: {new_startup * 1e3:.1f} ms (baseline {old_startup * 1e3:.1f} ms)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark unSP disassembly on synthetic firmware images")
+    parser.add_argument("-j", "--json", default="unsp_instruction_set.json",
+                        help="Path to the instruction set JSON file")
+    parser.add_argument("--min-size", type=lambda x: int(x, 0), default=64 * 1024,
+                        help="Smallest image size in bytes (default: 64 KB)")
+    parser.add_argument("--max-size", type=lambda x: int(x, 0), default=64 * 1024 * 1024,
+                        help="Largest image size in bytes (default: 64 MB)")
+    parser.add_argument("--factor", type=int, default=4, help="Growth factor between image sizes (default: 4)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated images")
+    parser.add_argument("--modes", default=",".join(MODES),
+                        help=f"Comma-separated modes to run (default: {','.join(MODES)})")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes for the parallel mode (default: all cores)")
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against the results in this JSON file")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Write the results to the baseline file instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed slowdown against the baseline (default: 0.10)")
+
+    args = parser.parse_args()
+
+    modes = [mode for mode in args.modes.split(",") if mode]
+    for mode in modes:
+        if mode not in MODES:
+            parser.error(f"unknown mode {mode!r} (choose from {', '.join(MODES)})")
+
+    instruction_set_file = os.path.abspath(args.json)
+    disassembler = UnSPDisassembler(instruction_set_file)
+
+    results: Dict[str, Any] = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "jobs": args.jobs,
+            "seed": args.seed,
+            "spec_hash": disassembler.spec_hash,
+        },
+        "results": [],
+    }
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        startup = measure_startup(instruction_set_file, work_dir)
+        results["startup"] = startup
+        print(f"startup: cli {startup['cli_seconds'] * 1e3:.1f} ms "
+              f"(interpreter {startup['interpreter_seconds'] * 1e3:.1f} ms), "
+              f"init {startup['init_seconds'] * 1e3:.2f} ms")
+
+        print(f"{'mode':>11}  {'size':>10}  {'seconds':>8}  {'Mwords/s':>8}  {'peak MB':>8}  {'ratio':>6}")
+        first_ns_per_word: Dict[str, float] = {}
+        size = args.min_size
+        while size <= args.max_size:
+            input_file = os.path.join(work_dir, "image.bin")
+            with open(input_file, 'wb') as f:
+                f.write(generate_image(disassembler, size, args.seed))
+
+            for mode in modes:
+                measured = measure(instruction_set_file, mode, input_file, args.jobs, work_dir)
+                words = size // 2
+                seconds = measured["seconds"]
+                ns_per_word = seconds * 1e9 / words
+                first_ns_per_word.setdefault(mode, ns_per_word)
+                results["results"].append({
+                    "mode": mode,
+                    "size": size,
+                    "seconds": seconds,
+                    "words_per_second": words / seconds if seconds else float("inf"),
+                    "peak_rss": measured["peak_rss"],
+                })
+
+                # A ratio that stays near 1.0 as the size grows means linear scaling
+                peak = f"{measured['peak_rss'] / 2 ** 20:>8.1f}" if measured["peak_rss"] else f"{'-':>8}"
+                print(f"{mode:>11}  {size:>10}  {seconds:>8.3f}  {words / seconds / 1e6:>8.3f}  {peak}  "
+                      f"{ns_per_word / first_ns_per_word[mode]:>6.2f}")
+            size *= args.factor
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Vectorized bulk decoding of unSP images with NumPy.
+
+Instead of disassembling one word at a time, the whole image is read as a
+uint16 array, classified through the disassembler's opcode table in one
+lookup and split into operand fields with array masks and shifts. The result
+is a structured array with one row per instruction, for statistical passes
+that only need decoded values (opcode histograms, code/data heuristics,
+collecting branch targets). Rendering text is a separate, optional step.
+
+Dependencies:
+    - numpy
+"""
+
+import os
+from typing import Dict, Iterator, Union
+
+import numpy as np
+
+from unsp_disassembler import UnSPDisassembler, UNKNOWN_OPCODE
+
+
+def instruction_dtype(disassembler: UnSPDisassembler) -> np.dtype:
+    """Build the structured dtype of decoded instruction rows.
+
+    Columns:
+        address: The byte address of the instruction
+        id: The instruction index in ``disassembler.instructions`` (-1 if unknown)
+        size: The number of bytes consumed (2 for an incomplete final instruction)
+        word: The first instruction word
+        second_word: The second instruction word (0 for one-word instructions)
+        fields: Raw operand values, in the decoder's ``field_names`` order
+
+    Args:
+        disassembler: The disassembler whose instruction set is used
+
+    Returns:
+        The structured dtype
+    """
+    max_fields = max((len(decoder.fields) for decoder in disassembler.decoders), default=0)
+    return np.dtype([
+        ("address", "<u4"),
+        ("id", "<i2"),
+        ("size", "u1"),
+        ("word", "<u2"),
+        ("second_word", "<u2"),
+        ("fields", "<u2", (max(max_fields, 1),)),
+    ])
+
+
+def load_words(source: Union[str, os.PathLike, bytes]) -> np.ndarray:
+    """Read an image as little-endian 16-bit words (a trailing odd byte is ignored)."""
+    if isinstance(source, (str, os.PathLike)):
+        count = os.path.getsize(source) // 2
+        if count == 0:
+            return np.zeros(0, dtype="<u2")
+        return np.memmap(source, dtype="<u2", mode="r", shape=(count,))
+
+    data = memoryview(source).cast("B")
+    return np.frombuffer(data, dtype="<u2", count=len(data) // 2)
+
+
+def decode_array(disassembler: UnSPDisassembler, source: Union[str, os.PathLike, bytes],
+                 base_address: int = 0) -> np.ndarray:
+    """Decode an entire image into a structured array of instructions.
+
+    The rows are exactly the instructions a linear sweep produces. Whether a
+    word starts an instruction only depends on the run of two-word opcodes
+    before it: within such a run every other word is a second word. That
+    makes instruction boundaries computable with an accumulated maximum
+    instead of a sequential walk.
+
+    Args:
+        disassembler: The disassembler whose instruction set is used
+        source: A file path, or the binary data itself (any buffer)
+        base_address: The address of the first byte of the image
+
+    Returns:
+        A structured array with ``instruction_dtype(disassembler)``
+    """
+    words = load_words(source)
+    count = len(words)
+    dtype = instruction_dtype(disassembler)
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+
+    opcode_table = np.array(disassembler.opcode_table, dtype=np.int16)
+    # Indexed by instruction id; the extra last entry is what UNKNOWN_OPCODE (-1) selects
+    two_word_table = np.array([decoder.size == 4 for decoder in disassembler.decoders] + [False])
+
+    ids = opcode_table[words]
+    two_word = two_word_table[ids]
+
+    # A word starts an instruction iff an even number of two-word opcodes
+    # directly precede it since the last one-word opcode (or the start)
+    index = np.arange(count)
+    last_one_word = np.maximum.accumulate(np.where(two_word, -1, index))
+    run_start = np.empty(count, dtype=index.dtype)
+    run_start[0] = 0
+    run_start[1:] = last_one_word[:-1] + 1
+    starts = np.flatnonzero(((index - run_start) & 1) == 0)
+
+    result = np.zeros(len(starts), dtype=dtype)
+    result["address"] = base_address + 2 * starts
+    result["id"] = ids[starts]
+    result["word"] = words[starts]
+
+    # A two-word instruction in the last word is incomplete and consumes 2 bytes
+    has_second = two_word[starts] & (starts + 1 < count)
+    result["size"] = np.where(has_second, 4, 2)
+    result["second_word"][has_second] = words[starts[has_second] + 1]
+
+    # Extract operand fields for each instruction with array masks and shifts
+    first = result["word"]
+    second = result["second_word"]
+    fields = result["fields"]
+    for decoder in disassembler.decoders:
+        rows = np.flatnonzero(result["id"] == decoder.index)
+        if len(rows) == 0:
+            continue
+        for column, (second_word, shift, mask) in enumerate(decoder.fields):
+            source_words = (second if second_word else first)[rows]
+            fields[rows, column] = (source_words >> shift) & mask
+
+    return result
+
+
+def render(disassembler: UnSPDisassembler, decoded: np.ndarray) -> Iterator[str]:
+    """Render decoded rows as the same text ``disassemble_instruction`` produces.
+
+    Args:
+        disassembler: The disassembler whose instruction set was used to decode
+        decoded: Rows returned by ``decode_array``
+
+    Yields:
+        The disassembled instruction string of each row
+    """
+    decoders = disassembler.decoders
+    for instr_id, size, word, fields in zip(decoded["id"].tolist(), decoded["size"].tolist(),
+                                             decoded["word"].tolist(), decoded["fields"].tolist()):
+        if instr_id == UNKNOWN_OPCODE:
+            yield f"Unknown instruction: 0x{word:04x}"
+            continue
+
+        decoder = decoders[instr_id]
+        if size < decoder.size:
+            yield f"Incomplete instruction {decoder.name} (needs second word)"
+        else:
+            yield decoder.render(tuple(fields[:len(decoder.fields)]))
+
+
+def histogram(disassembler: UnSPDisassembler, decoded: np.ndarray) -> Dict[str, int]:
+    """Count the decoded instructions by name.
+
+    Args:
+        disassembler: The disassembler whose instruction set was used to decode
+        decoded: Rows returned by ``decode_array``
+
+    Returns:
+        A mapping of instruction name (or "Unknown") to count, most common first
+    """
+    counts: Dict[str, int] = {}
+    # Shift ids by one so UNKNOWN_OPCODE lands in bin 0
+    for bin_index, count in enumerate(np.bincount(decoded["id"] + 1, minlength=len(disassembler.decoders) + 1)):
+        if count:
+            name = "Unknown" if bin_index == 0 else disassembler.decoders[bin_index - 1].name
+            counts[name] = counts.get(name, 0) + int(count)
+    return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+
+
+def field_values(disassembler: UnSPDisassembler, decoded: np.ndarray, field_name: str) -> np.ndarray:
+    """Collect one operand across every instruction that has it.
+
+    ``A22`` combines the two halves of a 22-bit CALL/JMPF target. Incomplete
+    instructions are skipped.
+
+    Args:
+        disassembler: The disassembler whose instruction set was used to decode
+        decoded: Rows returned by ``decode_array``
+        field_name: The operand to collect (e.g. "IM6", "A16" or "A22")
+
+    Returns:
+        A structured array of (address, value) pairs in address order
+    """
+    parts = ["A22[21:16]", "A22[15:0]"] if field_name == "A22" else [field_name]
+    selected = []
+    for decoder in disassembler.decoders:
+        if not all(part in decoder.field_index for part in parts):
+            continue
+        rows = decoded[(decoded["id"] == decoder.index) & (decoded["size"] == decoder.size)]
+        value = np.zeros(len(rows), dtype="<u4")
+        for part in parts:
+            column = decoder.field_index[part]
+            value = (value << (decoder.fields[column][2].bit_length())) | rows["fields"][:, column]
+        selected.append((rows["address"], value))
+
+    result = np.zeros(sum(len(addresses) for addresses, _ in selected),
+                      dtype=[("address", "<u4"), ("value", "<u4")])
+    if selected:
+        result["address"] = np.concatenate([addresses for addresses, _ in selected])
+        result["value"] = np.concatenate([values for _, values in selected])
+        result.sort(order="address")
+    return result
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Persistent on-disk cache of unSP disassembly results.
+
+The image is split into pages of PAGE_WORDS words. Each page's decoded
+instructions (word offsets and sizes) and their rendered text are stored in
+one compact, zlib-compressed file, keyed by a hash of the instruction set
+JSON, the base address, the page's position and bytes, and how the previous
+page left off. Editing the spec invalidates every entry, and re-running on a
+slightly modified dump only re-decodes the pages that changed.
+
+The cache directory is bounded in size: hits refresh an entry's modification
+time, and the least recently used entries are removed once the total size
+exceeds the limit.
+"""
+
+import hashlib
+import os
+import re
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
+from unsp_disassembler import UnSPDisassembler, Instruction, mapped_words
+
+
+# Number of words per cache entry
+PAGE_WORDS = 2048
+
+# Default upper bound on the total size of the cache directory
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+# Entry header: magic, format version, words the next page starts into, instruction count, text size
+_HEADER = struct.Struct("<4sBBHI")
+_MAGIC = b"UNSC"
+_VERSION = 1
+
+# Entries are stored as <first 2 hex digits of the key>/<remaining 62>; nothing
+# else in the directory belongs to the cache
+_ENTRY_DIR = re.compile(r"[0-9a-f]{2}")
+_ENTRY_NAME = re.compile(r"[0-9a-f]{62}")
+
+
+class DisassemblyCache:
+    """A size-bounded LRU cache of disassembled pages in a directory."""
+
+    def __init__(self, cache_dir: Union[str, os.PathLike], max_size: int = DEFAULT_CACHE_SIZE,
+                 verbose: bool = False):
+        """Open (and create if needed) a cache directory.
+
+        Args:
+            cache_dir: The directory holding cache entries
+            max_size: The maximum total size of the entries in bytes
+            verbose: Whether to report hits and misses on stderr
+        """
+        self.cache_dir = os.fspath(cache_dir)
+        self.max_size = max_size
+        self.verbose = verbose
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key[2:])
+
+    def _page_key(self, disassembler: UnSPDisassembler, words: Sequence[int], base_address: int,
+                  start: int, stop: int, skip: int) -> str:
+        """Hash everything that determines how a page disassembles."""
+        digest = hashlib.sha256()
+        digest.update(disassembler.spec_hash.encode())
+        digest.update(struct.pack("<qIIB", base_address, start, stop - start, skip))
+        # The word after the page completes a straddling two-word instruction
+        digest.update(words[start:min(stop + 1, len(words))])
+        digest.update(b"\1" if stop + 1 > len(words) else b"\0")
+        return digest.hexdigest()
+
+    def _load(self, key: str) -> Optional[Tuple[int, array, array, List[str]]]:
+        """Read an entry, refreshing its LRU position.
+
+        Returns:
+            The exit skip, word offsets, sizes and texts, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+
+        if len(data) < _HEADER.size:
+            return None
+        magic, version, skip, count, text_size = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != _VERSION:
+            return None
+
+        offset = _HEADER.size
+        try:
+            offsets = array("H")
+            offsets.frombytes(data[offset:offset + 2 * count])
+            offset += 2 * count
+            sizes = array("B", data[offset:offset + count])
+            offset += count
+            texts = zlib.decompress(data[offset:]).decode("utf-8").split("\n") if count else []
+            if len(offsets) != count or len(sizes) != count or len(texts) != count:
+                raise ValueError("truncated cache entry")
+        except (zlib.error, ValueError):
+            # A corrupt or truncated entry is a miss; drop it so it gets rewritten
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            return None
+        if sys.byteorder == "big":
+            offsets.byteswap()
+        return skip, offsets, sizes, texts
+
+    def _store(self, key: str, skip: int, instructions: List[Instruction], base_address: int, start: int):
+        """Write an entry atomically."""
+        offsets = array("H", ((instr.address - base_address) // 2 - start for instr in instructions))
+        if sys.byteorder == "big":
+            offsets.byteswap()
+        sizes = array("B", (instr.size for instr in instructions))
+        text = zlib.compress("\n".join(instr.text for instr in instructions).encode("utf-8"))
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_HEADER.pack(_MAGIC, _VERSION, skip, len(instructions), len(text)))
+                f.write(offsets.tobytes())
+                f.write(sizes.tobytes())
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def iter_instructions(self, disassembler: UnSPDisassembler, source: Union[str, os.PathLike, bytes],
+                          base_address: int = 0) -> Iterator[Instruction]:
+        """Linearly disassemble an image, serving unchanged pages from the cache.
+
+        The result is the same as ``disassembler.iter_instructions``; cached
+        instructions come with their text already rendered.
+
+        Args:
+            disassembler: The disassembler to decode misses with
+            source: A file path, or the binary data itself (any buffer)
+            base_address: The address of the first byte of the image
+
+        Yields:
+            An Instruction for each decoded instruction, in address order
+        """
+        stored = False
+        table = disassembler.decoder_table
+        with mapped_words(source) as words:
+            count = len(words)
+            skip = 0
+            for start in range(0, count, PAGE_WORDS):
+                stop = min(start + PAGE_WORDS, count)
+                key = self._page_key(disassembler, words, base_address, start, stop, skip)
+                entry = self._load(key)
+
+                if entry is None:
+                    self.misses += 1
+                    instructions = list(disassembler.decode_range(words, base_address, start + skip, stop))
+                    end = (instructions[-1].address - base_address + instructions[-1].size) // 2 \
+                        if instructions else stop
+                    skip = end - stop
+                    self._store(key, skip, instructions, base_address, start)
+                    stored = True
+                    yield from instructions
+                    continue
+
+                self.hits += 1
+                skip, offsets, sizes, texts = entry
+                for offset, size, text in zip(offsets, sizes, texts):
+                    index = start + offset
+                    word = words[index]
+                    second_word = words[index + 1] if size == 4 else 0
+                    yield Instruction(base_address + 2 * index, size, word, second_word, table[word], text)
+
+        if stored:
+            self.evict()
+        if self.verbose:
+            self.report()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_size.
+
+        Only files laid out like entries are counted or removed, so pointing
+        the cache at a directory holding other files leaves them alone.
+        """
+        entries = []
+        total = 0
+        try:
+            subdirs = [entry.path for entry in os.scandir(self.cache_dir)
+                       if _ENTRY_DIR.fullmatch(entry.name) and entry.is_dir(follow_symlinks=False)]
+        except OSError:
+            return
+        for subdir in subdirs:
+            try:
+                files = list(os.scandir(subdir))
+            except OSError:
+                continue
+            for entry in files:
+                if not _ENTRY_NAME.fullmatch(entry.name):
+                    continue
+                try:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+
+    def report(self, stream=None):
+        """Print the hit and miss counts."""
+        lookups = self.hits + self.misses
+        rate = 100.0 * self.hits / lookups if lookups else 0.0
+        print(f"cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate) in {self.cache_dir}",
+              file=stream or sys.stderr)
@@ -0,0 +1,586 @@
+#!/usr/bin/env python3
+"""
+Fast differential disassembly of two unSP images.
+
+The images are aligned on their raw word arrays rather than on listings.
+Rolling hashes of short windows are computed for every position with NumPy,
+a content-defined sample of them serves as anchors, and anchors whose hash
+is unique in both images are chained in address order. Each anchor is then
+extended in both directions to a maximal run of matching words, so regions
+that merely moved still line up.
+
+The 22-bit targets of CALL and GOTO are masked out for alignment, since a
+function that moves changes every far call to it. Where the raw words of a
+matched region differ, the call is checked against the alignment and counted
+as relocated if its target moved with the code it points to. Only the gaps
+between matched regions are decoded, and their instructions are compared
+with direct targets normalized the same way.
+
+With code discovery data (``--functions``), the report also lists the
+functions that were added, removed, changed or moved.
+
+Dependencies:
+    - numpy
+"""
+
+import argparse
+import bisect
+import difflib
+import sys
+import time
+from typing import List, Optional, Sequence, TextIO, Tuple, Union
+
+import numpy as np
+
+from unsp_analysis import CodeDiscovery, discover_code
+from unsp_bulk import load_words
+from unsp_disassembler import UnSPDisassembler, Instruction, mapped_words, OUTPUT_BUFFER_SIZE
+
+
+# Words per hashed window
+ANCHOR_WORDS = 16
+
+# On average one window in this many is used as an anchor
+ANCHOR_SAMPLE = 32
+
+# Gaps with more words than this on either side are reported without an instruction diff
+MAX_DIFF_WORDS = 1 << 16
+
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+_HASH_MIX = np.uint64(0xFF51AFD7ED558CCD)
+
+# Function change kinds
+FUNCTION_ADDED = "added"
+FUNCTION_REMOVED = "removed"
+FUNCTION_CHANGED = "changed"
+FUNCTION_MOVED = "moved"
+
+
+class Alignment:
+    """Matching regions of two images, as word indexes in ascending order in both."""
+
+    def __init__(self, base_a: int, base_b: int, count_a: int, count_b: int):
+        self.base_a = base_a
+        self.base_b = base_b
+        self.count_a = count_a
+        self.count_b = count_b
+        self.a_starts: List[int] = []
+        self.b_starts: List[int] = []
+        self.lengths: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def add(self, a_start: int, b_start: int, length: int):
+        """Record a matching region (regions must be added in order)."""
+        self.a_starts.append(a_start)
+        self.b_starts.append(b_start)
+        self.lengths.append(length)
+
+    @property
+    def matched_words(self) -> int:
+        return sum(self.lengths)
+
+    def map_address(self, address: int) -> Optional[int]:
+        """Translate an address in the first image to the second, or None if it is not in a matched region."""
+        offset = address - self.base_a
+        if offset < 0:
+            return None
+        index = offset >> 1
+        i = bisect.bisect_right(self.a_starts, index) - 1
+        if i < 0 or index >= self.a_starts[i] + self.lengths[i]:
+            return None
+        return address + self.base_b - self.base_a + 2 * (self.b_starts[i] - self.a_starts[i])
+
+    def translate(self, address: int) -> Optional[int]:
+        """Translate an address in the first image to the second, at the same offset into a gap if unmatched.
+
+        Returns:
+            The address, or None if it falls outside the second image
+        """
+        index = (address - self.base_a) >> 1
+        i = bisect.bisect_right(self.a_starts, index) - 1
+        delta = self.b_starts[i] - self.a_starts[i] if i >= 0 else 0
+        if not 0 <= index + delta < self.count_b:
+            return None
+        return address + self.base_b - self.base_a + 2 * delta
+
+    def gaps(self) -> List[Tuple[int, int, int, int]]:
+        """Return the unmatched parts between regions as (a_start, a_end, b_start, b_end) word indexes."""
+        gaps = []
+        a_end = b_end = 0
+        for a_start, b_start, length in zip(self.a_starts + [self.count_a], self.b_starts + [self.count_b],
+                                            self.lengths + [0]):
+            if a_start > a_end or b_start > b_end:
+                gaps.append((a_end, a_start, b_end, b_start))
+            a_end = a_start + length
+            b_end = b_start + length
+        return gaps
+
+
+class DiffHunk:
+    """A run of differing instructions in the two images."""
+
+    __slots__ = ("a_start", "a_end", "b_start", "b_end", "removed", "added")
+
+    def __init__(self, a_start: int, a_end: int, b_start: int, b_end: int,
+                 removed: Optional[List[Instruction]], added: Optional[List[Instruction]]):
+        """Create a hunk.
+
+        Args:
+            a_start: The first address of the hunk in the first image
+            a_end: The address after the hunk in the first image
+            b_start: The first address of the hunk in the second image
+            b_end: The address after the hunk in the second image
+            removed: The instructions only in the first image (None if the gap was too large to compare)
+            added: The instructions only in the second image (None if the gap was too large to compare)
+        """
+        self.a_start = a_start
+        self.a_end = a_end
+        self.b_start = b_start
+        self.b_end = b_end
+        self.removed = removed
+        self.added = added
+
+
+class ImageDiff:
+    """The differences between two images."""
+
+    def __init__(self, alignment: Alignment, hunks: List[DiffHunk], relocated: List[Tuple[int, int]]):
+        self.alignment = alignment
+        self.hunks = hunks
+        self.relocated = relocated   # (address in a, address in b) of far calls whose target only moved
+        # (kind, entry in a, entry in b) when functions were compared
+        self.functions: Optional[List[Tuple[str, Optional[int], Optional[int]]]] = None
+
+
+def _normalize_words(disassembler: UnSPDisassembler, words: np.ndarray) -> np.ndarray:
+    """Return a copy of the words with the 22-bit targets of CALL and GOTO cleared.
+
+    Every word whose opcode is a far call or jump is treated as one, whatever
+    the sweep phase, so both images are normalized identically.
+    """
+    first_clear = np.zeros(0x10000, dtype=np.uint16)
+    second_clear = np.zeros(0x10000, dtype=np.uint16)
+    ids = np.array(disassembler.opcode_table, dtype=np.int16)
+    for decoder in disassembler.decoders:
+        if decoder.a22_operands is None:
+            continue
+        first = second = 0
+        for i in decoder.a22_operands:
+            in_second, shift, mask = decoder.fields[i]
+            if in_second:
+                second |= mask << shift
+            else:
+                first |= mask << shift
+        first_clear[ids == decoder.index] = first
+        second_clear[ids == decoder.index] = second
+
+    normalized = words & ~first_clear[words]
+    if len(words) > 1:
+        normalized[1:] &= ~second_clear[words[:-1]]
+    return normalized
+
+
+def _anchors(words: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Hash every window of ANCHOR_WORDS words and keep a content-defined sample.
+
+    Returns:
+        The sampled hashes and their word indexes
+    """
+    count = len(words) - ANCHOR_WORDS + 1
+    if count <= 0:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64)
+    hashes = np.zeros(count, dtype=np.uint64)
+    for j in range(ANCHOR_WORDS):
+        hashes *= _HASH_MULTIPLIER
+        hashes += words[j:j + count]
+    # Sample on well-mixed bits, so the same content is sampled wherever it moved
+    positions = np.flatnonzero(((hashes * _HASH_MIX) >> np.uint64(40)) % np.uint64(ANCHOR_SAMPLE) == 0)
+    return hashes[positions], positions
+
+
+def _unique_anchors(words: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the sampled hashes that occur once, sorted, with their word indexes."""
+    hashes, positions = _anchors(words)
+    unique, first, counts = np.unique(hashes, return_index=True, return_counts=True)
+    once = counts == 1
+    return unique[once], positions[first[once]]
+
+
+def _chain(a_positions: np.ndarray, b_positions: np.ndarray) -> List[Tuple[int, int]]:
+    """Return the longest chain of anchor pairs that is ascending in both images."""
+    order = np.argsort(a_positions, kind="stable")
+    pairs = list(zip(a_positions[order].tolist(), b_positions[order].tolist()))
+
+    # Longest increasing subsequence of the b positions
+    tails: List[int] = []
+    tail_pairs: List[int] = []
+    previous = [-1] * len(pairs)
+    for k, (_, b) in enumerate(pairs):
+        i = bisect.bisect_left(tails, b)
+        if i:
+            previous[k] = tail_pairs[i - 1]
+        if i == len(tails):
+            tails.append(b)
+            tail_pairs.append(k)
+        else:
+            tails[i] = b
+            tail_pairs[i] = k
+
+    chain = []
+    k = tail_pairs[-1] if tail_pairs else -1
+    while k >= 0:
+        chain.append(pairs[k])
+        k = previous[k]
+    chain.reverse()
+    return chain
+
+
+def _match_forward(a: np.ndarray, b: np.ndarray, i: int, j: int) -> int:
+    """Count the equal words of a[i:] and b[j:] before the first difference."""
+    limit = min(len(a) - i, len(b) - j)
+    matched = 0
+    chunk = 64
+    while matched < limit:
+        size = min(chunk, limit - matched)
+        differ = np.flatnonzero(a[i + matched:i + matched + size] != b[j + matched:j + matched + size])
+        if len(differ):
+            return matched + int(differ[0])
+        matched += size
+        chunk = min(chunk * 2, 1 << 20)
+    return matched
+
+
+def _match_backward(a: np.ndarray, b: np.ndarray, i: int, j: int, limit: int) -> int:
+    """Count the equal words of a[:i] and b[:j], up to limit, before the last difference."""
+    matched = 0
+    chunk = 64
+    while matched < limit:
+        size = min(chunk, limit - matched)
+        differ = np.flatnonzero(a[i - matched - size:i - matched] != b[j - matched - size:j - matched])
+        if len(differ):
+            return matched + size - 1 - int(differ[-1])
+        matched += size
+        chunk = min(chunk * 2, 1 << 20)
+    return matched
+
+
+def align(a: np.ndarray, b: np.ndarray, base_a: int = 0, base_b: int = 0) -> Alignment:
+    """Find the matching regions of two word arrays.
+
+    Args:
+        a: The (normalized) words of the first image
+        b: The (normalized) words of the second image
+        base_a: The address of a[0]
+        base_b: The address of b[0]
+
+    Returns:
+        The Alignment
+    """
+    alignment = Alignment(base_a, base_b, len(a), len(b))
+
+    a_hashes, a_positions = _unique_anchors(a)
+    b_hashes, b_positions = _unique_anchors(b)
+    _, a_common, b_common = np.intersect1d(a_hashes, b_hashes, assume_unique=True, return_indices=True)
+
+    # A common prefix needs no anchor
+    chain = [(0, 0)] + _chain(a_positions[a_common], b_positions[b_common])
+
+    a_done = b_done = 0
+    for i, j in chain:
+        if i < a_done or j < b_done:
+            continue
+        back = _match_backward(a, b, i, j, min(i - a_done, j - b_done))
+        forward = _match_forward(a, b, i, j)
+        if forward < ANCHOR_WORDS and (i, j) != (0, 0):
+            # A hash collision, or a window that differs only by masked targets elsewhere
+            continue
+        if back + forward:
+            alignment.add(i - back, j - back, back + forward)
+            a_done = i + forward
+            b_done = j + forward
+
+    # A common suffix needs no anchor either
+    back = _match_backward(a, b, len(a), len(b), min(len(a) - a_done, len(b) - b_done))
+    if back:
+        alignment.add(len(a) - back, len(b) - back, back)
+    return alignment
+
+
+class _Differ:
+    """Compares the decoded instructions of two images using their alignment."""
+
+    def __init__(self, disassembler: UnSPDisassembler, alignment: Alignment,
+                 words_a: Sequence[int], words_b: Sequence[int]):
+        self.disassembler = disassembler
+        self.alignment = alignment
+        self.words_a = words_a
+        self.words_b = words_b
+        # Operand indexes that only encode a direct target, per decoder
+        self._target_fields = [decoder.target_operands for decoder in disassembler.decoders]
+
+    def _decode(self, words: Sequence[int], base_address: int, start: int, stop: int) -> List[Instruction]:
+        """Decode the instructions of the linear sweep that cover words[start:stop]."""
+        disassembler = self.disassembler
+        first = disassembler.sweep_start(words, start)
+        if first > start:
+            # The first word of the gap is the second word of a two-word instruction
+            first = start - 1
+        return list(disassembler.decode_range(words, base_address, first, stop))
+
+    def _keys(self, instructions: List[Instruction], in_a: bool, gap_start: int, gap_end: int) -> List[tuple]:
+        """Compare keys of instructions: the raw encoding, with direct targets normalized.
+
+        Targets in a matched region of the first image are translated to the
+        second, and targets inside the gap itself are made relative to it.
+        """
+        keys = []
+        for instr in instructions:
+            kind, target = instr.control_flow
+            if target is None:
+                keys.append((instr.word, instr.second_word if instr.size == 4 else None))
+                continue
+            if gap_start <= target < gap_end:
+                target = ("gap", target - gap_start)
+            elif in_a:
+                mapped = self.alignment.map_address(target)
+                if mapped is not None:
+                    target = mapped
+            skip = self._target_fields[instr.index]
+            operands = tuple(value for i, value in enumerate(instr.operands) if i not in skip)
+            keys.append((instr.index, operands, kind, target))
+        return keys
+
+    def diff_gap(self, a_start: int, a_end: int, b_start: int, b_end: int) -> List[DiffHunk]:
+        """Compare the instructions of one unmatched gap."""
+        alignment = self.alignment
+        base_a, base_b = alignment.base_a, alignment.base_b
+        if a_end - a_start > MAX_DIFF_WORDS or b_end - b_start > MAX_DIFF_WORDS:
+            return [DiffHunk(base_a + 2 * a_start, base_a + 2 * a_end, base_b + 2 * b_start, base_b + 2 * b_end,
+                             None, None)]
+
+        old = self._decode(self.words_a, base_a, a_start, a_end)
+        new = self._decode(self.words_b, base_b, b_start, b_end)
+        old_keys = self._keys(old, True, base_a + 2 * a_start, base_a + 2 * a_end)
+        new_keys = self._keys(new, False, base_b + 2 * b_start, base_b + 2 * b_end)
+
+        hunks = []
+        matcher = difflib.SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                continue
+            hunks.append(DiffHunk(
+                old[i1].address if i1 < len(old) else base_a + 2 * a_end,
+                old[i2 - 1].address + old[i2 - 1].size if i2 > i1 else
+                (old[i1].address if i1 < len(old) else base_a + 2 * a_end),
+                new[j1].address if j1 < len(new) else base_b + 2 * b_end,
+                new[j2 - 1].address + new[j2 - 1].size if j2 > j1 else
+                (new[j1].address if j1 < len(new) else base_b + 2 * b_end),
+                old[i1:i2], new[j1:j2]))
+        return hunks
+
+    def diff_call(self, a_index: int, b_index: int) -> Optional[DiffHunk]:
+        """Compare a far call or jump whose target words differ inside a matched region.
+
+        Returns:
+            None if the target moved along with the code it points to, else a hunk
+        """
+        alignment = self.alignment
+        disassembler = self.disassembler
+        old = next(disassembler.decode_range(self.words_a, alignment.base_a, a_index, a_index + 1))
+        new = next(disassembler.decode_range(self.words_b, alignment.base_b, b_index, b_index + 1))
+        old_kind, old_target = old.control_flow
+        new_kind, new_target = new.control_flow
+        if (old.index == new.index and old_kind == new_kind and old_target is not None
+                and alignment.map_address(old_target) == new_target):
+            return None
+        return DiffHunk(old.address, old.address + old.size, new.address, new.address + new.size, [old], [new])
+
+
+def _raw_differences(a: np.ndarray, b: np.ndarray, alignment: Alignment) -> List[Tuple[int, int]]:
+    """Find the words that differ within matched regions (only masked call targets can).
+
+    Returns:
+        (index in a, index in b) of each differing word
+    """
+    differences = []
+    for a_start, b_start, length in zip(alignment.a_starts, alignment.b_starts, alignment.lengths):
+        for k in np.flatnonzero(a[a_start:a_start + length] != b[b_start:b_start + length]).tolist():
+            differences.append((a_start + k, b_start + k))
+    return differences
+
+
+def _overlaps(ranges: List[Tuple[int, int]], start: int, end: int) -> bool:
+    """Whether [start, end) overlaps any of the sorted, disjoint ranges."""
+    i = bisect.bisect_right(ranges, (start, float("inf")))
+    if i and ranges[i - 1][1] > start:
+        return True
+    return i < len(ranges) and ranges[i][0] < end
+
+
+def _changed(discovery: CodeDiscovery, entry: int, ranges: List[Tuple[int, int]]) -> bool:
+    """Whether any block of a function overlaps a changed range."""
+    return any(_overlaps(ranges, discovery.blocks[start].start, discovery.blocks[start].end)
+               for start in discovery.functions[entry].blocks)
+
+
+def compare_functions(diff: ImageDiff, discovery_a: CodeDiscovery, discovery_b: CodeDiscovery
+                      ) -> List[Tuple[str, Optional[int], Optional[int]]]:
+    """Classify the discovered functions of two images against their diff.
+
+    A function of the first image is paired with the function of the second
+    that its entry translates to. A pair is changed if a hunk touches either
+    side, and moved if only its address differs.
+
+    Returns:
+        (FUNCTION_* kind, entry in a, entry in b) for every function that is not unchanged, by address
+    """
+    a_ranges = sorted((hunk.a_start, hunk.a_end) for hunk in diff.hunks)
+    b_ranges = sorted((hunk.b_start, hunk.b_end) for hunk in diff.hunks)
+
+    changes = []
+    paired = set()
+    for entry in sorted(discovery_a.functions):
+        mapped = diff.alignment.translate(entry)
+        if mapped is None or mapped not in discovery_b.functions:
+            changes.append((FUNCTION_REMOVED, entry, None))
+            continue
+        paired.add(mapped)
+        if _changed(discovery_a, entry, a_ranges) or _changed(discovery_b, mapped, b_ranges):
+            changes.append((FUNCTION_CHANGED, entry, mapped))
+        elif mapped != entry:
+            changes.append((FUNCTION_MOVED, entry, mapped))
+
+    changes.extend((FUNCTION_ADDED, None, entry) for entry in sorted(discovery_b.functions) if entry not in paired)
+    changes.sort(key=lambda change: change[1] if change[1] is not None else change[2])
+    return changes
+
+
+def diff_images(disassembler: UnSPDisassembler, source_a: Union[str, bytes], source_b: Union[str, bytes],
+                base_a: int = 0, base_b: int = 0) -> ImageDiff:
+    """Compare two images instruction by instruction.
+
+    Args:
+        disassembler: The disassembler whose instruction set is used
+        source_a: The first (old) image: a file path, or the binary data itself
+        source_b: The second (new) image: a file path, or the binary data itself
+        base_a: The address of the first byte of the first image
+        base_b: The address of the first byte of the second image
+
+    Returns:
+        The ImageDiff, with hunks in address order
+    """
+    raw_a = load_words(source_a)
+    raw_b = load_words(source_b)
+    alignment = align(_normalize_words(disassembler, raw_a), _normalize_words(disassembler, raw_b), base_a, base_b)
+    differences = _raw_differences(raw_a, raw_b, alignment)
+    del raw_a, raw_b
+
+    hunks: List[DiffHunk] = []
+    relocated: List[Tuple[int, int]] = []
+    with mapped_words(source_a) as words_a, mapped_words(source_b) as words_b:
+        differ = _Differ(disassembler, alignment, words_a, words_b)
+        for gap in alignment.gaps():
+            hunks.extend(differ.diff_gap(*gap))
+
+        table = disassembler.decoder_table
+        seen = set()
+        region_starts = alignment.a_starts
+        for a_index, b_index in differences:
+            # A differing word is a far call's first word or its second word
+            previous = table[words_a[a_index - 1]] if a_index else None
+            if previous is not None and previous.a22_operands is not None and \
+                    disassembler.sweep_start(words_a, a_index - 1) == a_index - 1:
+                if a_index == region_starts[bisect.bisect_right(region_starts, a_index) - 1]:
+                    # The call starts in the gap before, which covers it
+                    continue
+                a_index -= 1
+                b_index -= 1
+            if a_index in seen:
+                continue
+            seen.add(a_index)
+            hunk = differ.diff_call(a_index, b_index)
+            if hunk is None:
+                relocated.append((base_a + 2 * a_index, base_b + 2 * b_index))
+            else:
+                hunks.append(hunk)
+
+    hunks.sort(key=lambda hunk: (hunk.a_start, hunk.b_start))
+    return ImageDiff(alignment, hunks, relocated)
+
+
+def write_report(diff: ImageDiff, output: TextIO, name_a: str = "a", name_b: str = "b"):
+    """Write a diff as text: hunks of removed and added instructions, then functions and a summary."""
+    output.write(f"--- {name_a}\n+++ {name_b}\n")
+    for hunk in diff.hunks:
+        output.write(f"@@ -{hunk.a_start:08x},{hunk.a_end - hunk.a_start:x} "
+                     f"+{hunk.b_start:08x},{hunk.b_end - hunk.b_start:x} @@\n")
+        if hunk.removed is None:
+            output.write(f"  {(hunk.a_end - hunk.a_start) // 2} words replaced by "
+                         f"{(hunk.b_end - hunk.b_start) // 2} words\n")
+            continue
+        for instr in hunk.removed:
+            output.write(f"-{instr.address:08x}: {instr.text}\n")
+        for instr in hunk.added:
+            output.write(f"+{instr.address:08x}: {instr.text}\n")
+
+    if diff.functions is not None:
+        for kind, entry_a, entry_b in diff.functions:
+            if kind == FUNCTION_ADDED:
+                output.write(f"function {entry_b:08x}: {kind}\n")
+            elif kind == FUNCTION_REMOVED:
+                output.write(f"function {entry_a:08x}: {kind}\n")
+            else:
+                output.write(f"function {entry_a:08x} -> {entry_b:08x}: {kind}\n")
+
+    alignment = diff.alignment
+    output.write(f"{alignment.matched_words} of {alignment.count_a}/{alignment.count_b} words matched "
+                 f"in {len(alignment)} regions, {len(diff.hunks)} hunks, "
+                 f"{len(diff.relocated)} relocated call targets\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two unSP binary files instruction by instruction")
+    parser.add_argument("old_file", help="The first (old) binary file")
+    parser.add_argument("new_file", help="The second (new) binary file")
+    parser.add_argument("-o", "--output", help="Write the report to this file instead of stdout")
+    parser.add_argument("-b", "--base-address", type=lambda x: int(x, 0), default=0,
+                        help="The base address of both images (default: 0)")
+    parser.add_argument("--new-base-address", type=lambda x: int(x, 0),
+                        help="The base address of the new image (default: the same as the old one)")
+    parser.add_argument("-f", "--functions", action="store_true",
+                        help="Run code discovery on both images and report changed functions")
+    parser.add_argument("-e", "--entry", type=lambda x: int(x, 0), action="append", default=[],
+                        help="Entry point address in the old image for --functions (can be repeated)")
+    parser.add_argument("-j", "--json", default="unsp_instruction_set.json",
+                        help="Path to the instruction set JSON file")
+    parser.add_argument("--timing", action="store_true", help="Report the time taken on stderr")
+
+    args = parser.parse_args()
+
+    base_b = args.base_address if args.new_base_address is None else args.new_base_address
+    started = time.perf_counter()
+    disassembler = UnSPDisassembler(args.json)
+    diff = diff_images(disassembler, args.old_file, args.new_file, args.base_address, base_b)
+
+    if args.functions:
+        # Entry points carry over to the new image through the alignment
+        entries_b = [diff.alignment.translate(entry) for entry in args.entry]
+        discovery_a = discover_code(disassembler, args.old_file, args.base_address, args.entry)
+        discovery_b = discover_code(disassembler, args.new_file, base_b,
+                                    [entry for entry in entries_b if entry is not None])
+        diff.functions = compare_functions(diff, discovery_a, discovery_b)
+
+    if args.output:
+        with open(args.output, 'w', buffering=OUTPUT_BUFFER_SIZE) as f:
+            write_report(diff, f, args.old_file, args.new_file)
+    else:
+        write_report(diff, sys.stdout, args.old_file, args.new_file)
+
+    if args.timing:
+        print(f"compared in {time.perf_counter() - started:.3f} s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
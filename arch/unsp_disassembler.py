@@ -7,24 +7,833 @@ produces their assembly language representation based on the instruction
 set summary documentation.
 """
 
-import json
+import hashlib
+import marshal
+import mmap
+import os
 import sys
+import time
 import struct
-import argparse
-from typing import Dict, List, Tuple, Optional, Any, Union
+import bisect
+from array import array
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, List, Tuple, Optional, Any, Union, Sequence, Iterator, TextIO
+
+
+# Opcode table entry for words that do not decode to any instruction
+UNKNOWN_OPCODE = -1
+
+# Fields up to this width get precomputed int-indexed text tables
+_TABLE_FIELD_BITS = 8
+
+# Characters a hex or decimal rendering of a wide field can contain
+_NUMERIC_ALPHABET = frozenset("0123456789abcdefx")
+
+_A22_FIELDS = ("A22[21:16]", "A22[15:0]")
+
+# How an instruction affects control flow
+FLOW_NONE = 0            # falls through to the next instruction
+FLOW_CALL = 1            # direct call, returns to the next instruction
+FLOW_JUMP = 2            # direct unconditional jump
+FLOW_BRANCH = 3          # direct conditional branch, may fall through
+FLOW_RETURN = 4          # return from subroutine or interrupt
+FLOW_INDIRECT_CALL = 5   # call through a register
+FLOW_INDIRECT_JUMP = 6   # jump through a register, or any write to PC
+
+# Control flow of instructions that always transfer control, by name
+_FLOW_BY_NAME = {
+    "CALL": FLOW_CALL,
+    "JMPF": FLOW_JUMP,
+    "Branch": FLOW_BRANCH,
+    "RETF": FLOW_RETURN,
+    "RETI": FLOW_RETURN,
+    "CALLR": FLOW_INDIRECT_CALL,
+    "JMPR": FLOW_INDIRECT_JUMP,
+}
+
+# ALU operations that do not write their destination register
+_NON_WRITING_OPS = ("CMP", "TEST", "STORE")
+
+# Buffer size for listing output files
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# Number of words each worker decodes at a time in parallel mode
+PARALLEL_CHUNK_WORDS = 1 << 18
+
+# Format version of the compiled instruction set files
+COMPILED_SPEC_VERSION = 1
+
+
+def _parse_bits(bits: str) -> Tuple[int, int]:
+    """Parse a field bit specification.
+
+    Args:
+        bits: A bit range like "15:10" or a single bit like "6"
+
+    Returns:
+        A tuple containing the shift and the (unshifted) mask of the field
+    """
+    if ":" in bits:
+        start, end = map(int, bits.split(":"))
+    else:
+        start = end = int(bits)
+    return end, (1 << (start - end + 1)) - 1
+
+
+def _render_value(field_name: str, value: Union[int, str]) -> str:
+    """Render a field value the way it is substituted into the syntax."""
+    if isinstance(value, int) and field_name.startswith("IM"):
+        # Immediate values in hex
+        return f"0x{value:x}"
+    return str(value)
+
+
+def _may_form(placeholder: str, segments: List[Union[str, int]], k: int, texts: Optional[frozenset]) -> bool:
+    """Check whether a placeholder could match across the text of slot k.
+
+    Args:
+        placeholder: The placeholder about to be replaced
+        segments: Literal strings and slot numbers making up the syntax so far
+        k: The position of the slot in ``segments``
+        texts: Every text the slot can render to, or None for a plain number
+
+    Returns:
+        True if some rendering of the slot lets the placeholder match a span
+        that overlaps it (or, for an empty rendering, joins its neighbours)
+    """
+    # Literal context on either side; text beyond a neighbouring slot is unknown
+    left = segments[k - 1] if k > 0 and isinstance(segments[k - 1], str) else ""
+    left_open = k - (1 if left else 0) > 0
+    right = segments[k + 1] if k + 1 < len(segments) and isinstance(segments[k + 1], str) else ""
+    right_open = k + (1 if right else 0) + 1 < len(segments)
+
+    n = len(placeholder)
+    if texts is None:
+        # Numbers are non-empty runs of _NUMERIC_ALPHABET characters
+        for a in range(n):
+            for b in range(a + 1, n + 1):
+                if not _NUMERIC_ALPHABET.issuperset(placeholder[a:b]):
+                    break
+                before, after = placeholder[:a], placeholder[b:]
+                if ((left.endswith(before) or (left_open and before.endswith(left)))
+                        and (right.startswith(after) or (right_open and after.startswith(right)))):
+                    return True
+        return False
+
+    for text in texts:
+        for start in range(-(n - 1), max(len(text), 1)):
+            for i, char in enumerate(placeholder):
+                pos = start + i
+                if pos < 0:
+                    if -pos > len(left):
+                        if left_open:
+                            continue
+                        break
+                    if left[pos] != char:
+                        break
+                elif pos >= len(text):
+                    if pos - len(text) >= len(right):
+                        if right_open:
+                            continue
+                        break
+                    if right[pos - len(text)] != char:
+                        break
+                elif text[pos] != char:
+                    break
+            else:
+                return True
+    return False
+
+
+class InstructionDecoder:
+    """An instruction definition compiled once for fast decoding.
+
+    Field specs are parsed into shifts and masks, value and register maps
+    become tables indexed by the raw field value, and the syntax becomes a
+    ``str.format`` template, so decoding and rendering do no string parsing.
+
+    The syntax used to be filled in by calling ``str.replace`` for each field
+    in turn, which lets text substituted for one field be matched by a later
+    field name (``S`` inside a rendered ``SP``, for instance). Where that can
+    happen the decoder replays those replacements exactly instead of using a
+    template, so the output text is the same either way.
+    """
+
+    def __init__(self, index: int, definition: Dict[str, Any], register_name):
+        """Compile an instruction definition.
+
+        Args:
+            index: The index of the instruction in the sorted instruction set
+            definition: The instruction entry from the instruction set JSON
+            register_name: Callable mapping (register type, value) to a name
+        """
+        self.index = index
+        self.definition = definition
+        self.name = definition["name"]
+        self.syntax = definition["syntax"]
+
+        encoding_fields = [f for f in definition["encoding"].get("fields", []) if "bits" in f]
+        first_word = [f for f in encoding_fields if not f.get("second_word", False)]
+        second_word = [f for f in encoding_fields if f.get("second_word", False)]
+
+        # Number of bytes the instruction occupies
+        self.size = 4 if second_word else 2
+
+        # A repeated field name keeps its first position and its last definition
+        by_name: Dict[str, Dict[str, Any]] = {}
+        for field in first_word + second_word:
+            by_name[field["name"]] = field
+
+        self.field_names: Tuple[str, ...] = tuple(by_name)
+        self.field_index: Dict[str, int] = {name: i for i, name in enumerate(self.field_names)}
+
+        # (second_word, shift, mask) for each operand, in field order
+        self.fields: Tuple[Tuple[bool, int, int], ...] = tuple(
+            (field.get("second_word", False),) + _parse_bits(field["bits"])
+            for field in by_name.values()
+        )
+
+        # Per operand: table of values after value/register mapping (None for
+        # identity) and table of substituted text (None to use the format)
+        self._value_tables: List[Optional[List[Union[int, str]]]] = []
+        self._text_tables: List[Optional[List[str]]] = []
+        self._text_formats: List[Optional[str]] = []
+        for name, field in by_name.items():
+            self._compile_field(name, field, register_name)
+
+        self._compile_syntax()
+        self._compile_control_flow()
+        self._bind()
+
+    def _compile_field(self, name: str, field: Dict[str, Any], register_name):
+        """Build the lookup tables for one operand."""
+        shift, mask = _parse_bits(field["bits"])
+
+        # Value mappings come from the first field with this name
+        value_def = next(f for f in self.definition["encoding"]["fields"] if f["name"] == name)
+        values = value_def.get("values")
+        is_register = field.get("register", False) and (values is None or isinstance(values, dict))
+        if not isinstance(values, dict):
+            values = None
+
+        if not is_register and values is None and mask.bit_length() > _TABLE_FIELD_BITS:
+            self._value_tables.append(None)
+            self._text_tables.append(None)
+            self._text_formats.append("0x{:x}" if name.startswith("IM") else "{}")
+            return
+
+        value_width = _parse_bits(value_def["bits"])[1].bit_length()
+
+        # Determine register type based on field name
+        if name.startswith("Ra") or name.startswith("Rb"):
+            reg_type = "Ra_Rb"
+        elif name.startswith("Rx") or name.startswith("Ry"):
+            reg_type = "Rx_Ry"
+        else:
+            reg_type = "Rs_Rd"
+
+        table: List[Union[int, str]] = []
+        for value in range(mask + 1):
+            if is_register:
+                table.append(register_name(reg_type, value))
+            elif values is not None and format(value, f'0{value_width}b') in values:
+                table.append(values[format(value, f'0{value_width}b')])
+            else:
+                table.append(value)
+
+        self._value_tables.append(table)
+        self._text_tables.append([_render_value(name, value) for value in table])
+        self._text_formats.append(None)
+
+    def _value_getter(self, i: int):
+        """Return a function mapping operands to the mapped value of operand i."""
+        table = self._value_tables[i]
+        if table is None:
+            return lambda ops: ops[i]
+        return lambda ops: table[ops[i]]
+
+    def _text_getter(self, i: int):
+        """Return a function mapping operands to the substituted text of operand i."""
+        table = self._text_tables[i]
+        if table is None:
+            fmt = self._text_formats[i]
+            return lambda ops: fmt.format(ops[i])
+        return lambda ops: table[ops[i]]
+
+    def _getter(self, spec: Tuple) -> Callable[[Tuple[int, ...]], str]:
+        """Return a function mapping operands to the text a syntax step substitutes.
+
+        Steps are described by plain tuples, ("text", i), ("a22", high, low),
+        ("a16", i) or ("d", i or None), so that a compiled decoder can be
+        saved and loaded without its closures.
+        """
+        kind = spec[0]
+        if kind == "a22":
+            high = self._value_getter(spec[1])
+            low = self._value_getter(spec[2])
+            return lambda ops: f"0x{(high(ops) << 16) | low(ops):06x}"
+        if kind == "a16":
+            a16 = self._value_getter(spec[1])
+            return lambda ops: f"0x{a16(ops):04x}"
+        if kind == "d":
+            if spec[1] is None:
+                return lambda ops: ""
+            d = self._value_getter(spec[1])
+            return lambda ops: "" if d(ops) == 0 else "D:"
+        return self._text_getter(spec[1])
+
+    def _possible_texts(self, i: int) -> Optional[frozenset]:
+        """Return every text operand i can render to (None if it is a plain number)."""
+        table = self._text_tables[i]
+        return None if table is None else frozenset(table)
+
+    def _compile_syntax(self):
+        """Compile the syntax into a format template, or into replacement steps."""
+        # Each step is (placeholder, getter spec, possible texts or None for numbers)
+        steps = []
+        if all(name in self.field_index for name in _A22_FIELDS):
+            steps.append(("A22", ("a22",) + tuple(self.field_index[name] for name in _A22_FIELDS), None))
+        elif "A16" in self.field_index:
+            steps.append(("A16", ("a16", self.field_index["A16"]), None))
+
+        for i, name in enumerate(self.field_names):
+            if name not in _A22_FIELDS:
+                steps.append((name, ("text", i), self._possible_texts(i)))
+
+        # Clean up any remaining placeholders like {D:} when D=0
+        if "D" in self.field_index:
+            steps.append(("{D:}", ("d", self.field_index["D"]), frozenset(("", "D:"))))
+        else:
+            steps.append(("{D:}", ("d", None), frozenset(("",))))
+
+        self._step_specs = tuple((placeholder, spec) for placeholder, spec, _ in steps)
+        self._template = None
+        self._slot_specs = ()
+
+        # Replay the replacements over literal segments, with ints marking slots
+        segments: List[Union[str, int]] = [self.syntax]
+        for slot, (placeholder, _, texts) in enumerate(steps):
+            for k, seg in enumerate(segments):
+                if isinstance(seg, int) and _may_form(placeholder, segments, k, steps[seg][2]):
+                    # Substituted text could form this placeholder
+                    return
+
+            replaced: List[Union[str, int]] = []
+            for seg in segments:
+                if isinstance(seg, int) or placeholder not in seg:
+                    replaced.append(seg)
+                    continue
+                for j, part in enumerate(seg.split(placeholder)):
+                    if j:
+                        replaced.append(slot)
+                    if part:
+                        replaced.append(part)
+            segments = replaced
+
+        slots = sorted({seg for seg in segments if isinstance(seg, int)})
+        template = [self.name.replace("{", "{{").replace("}", "}}"), " "]
+        for seg in segments:
+            if isinstance(seg, int):
+                template.append("{%d}" % slots.index(seg))
+            else:
+                template.append(seg.replace("{", "{{").replace("}", "}}"))
+
+        self._template = "".join(template)
+        self._slot_specs = tuple(steps[slot][1] for slot in slots)
+
+    def _bind(self):
+        """Build the rendering functions from the compiled step specs."""
+        self._steps = tuple((placeholder, self._getter(spec)) for placeholder, spec in self._step_specs)
+        self._slot_getters = tuple(self._getter(spec) for spec in self._slot_specs)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Return the compiled decoder as plain data (without bound functions)."""
+        state = dict(self.__dict__)
+        del state["_steps"], state["_slot_getters"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._bind()
+
+    def _compile_control_flow(self):
+        """Classify the instruction's effect on control flow."""
+        self.flow = _FLOW_BY_NAME.get(self.name, FLOW_NONE)
+        index = self.field_index
+
+        # Operand indexes for direct targets
+        self._a22 = tuple(index[name] for name in _A22_FIELDS) \
+            if all(name in index for name in _A22_FIELDS) else None
+        self._displacement = (index["D"], index["IM6"]) if "D" in index and "IM6" in index else None
+
+        # Raw OP values that make a branch unconditional
+        self._unconditional = frozenset()
+        if self.flow == FLOW_BRANCH and "OP" in index:
+            ops = self._value_tables[index["OP"]] or []
+            self._unconditional = frozenset(v for v, op in enumerate(ops) if op == "JMP")
+
+        # ALU instructions whose destination is PC are jumps too
+        self._pc_destination = None
+        if (self.flow == FLOW_NONE and "Rd" in index and self._value_tables[index["Rd"]] is not None
+                and self.syntax.replace(" ", "").startswith("Rd=")):
+            pc_values = frozenset(v for v, reg in enumerate(self._value_tables[index["Rd"]]) if reg == "PC")
+            op = index.get("OP")
+            passive = frozenset(v for v, name in enumerate(self._value_tables[op] or [])
+                                if name in _NON_WRITING_OPS) if op is not None else frozenset()
+            self._pc_destination = (index["Rd"], pc_values, op, passive)
+
+    def control_flow(self, address: int, operands: Tuple[int, ...]) -> Tuple[int, Optional[int]]:
+        """Determine how a decoded instruction transfers control.
+
+        Addresses are byte addresses, as in the listing. A22 operands are
+        word addresses, and branch displacements count words from the word
+        after the branch (backwards when D is set).
+
+        Args:
+            address: The address of the instruction
+            operands: The raw operand values returned by ``decode``
+
+        Returns:
+            A tuple of the FLOW_* kind and the direct target address (or None)
+        """
+        flow = self.flow
+        if flow == FLOW_NONE:
+            if self._pc_destination is not None:
+                rd, pc_values, op, passive = self._pc_destination
+                if operands[rd] in pc_values and (op is None or operands[op] not in passive):
+                    return FLOW_INDIRECT_JUMP, None
+            return FLOW_NONE, None
+
+        if flow in (FLOW_CALL, FLOW_JUMP) and self._a22 is not None:
+            high, low = self._a22
+            return flow, 2 * ((operands[high] << 16) | operands[low])
+
+        if flow == FLOW_BRANCH and self._displacement is not None:
+            d, im6 = self._displacement
+            displacement = 2 * operands[im6]
+            target = address + 2 - displacement if operands[d] else address + 2 + displacement
+            if "OP" in self.field_index and operands[self.field_index["OP"]] in self._unconditional:
+                return FLOW_JUMP, target
+            return FLOW_BRANCH, target
+
+        return flow, None
+
+    @property
+    def a22_operands(self) -> Optional[Tuple[int, int]]:
+        """The operand indexes of the high and low halves of an A22 target, or None."""
+        return self._a22
+
+    @property
+    def target_operands(self) -> frozenset:
+        """The operand indexes that only encode a direct target (A22, or a branch displacement)."""
+        return frozenset((self._a22 or ()) + (self._displacement or ()))
+
+    def value_table(self, i: int) -> Optional[List[Union[int, str]]]:
+        """Return the register/value names of operand i by raw value, or None if it is used as is."""
+        return self._value_tables[i]
+
+    def decode(self, word: int, second_word: int = 0) -> Tuple[int, ...]:
+        """Extract the raw operand values of an instruction.
+
+        Args:
+            word: The first instruction word
+            second_word: The second instruction word (two-word instructions only)
+
+        Returns:
+            The raw value of each field, in ``field_names`` order
+        """
+        return tuple([((second_word if second else word) >> shift) & mask
+                      for second, shift, mask in self.fields])
+
+    def values(self, operands: Tuple[int, ...]) -> Tuple[Union[int, str], ...]:
+        """Map raw operand values through the register and value tables.
+
+        Args:
+            operands: The raw operand values returned by ``decode``
+
+        Returns:
+            Register names and value names where the spec defines them, raw
+            values otherwise, in ``field_names`` order
+        """
+        return tuple([raw if table is None else table[raw] for raw, table in zip(operands, self._value_tables)])
+
+    def render(self, operands: Tuple[int, ...]) -> str:
+        """Render decoded operands as assembly text.
+
+        Args:
+            operands: The raw operand values returned by ``decode``
+
+        Returns:
+            The instruction name followed by the substituted syntax
+        """
+        if self._template is not None:
+            return self._template.format(*[getter(operands) for getter in self._slot_getters])
+
+        result = self.syntax
+        for placeholder, getter in self._steps:
+            result = result.replace(placeholder, getter(operands))
+        return f"{self.name} {result}"
+
+
+class Instruction:
+    """A decoded instruction whose assembly text is rendered on first use.
+
+    Only the address, raw words and the decoder are stored; operands are
+    extracted from the words when asked for, and the text is rendered once
+    and cached.
+    """
+
+    __slots__ = ("address", "size", "word", "second_word", "decoder", "_text")
+
+    def __init__(self, address: int, size: int, word: int, second_word: int = 0,
+                 decoder: Optional[InstructionDecoder] = None, text: Optional[str] = None):
+        """Create an instruction record.
+
+        Args:
+            address: The address of the instruction
+            size: The number of bytes consumed
+            word: The first instruction word
+            second_word: The second instruction word (two-word instructions only)
+            decoder: The matching instruction decoder (None for unknown words)
+            text: The rendered text, if already known
+        """
+        self.address = address
+        self.size = size
+        self.word = word
+        self.second_word = second_word
+        self.decoder = decoder
+        self._text = text
+
+    @property
+    def index(self) -> int:
+        """The index of the instruction in the instruction set (UNKNOWN_OPCODE if none)."""
+        return UNKNOWN_OPCODE if self.decoder is None else self.decoder.index
+
+    @property
+    def name(self) -> Optional[str]:
+        """The instruction name, or None for unknown words."""
+        return None if self.decoder is None else self.decoder.name
+
+    @property
+    def words(self) -> Tuple[int, ...]:
+        """The raw instruction words."""
+        return (self.word, self.second_word) if self.size == 4 else (self.word,)
+
+    @property
+    def complete(self) -> bool:
+        """Whether the instruction decoded (known opcode with all of its words)."""
+        return self.decoder is not None and self.size == self.decoder.size
+
+    @property
+    def operands(self) -> Tuple[int, ...]:
+        """The raw operand values, in the decoder's field order (empty if incomplete)."""
+        if not self.complete:
+            return ()
+        return self.decoder.decode(self.word, self.second_word)
+
+    @property
+    def control_flow(self) -> Tuple[int, Optional[int]]:
+        """The FLOW_* kind and direct target address (FLOW_NONE if incomplete)."""
+        if not self.complete:
+            return FLOW_NONE, None
+        return self.decoder.control_flow(self.address, self.operands)
+
+    @property
+    def text(self) -> str:
+        """The assembly text, rendered on first access."""
+        if self._text is None:
+            if self.decoder is None:
+                self._text = f"Unknown instruction: 0x{self.word:04x}"
+            elif self.size < self.decoder.size:
+                self._text = f"Incomplete instruction {self.decoder.name} (needs second word)"
+            else:
+                self._text = self.decoder.render(self.decoder.decode(self.word, self.second_word))
+        return self._text
+
+    @property
+    def rendered(self) -> bool:
+        """Whether the text has already been rendered (or was known when decoded)."""
+        return self._text is not None
+
+    def render(self, operands: Tuple[int, ...]) -> str:
+        """Render and cache the text of a complete instruction from its already extracted operands."""
+        self._text = self.decoder.render(operands)
+        return self._text
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Instruction):
+            return NotImplemented
+        return (self.address, self.size, self.word, self.second_word, self.index) == \
+            (other.address, other.size, other.word, other.second_word, other.index)
+
+    def __hash__(self) -> int:
+        return hash((self.address, self.size, self.word, self.second_word))
+
+    def __repr__(self) -> str:
+        return f"Instruction(address=0x{self.address:x}, size={self.size}, text={self.text!r})"
+
+
+class InstructionListing:
+    """A whole decoded listing packed into parallel arrays.
+
+    Each instruction takes a few bytes of array storage instead of a Python
+    object; indexing creates an Instruction on demand, and its text is only
+    rendered when read. The listing never holds rendered text, so its memory
+    use stays at the array storage however much of it is displayed.
+    """
+
+    def __init__(self, decoders: Sequence[InstructionDecoder], base_address: int = 0):
+        """Create an empty listing.
+
+        Args:
+            decoders: The decoders that instruction indexes refer to
+            base_address: The address of the first byte of the image
+        """
+        self.decoders = decoders
+        self.base_address = base_address
+        self.offsets = array("I")       # byte offset of each instruction from base_address
+        self.indexes = array("h")       # instruction index (UNKNOWN_OPCODE if none)
+        self.sizes = array("B")
+        self.words = array("H")
+        self.second_words = array("H")
+
+    def append(self, offset: int, index: int, size: int, word: int, second_word: int = 0):
+        """Add an instruction at the end of the listing."""
+        self.offsets.append(offset)
+        self.indexes.append(index)
+        self.sizes.append(size)
+        self.words.append(word)
+        self.second_words.append(second_word)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, i: int) -> Instruction:
+        if i < 0:
+            i += len(self.offsets)
+        index = self.indexes[i]
+        return Instruction(self.base_address + self.offsets[i], self.sizes[i], self.words[i],
+                           self.second_words[i], None if index == UNKNOWN_OPCODE else self.decoders[index])
+
+    def __iter__(self) -> Iterator[Instruction]:
+        for i in range(len(self.offsets)):
+            yield self[i]
+
+    def text(self, i: int) -> str:
+        """Render the assembly text of instruction i."""
+        return self[i].text
+
+    def find(self, address: int) -> Optional[int]:
+        """Find the instruction covering an address.
+
+        Args:
+            address: The address to look up
+
+        Returns:
+            The position of the instruction in the listing, or None
+        """
+        i = bisect.bisect_right(self.offsets, address - self.base_address) - 1
+        if i < 0 or address >= self.base_address + self.offsets[i] + self.sizes[i]:
+            return None
+        return i
+
+
+def word_view(data) -> Sequence[int]:
+    """View a buffer as little-endian 16-bit words without copying it.
+
+    Args:
+        data: The binary data (any object supporting the buffer protocol)
+
+    Returns:
+        An indexable sequence of the complete words in data
+    """
+    view = memoryview(data).cast("B")
+    view = view[:len(view) & ~1]
+    if sys.byteorder == "little":
+        return view.cast("H")
+
+    # Big-endian hosts need a swapped copy
+    words = array("H")
+    words.frombytes(view)
+    words.byteswap()
+    return words
+
+
+@contextmanager
+def mapped_words(source: Union[str, os.PathLike, bytes]) -> Iterator[Sequence[int]]:
+    """Open an image as a sequence of 16-bit words.
+
+    Paths are memory-mapped read-only, so pages are only loaded as they are
+    touched; buffers are viewed in place. The views are released on exit so
+    the mapping can be closed.
+
+    Args:
+        source: A file path, or the binary data itself (any buffer)
+
+    Yields:
+        An indexable sequence of the complete words in the image
+    """
+    if not isinstance(source, (str, os.PathLike)):
+        words = word_view(source)
+        try:
+            yield words
+        finally:
+            if isinstance(words, memoryview):
+                words.release()
+        return
+
+    with open(source, 'rb') as f:
+        # mmap cannot map an empty file
+        if os.fstat(f.fileno()).st_size == 0:
+            yield word_view(b"")
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as image:
+            words = word_view(image)
+            try:
+                yield words
+            finally:
+                if isinstance(words, memoryview):
+                    words.release()
 
 
 class UnSPDisassembler:
     def __init__(self, instruction_set_file: str = "unsp_instruction_set.json"):
-        """Initialize the disassembler with the instruction set definition."""
-        with open(instruction_set_file, 'r') as f:
-            self.instruction_set_data = json.load(f)
-        
-        self.instructions = self.instruction_set_data["instruction_set"]
-        self.registers = self.instruction_set_data["registers"]
-        
-        # Sort instructions by opcode length (descending) to prioritize longer matches
-        self.instructions.sort(key=lambda x: len(x["encoding"]["opcode"]), reverse=True)
+        """Initialize the disassembler with the instruction set definition.
+
+        Parsing the JSON and compiling every instruction is done once per
+        spec: the result is saved next to it (in ``__pycache__``, keyed by the
+        spec's hash) and loaded directly by later runs.
+        """
+        self.instruction_set_file = os.path.abspath(instruction_set_file)
+        with open(instruction_set_file, 'rb') as f:
+            spec = f.read()
+
+        # Identifies the spec contents for caches of decoded results
+        self.spec_hash = hashlib.sha256(spec).hexdigest()
+
+        compiled = self._load_compiled()
+        if compiled is not None:
+            self.instruction_set_data, states = compiled
+            self.instructions = self.instruction_set_data["instruction_set"]
+            self.registers = self.instruction_set_data["registers"]
+            self.decoders = []
+            for state in states:
+                decoder = InstructionDecoder.__new__(InstructionDecoder)
+                decoder.__setstate__(state)
+                self.decoders.append(decoder)
+        else:
+            import json
+            self.instruction_set_data = json.loads(spec)
+
+            self.instructions = self.instruction_set_data["instruction_set"]
+            self.registers = self.instruction_set_data["registers"]
+
+            # Sort instructions by opcode length (descending) to prioritize longer matches
+            self.instructions.sort(key=lambda x: len(x["encoding"]["opcode"]), reverse=True)
+
+            # Compile every instruction once
+            self.decoders = [InstructionDecoder(i, instr, self._get_register_name)
+                             for i, instr in enumerate(self.instructions)]
+            self._save_compiled()
+
+        # Dispatch on the first word directly
+        self._opcode_table = self._build_opcode_table()
+        self._decoder_table = self._build_decoder_table()
+
+    @property
+    def opcode_table(self) -> List[int]:
+        """The instruction index (or UNKNOWN_OPCODE) of each of the 65536 first words; do not modify."""
+        return self._opcode_table
+
+    @property
+    def decoder_table(self) -> List[Optional["InstructionDecoder"]]:
+        """The decoder (or None) of each of the 65536 first words; do not modify."""
+        return self._decoder_table
+
+    def decoder_for(self, word: int) -> Optional["InstructionDecoder"]:
+        """Return the decoder of the instruction a first word starts, or None if it is unknown."""
+        return self._decoder_table[word]
+
+    @property
+    def compiled_spec_file(self) -> str:
+        """The path of the compiled form of the instruction set file."""
+        directory, name = os.path.split(self.instruction_set_file)
+        stem = os.path.splitext(name)[0]
+        return os.path.join(directory, "__pycache__", f"{stem}.{sys.implementation.cache_tag}.spec")
+
+    def _load_compiled(self) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """Load the compiled spec if it was built from the current file.
+
+        Returns:
+            The instruction set data and decoder states, or None if missing or stale
+        """
+        try:
+            with open(self.compiled_spec_file, 'rb') as f:
+                version, spec_hash, data, states = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if version != COMPILED_SPEC_VERSION or spec_hash != self.spec_hash:
+            return None
+        return data, states
+
+    def _save_compiled(self):
+        """Write the compiled spec atomically, ignoring unwritable locations."""
+        path = self.compiled_spec_file
+        payload = (COMPILED_SPEC_VERSION, self.spec_hash, self.instruction_set_data,
+                   [decoder.__getstate__() for decoder in self.decoders])
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(marshal.dumps(payload))
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def _build_opcode_table(self) -> List[int]:
+        """Build the 64K-entry dispatch table for first instruction words.
+
+        Every unSP instruction starts with a 16-bit word, so each possible word
+        is mapped once to the index of its instruction in ``self.instructions``
+        (or ``UNKNOWN_OPCODE``). An opcode of length L covers a contiguous run
+        of 2**(16 - L) words, so the table is filled with slice assignments.
+
+        Returns:
+            A list of 65536 instruction indexes
+        """
+        table = [UNKNOWN_OPCODE] * 0x10000
+
+        # Fill from lowest to highest priority so that longer opcodes (and, for
+        # equal lengths, earlier entries) overwrite the shorter ones they shadow
+        for index in reversed(range(len(self.instructions))):
+            opcode = self.instructions[index]["encoding"]["opcode"]
+            shift = 16 - len(opcode)
+            start = int(opcode, 2) << shift
+            end = start + (1 << shift)
+            table[start:end] = [index] * (end - start)
+
+        return table
+
+    def _build_decoder_table(self) -> List[Optional[InstructionDecoder]]:
+        """Build the 64K-entry table of decoders for first instruction words.
+
+        Filled the same way as the opcode table, with None for unknown words.
+
+        Returns:
+            A list of 65536 decoders (or None)
+        """
+        table: List[Optional[InstructionDecoder]] = [None] * 0x10000
+        for decoder in reversed(self.decoders):
+            shift = 16 - len(decoder.definition["encoding"]["opcode"])
+            start = int(decoder.definition["encoding"]["opcode"], 2) << shift
+            end = start + (1 << shift)
+            table[start:end] = [decoder] * (end - start)
+        return table
 
     def _extract_bits(self, value: int, start: int, end: int) -> int:
         """Extract a bit field from a value.
@@ -55,18 +864,12 @@ class UnSPDisassembler:
         Returns:
             A tuple containing the matched instruction definition and the number of bits matched
         """
-        for instr in self.instructions:
-            opcode = instr["encoding"]["opcode"]
-            opcode_len = len(opcode)
-            instr_opcode = self._extract_bits(instruction, 15, 16 - opcode_len)
-            
-            # Convert binary string to integer for comparison
-            opcode_int = int(opcode, 2)
-            
-            if instr_opcode == opcode_int:
-                return instr, opcode_len
-                
-        return None, 0
+        index = self._opcode_table[instruction & 0xFFFF]
+        if index == UNKNOWN_OPCODE:
+            return None, 0
+
+        instr = self.instructions[index]
+        return instr, len(instr["encoding"]["opcode"])
 
     def _get_register_name(self, reg_type: str, value: int) -> str:
         """Get the register name for a given register type and value.
@@ -92,197 +895,332 @@ class UnSPDisassembler:
         else:
             return f"R{value}"
 
-    def disassemble_instruction(self, data: bytes, address: int) -> Tuple[str, int]:
+    def disassemble_instruction(self, data: bytes, address: int, offset: int = 0) -> Tuple[str, int]:
         """Disassemble a single instruction.
         
         Args:
-            data: The binary data containing the instruction
+            data: The binary data containing the instruction (any buffer)
             address: The current address of the instruction
+            offset: The byte offset of the instruction within data
             
         Returns:
             A tuple containing the disassembled instruction string and the number of bytes consumed
         """
-        if len(data) < 2:
+        remaining = len(data) - offset
+        if remaining < 2:
             return "Insufficient data", 0
         
-        # Read the first word (16 bits)
-        instr_word = struct.unpack("<H", data[:2])[0]
-        
-        # Find the matching instruction
-        instr_def, opcode_bits = self._match_opcode(instr_word)
-        if not instr_def:
+        # Read the first word (16 bits) and find the matching instruction
+        instr_word = struct.unpack_from("<H", data, offset)[0]
+        decoder = self._decoder_table[instr_word]
+        if decoder is None:
             return f"Unknown instruction: 0x{instr_word:04x}", 2
-        
-        # Get the instruction name and base syntax
-        instr_name = instr_def["name"]
-        syntax = instr_def["syntax"]
-        
-        # Get the field values
-        field_values = {}
-        second_word_needed = False
-        
-        # Check if there are fields to extract
-        if "fields" in instr_def["encoding"]:
-            for field in instr_def["encoding"]["fields"]:
-                # Check if this field requires the second word
-                if field.get("second_word", False):
-                    second_word_needed = True
-                    continue
-                
-                field_name = field["name"]
-                
-                # Extract bit positions
-                if "bits" in field:
-                    bit_spec = field["bits"]
-                    
-                    # Handle range format like "15:10"
-                    if ":" in bit_spec:
-                        start, end = map(int, bit_spec.split(":"))
-                        field_values[field_name] = self._extract_bits(instr_word, start, end)
-                    else:
-                        # Single bit
-                        bit_pos = int(bit_spec)
-                        field_values[field_name] = (instr_word >> bit_pos) & 1
-                        
-                # Special case for field combinations (like in INT_SET)
-                if "values" in field and not isinstance(field["values"], dict):
-                    # Skip fields that are just containers for value lookups
-                    continue
-                
-                # Handle register fields
-                if field.get("register", False):
-                    reg_value = field_values[field_name]
-                    # Determine register type based on field name
-                    if field_name.startswith("Ra") or field_name.startswith("Rb"):
-                        reg_type = "Ra_Rb"
-                    elif field_name.startswith("Rx") or field_name.startswith("Ry"):
-                        reg_type = "Rx_Ry"
-                    else:
-                        reg_type = "Rs_Rd"
-                        
-                    field_values[field_name] = self._get_register_name(reg_type, reg_value)
-        
-        # Handle second word if needed
-        bytes_consumed = 2
-        if second_word_needed:
-            if len(data) < 4:
-                return f"Incomplete instruction {instr_name} (needs second word)", 2
-                
-            second_word = struct.unpack("<H", data[2:4])[0]
-            bytes_consumed = 4
-            
-            # Process fields in the second word
-            for field in instr_def["encoding"]["fields"]:
-                if field.get("second_word", False):
-                    field_name = field["name"]
-                    bit_spec = field["bits"]
-                    
-                    # Handle range format like "15:0"
-                    if ":" in bit_spec:
-                        start, end = map(int, bit_spec.split(":"))
-                        field_values[field_name] = self._extract_bits(second_word, start, end)
-                    else:
-                        # Single bit
-                        bit_pos = int(bit_spec)
-                        field_values[field_name] = (second_word >> bit_pos) & 1
-        
-        # Substitute field values into the syntax
-        result = syntax
-        
-        # Handle special format for opcodes with value mapping
-        for field_name, field_value in field_values.items():
-            # Look up the field in the instruction definition
-            field_def = next((f for f in instr_def["encoding"].get("fields", []) 
-                             if f["name"] == field_name), None)
-            
-            # If the field has value mappings and the value exists in the mapping
-            if field_def and "values" in field_def:
-                # Convert field_value to binary string with appropriate length
-                if isinstance(field_value, int):
-                    # Determine the bit width from the field definition
-                    if ":" in field_def.get("bits", ""):
-                        start, end = map(int, field_def["bits"].split(":"))
-                        bit_width = start - end + 1
-                    else:
-                        bit_width = 1
-                        
-                    value_str = format(field_value, f'0{bit_width}b')
-                    
-                    # Look up the string value from the mapping
-                    if value_str in field_def["values"]:
-                        field_values[field_name] = field_def["values"][value_str]
-            
-            # For A22, A16, and similar address fields
-            if field_name.startswith("A") and "[" in field_name and ":" in field_name:
-                # This is part of a multi-part address, don't replace yet
-                continue
-                
-        # Handle special cases for address fields (A22, A16)
-        if "A22[21:16]" in field_values and "A22[15:0]" in field_values:
-            address_value = (field_values["A22[21:16]"] << 16) | field_values["A22[15:0]"]
-            result = result.replace("A22", f"0x{address_value:06x}")
-        elif "A16" in field_values:
-            address_value = field_values["A16"]
-            result = result.replace("A16", f"0x{address_value:04x}")
-        
-        # Replace remaining placeholders
-        for field_name, field_value in field_values.items():
-            # Skip already handled special cases
-            if field_name in ["A22[21:16]", "A22[15:0]"]:
-                continue
-                
-            # For regular fields, do a simple replacement
-            if isinstance(field_value, int):
-                if field_name.startswith("IM"):
-                    # Immediate values in hex
-                    result = result.replace(field_name, f"0x{field_value:x}")
-                else:
-                    result = result.replace(field_name, str(field_value))
+
+        second_word = 0
+        if decoder.size == 4:
+            if remaining < 4:
+                return f"Incomplete instruction {decoder.name} (needs second word)", 2
+            second_word = struct.unpack_from("<H", data, offset + 2)[0]
+
+        return decoder.render(decoder.decode(instr_word, second_word)), decoder.size
+
+    def iter_instructions(self, source: Union[str, os.PathLike, bytes], base_address: int = 0,
+                          jobs: int = 1, chunk_words: int = PARALLEL_CHUNK_WORDS) -> Iterator[Instruction]:
+        """Linearly disassemble an image, yielding instructions as they are decoded.
+
+        Files are memory-mapped rather than read, and the image is walked as
+        an array of little-endian 16-bit words with an index, so memory use
+        stays flat regardless of the image size. A trailing odd byte is
+        ignored.
+
+        With more than one job, word-aligned chunks of the image are decoded
+        in a process pool and stitched back together; the result is the same
+        as a single-process sweep.
+
+        Args:
+            source: A file path, or the binary data itself (any buffer)
+            base_address: The address of the first byte of the image
+            jobs: The number of worker processes to use
+            chunk_words: The number of words per chunk when using workers
+
+        Yields:
+            An Instruction for each decoded instruction, in address order
+        """
+        with mapped_words(source) as words:
+            if jobs > 1 and len(words) > chunk_words:
+                yield from self._iter_parallel(source, words, base_address, jobs, chunk_words)
             else:
-                result = result.replace(field_name, str(field_value))
-        
-        # Clean up any remaining placeholders like {D:} when D=0
-        result = result.replace("{D:}", "") if field_values.get("D", 0) == 0 else result.replace("{D:}", "D:")
-        
-        # Format the output with address and raw bytes
-        raw_bytes = " ".join([f"{data[i]:02x}" for i in range(bytes_consumed)])
-        return f"{instr_name} {result}", bytes_consumed
+                yield from self.decode_range(words, base_address, 0, len(words))
 
-    def disassemble_file(self, input_file: str, output_file: str = None, base_address: int = 0):
+    def iter_range(self, source: Union[str, os.PathLike, bytes], base_address: int = 0,
+                   start: Optional[int] = None, end: Optional[int] = None) -> Iterator[Instruction]:
+        """Disassemble the instructions of the linear sweep that start in [start, end).
+
+        Only the requested part of the image is decoded; the result is the
+        same as the matching part of ``iter_instructions``.
+
+        Args:
+            source: A file path, or the binary data itself (any buffer)
+            base_address: The address of the first byte of the image
+            start: The first address (default: the start of the image)
+            end: The address to stop at (default: the end of the image)
+
+        Yields:
+            An Instruction for each decoded instruction, in address order
+        """
+        with mapped_words(source) as words:
+            count = len(words)
+            first = 0 if start is None else min(max((start - base_address + 1) // 2, 0), count)
+            stop = count if end is None else min(max((end - base_address + 1) // 2, 0), count)
+            yield from self.decode_range(words, base_address, self.sweep_start(words, first), stop)
+
+    def sweep_start(self, words: Sequence[int], index: int) -> int:
+        """Return the first word at or after words[index] that the linear sweep starts an instruction at.
+
+        Only the run of two-word opcodes directly before index matters: the
+        sweep starts an instruction at the beginning of the run, and then at
+        every other word.
+        """
+        table = self._decoder_table
+        run = index
+        while run > 0:
+            decoder = table[words[run - 1]]
+            if decoder is None or decoder.size == 2:
+                break
+            run -= 1
+        return index + ((index - run) & 1)
+
+    def disassemble_listing(self, source: Union[str, os.PathLike, bytes], base_address: int = 0
+                            ) -> InstructionListing:
+        """Decode a whole image into a compact, lazily rendered listing.
+
+        Args:
+            source: A file path, or the binary data itself (any buffer)
+            base_address: The address of the first byte of the image
+
+        Returns:
+            An InstructionListing holding every instruction of the linear sweep
+        """
+        listing = InstructionListing(self.decoders, base_address)
+        for instr in self.iter_instructions(source, base_address):
+            listing.append(instr.address - base_address, instr.index, instr.size, instr.word, instr.second_word)
+        return listing
+
+    def decode_range(self, words: Sequence[int], base_address: int, start: int, stop: int
+                     ) -> Iterator[Instruction]:
+        """Disassemble the instructions starting in words[start:stop].
+
+        The last instruction may read its second word from beyond stop.
+
+        Args:
+            words: The image as a sequence of 16-bit words
+            base_address: The address of words[0]
+            start: The index of the first word to decode
+            stop: The index to stop decoding at
+
+        Yields:
+            An Instruction for each decoded instruction, in address order
+        """
+        table = self._decoder_table
+        count = len(words)
+        i = start
+
+        while i < stop:
+            word = words[i]
+            decoder = table[word]
+            address = base_address + 2 * i
+
+            if decoder is None or decoder.size == 2:
+                yield Instruction(address, 2, word, 0, decoder)
+                i += 1
+            elif i + 1 < count:
+                yield Instruction(address, 4, word, words[i + 1], decoder)
+                i += 2
+            else:
+                # Incomplete instruction (needs second word)
+                yield Instruction(address, 2, word, 0, decoder)
+                i += 1
+
+    def _iter_parallel(self, source, words: Sequence[int], base_address: int, jobs: int,
+                       chunk_words: int) -> Iterator[Instruction]:
+        """Disassemble chunks of an image in worker processes.
+
+        Each chunk is decoded as if an instruction started at its first word.
+        When a two-word instruction straddles a boundary that is wrong for the
+        start of the next chunk, the local sweep re-decodes from the real
+        boundary until it reaches an instruction start the worker also found;
+        from there on both sweeps agree.
+
+        Args:
+            source: The file path or buffer the words were read from
+            words: The image as a sequence of 16-bit words
+            base_address: The address of words[0]
+            jobs: The number of worker processes
+            chunk_words: The number of words per chunk
+
+        Yields:
+            An Instruction for each decoded instruction, in address order
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        count = len(words)
+        is_path = isinstance(source, (str, os.PathLike))
+
+        def submit(executor, start):
+            stop = min(start + chunk_words, count)
+            if is_path:
+                # Workers map the file themselves
+                return executor.submit(_disassemble_chunk, os.fspath(source), base_address, start, stop, 0)
+
+            # Send the chunk plus the word a straddling instruction may need
+            chunk = bytes(memoryview(source).cast("B")[2 * start:2 * min(stop + 1, count)])
+            return executor.submit(_disassemble_chunk, chunk, base_address + 2 * start, 0, stop - start, start)
+
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                                 initargs=(self.instruction_set_file,)) as executor:
+            # Keep a bounded window of chunks in flight so memory stays flat
+            pending = deque()
+            next_start = 0
+            while next_start < count and len(pending) < 2 * jobs:
+                pending.append((next_start, submit(executor, next_start)))
+                next_start += chunk_words
+
+            expected = 0
+            while pending:
+                start, future = pending.popleft()
+                if next_start < count:
+                    pending.append((next_start, submit(executor, next_start)))
+                    next_start += chunk_words
+
+                starts, sizes, texts = future.result()
+                stop = min(start + chunk_words, count)
+                first = bisect.bisect_left(starts, expected)
+
+                if first == len(starts) or starts[first] != expected:
+                    # Resynchronize with the worker's sweep
+                    for instr in self.decode_range(words, base_address, expected, stop):
+                        yield instr
+                        expected = (instr.address - base_address) // 2 + instr.size // 2
+                        first = bisect.bisect_left(starts, expected)
+                        if first < len(starts) and starts[first] == expected:
+                            break
+                    else:
+                        continue
+
+                table = self._decoder_table
+                for index, size, text in zip(starts[first:], sizes[first:], texts[first:]):
+                    word = words[index]
+                    second_word = words[index + 1] if size == 4 else 0
+                    yield Instruction(base_address + 2 * index, size, word, second_word, table[word], text)
+                    expected = index + size // 2
+
+    def write_listing(self, source: Union[str, os.PathLike, bytes], output: TextIO, base_address: int = 0,
+                      jobs: int = 1, cache=None, stats=None, start: Optional[int] = None,
+                      end: Optional[int] = None):
+        """Write the disassembly listing of an image to a text stream as it is decoded.
+
+        Lines are separated (not terminated) by newlines.
+
+        Args:
+            source: A file path, or the binary data itself
+            output: The text stream to write to
+            base_address: The base address for the disassembly
+            jobs: The number of worker processes to use (ignored with a cache)
+            cache: An optional unsp_cache.DisassemblyCache to serve unchanged pages from
+            stats: An optional unsp_stats.DisassemblyStats to time the run and count instructions in
+            start: Only list instructions from this address on (jobs, cache and stats are then ignored)
+            end: Only list instructions before this address
+        """
+        if start is not None or end is not None:
+            instructions = self.iter_range(source, base_address, start, end)
+            stats = None
+        elif cache is not None:
+            instructions = cache.iter_instructions(self, source, base_address)
+        else:
+            instructions = self.iter_instructions(source, base_address, jobs)
+
+        if stats is not None:
+            started = time.perf_counter()
+            instructions = stats.track_instructions(self, instructions)
+            output = stats.track_output(output)
+
+        separator = ""
+        for instr in instructions:
+            output.write(f"{separator}{instr.address:08x}: {instr.text}")
+            separator = "\n"
+
+        if stats is not None:
+            output.flush()
+            stats.finish(time.perf_counter() - started)
+
+    def disassemble_file(self, input_file: str, output_file: str = None, base_address: int = 0,
+                         jobs: int = 1, cache=None, stats=None, start: Optional[int] = None,
+                         end: Optional[int] = None):
         """Disassemble a binary file containing unSP instructions.
         
         Args:
             input_file: The path to the binary file
             output_file: The path to the output file (optional)
             base_address: The base address for the disassembly
+            jobs: The number of worker processes to use (ignored with a cache)
+            cache: An optional unsp_cache.DisassemblyCache to serve unchanged pages from
+            stats: An optional unsp_stats.DisassemblyStats to collect statistics in
+            start: Only list instructions from this address on
+            end: Only list instructions before this address
         """
-        with open(input_file, 'rb') as f:
-            data = f.read()
-        
-        output = []
-        address = base_address
-        
-        while data:
-            instr, size = self.disassemble_instruction(data, address)
-            if size == 0:
-                break
-                
-            # Format the output
-            output.append(f"{address:08x}: {instr}")
-            
-            # Advance to the next instruction
-            data = data[size:]
-            address += size
-        
         # Write or print the output
         if output_file:
-            with open(output_file, 'w') as f:
-                f.write("\n".join(output))
+            with open(output_file, 'w', buffering=OUTPUT_BUFFER_SIZE) as f:
+                self.write_listing(input_file, f, base_address, jobs, cache, stats, start, end)
         else:
-            print("\n".join(output))
+            self.write_listing(input_file, sys.stdout, base_address, jobs, cache, stats, start, end)
+            sys.stdout.write("\n")
+
+
+# Disassembler of the current worker process, loaded once by init_worker
+_worker_disassembler: Optional[UnSPDisassembler] = None
+
+
+def init_worker(instruction_set_file: str):
+    """Load the instruction set once per worker process."""
+    global _worker_disassembler
+    _worker_disassembler = UnSPDisassembler(instruction_set_file)
+
+
+def worker_disassembler() -> UnSPDisassembler:
+    """Return the disassembler loaded by init_worker in this worker process."""
+    return _worker_disassembler
+
+
+def _disassemble_chunk(source, base_address: int, start: int, stop: int, index_offset: int
+                       ) -> Tuple[array, array, List[str]]:
+    """Disassemble the instructions starting in one chunk (runs in a worker).
+
+    Args:
+        source: A file path, or the chunk's binary data
+        base_address: The address of the first word of source
+        start: The index of the first word of the chunk in source
+        stop: The index of the word after the chunk in source
+        index_offset: Added to word indexes in source to make them image-relative
+
+    Returns:
+        A tuple of the image word index and byte size of each instruction,
+        and the instruction texts
+    """
+    starts = array("I")
+    sizes = array("B")
+    texts = []
+    with mapped_words(source) as words:
+        for instr in _worker_disassembler.decode_range(words, base_address, start, stop):
+            starts.append(index_offset + (instr.address - base_address) // 2)
+            sizes.append(instr.size)
+            texts.append(instr.text)
+    return starts, sizes, texts
 
 
 def main():
+    import argparse
+
     parser = argparse.ArgumentParser(description="unSP Disassembler")
     parser.add_argument("input_file", help="The binary file to disassemble")
     parser.add_argument("-o", "--output", help="The output file (defaults to stdout)")
@@ -290,11 +1228,76 @@ def main():
                         help="The base address for the disassembly (default: 0)")
     parser.add_argument("-j", "--json", default="unsp_instruction_set.json",
                         help="Path to the instruction set JSON file")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Number of worker processes for large inputs (default: 1, 0 for all cores)")
+    parser.add_argument("--cache-dir", help="Directory for caching decoded pages between runs")
+    parser.add_argument("--cache-size", type=int, default=256,
+                        help="Maximum size of the cache directory in MB (default: 256)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Report cache hits and misses")
+    parser.add_argument("--stats", action="store_true",
+                        help="Report instruction counts, throughput and where the time went on stderr")
+    parser.add_argument("--profile", metavar="FILE", help="Write a cProfile (pstats) dump of the run to FILE")
+    parser.add_argument("--start", type=lambda x: int(x, 0), help="Only list instructions from this address on")
+    parser.add_argument("--end", type=lambda x: int(x, 0), help="Only list instructions before this address")
+    parser.add_argument("--server", nargs="?", const="", metavar="ADDRESS",
+                        help="Ask a running unsp_server (at its default address, or ADDRESS) for the listing, "
+                             "and disassemble locally if none is running")
     
     args = parser.parse_args()
-    
+    ranged = args.start is not None or args.end is not None
+    if (ranged or args.server is not None) and (args.stats or args.jobs != 1 or args.cache_dir):
+        parser.error("--start, --end and --server cannot be combined with --stats, --jobs or --cache-dir")
+    if args.server is not None and args.profile:
+        parser.error("--server cannot be combined with --profile")
+
+    if args.server is not None:
+        from unsp_server import DEFAULT_ADDRESS, DisassemblyClient, ServerError, ServerUnavailable
+        try:
+            client = DisassemblyClient(args.server or DEFAULT_ADDRESS)
+        except ServerUnavailable:
+            client = None
+        if client is not None:
+            with client, (open(args.output, 'w', buffering=OUTPUT_BUFFER_SIZE) if args.output
+                          else nullcontext(sys.stdout)) as output:
+                try:
+                    separator = ""
+                    for line in client.iter_listing(args.input_file, args.json, args.base_address,
+                                                    args.start, args.end):
+                        output.write(separator)
+                        output.write(line)
+                        separator = "\n"
+                except ServerError as e:
+                    sys.exit(f"error: {e}")
+                if not args.output:
+                    output.write("\n")
+            return
+
+    cache = None
+    if args.cache_dir:
+        from unsp_cache import DisassemblyCache
+        cache = DisassemblyCache(args.cache_dir, args.cache_size * 1024 * 1024, args.verbose)
+
+    stats = None
+    if args.stats:
+        from unsp_stats import DisassemblyStats
+        stats = DisassemblyStats()
+
+    profile = None
+    if args.profile:
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+
     disassembler = UnSPDisassembler(args.json)
-    disassembler.disassemble_file(args.input_file, args.output, args.base_address)
+    disassembler.disassemble_file(args.input_file, args.output, args.base_address,
+                                  args.jobs or os.cpu_count(), cache, stats, args.start, args.end)
+
+    if profile is not None:
+        profile.disable()
+        profile.dump_stats(args.profile)
+    if stats is not None:
+        sys.stdout.flush()
+        stats.report()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,918 @@
+#!/usr/bin/env python3
+"""
+Instruction-level unSP emulator.
+
+Memory is a flat ``array('H')`` over the 22-bit word address space, and
+instructions are dispatched through the disassembler's decoder table. Code
+is decoded a basic block at a time into handler closures with their operands
+already bound, so executing a cached block is a loop of plain calls with no
+decoding. Blocks are cached by address; writing to a word that a cached block
+was decoded from drops that block, and when the write comes from the block
+being executed, execution continues from freshly decoded code.
+
+As in the listing, addresses in the API are byte addresses (twice the word
+address). SR holds DS in its top 6 bits, then the N, Z, S and C flags, and
+the code segment in its low 6 bits; flags follow the LLIL lifter. DIVS, DIVQ
+and MULS are not emulated, and neither are interrupts or I/O: RAM and I/O
+registers are plain memory.
+"""
+
+import argparse
+import os
+import sys
+import time
+from array import array
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+
+from unsp_analysis import VECTORS
+from unsp_disassembler import UnSPDisassembler, mapped_words, FLOW_JUMP
+
+
+# Registers in the order of their Ra_Rb encoding
+REGISTERS = ("SP", "R1", "R2", "R3", "R4", "BP", "SR", "PC",
+             "R8", "R9", "R10", "R11", "R12", "R13", "R14", "R15")
+
+# Number of words in the 22-bit address space
+MEMORY_WORDS = 1 << 22
+
+# Blocks end after this many instructions even without a control transfer
+MAX_BLOCK_INSTRUCTIONS = 64
+
+# Reasons run() returns for stopping
+STOP_BREAKPOINT = "breakpoint"
+STOP_LIMIT = "limit"
+STOP_BREAK = "break"
+STOP_REQUESTED = "stopped"
+
+_REGISTER_INDEX = {name: i for i, name in enumerate(REGISTERS)}
+_SP, _R3, _R4, _BP, _SR, _PC = (_REGISTER_INDEX[name] for name in ("SP", "R3", "R4", "BP", "SR", "PC"))
+
+# SR layout
+_N, _Z, _S, _C = 0x200, 0x100, 0x80, 0x40
+_CS_MASK = 0x3F
+_DS_SHIFT = 10
+
+_ADDRESS_MASK = MEMORY_WORDS - 1
+
+
+class EmulationError(Exception):
+    """An instruction could not be executed; ``address`` is where it is."""
+
+    def __init__(self, address: int, message: str):
+        super().__init__(f"{address:08x}: {message}")
+        self.address = address
+
+
+class _CodeModified(Exception):
+    """Raised after an instruction wrote to code in a cached block."""
+
+    def __init__(self, resume: int):
+        self.resume = resume
+
+
+class _Break(Exception):
+    """Raised by BREAK; ``resume`` is the word address after it."""
+
+    def __init__(self, resume: int):
+        self.resume = resume
+
+
+class _Unimplemented(Exception):
+    pass
+
+
+# ALU operations: (a, b, SR) -> (new SR, result)
+
+def _signed(value: int) -> int:
+    return value - ((value & 0x8000) << 1)
+
+
+def _nz(sr: int, value: int) -> int:
+    return (sr & ~(_N | _Z)) | ((value >> 6) & _N) | (0 if value else _Z)
+
+
+def _add(a, b, sr, carry=0):
+    result = a + b + carry
+    value = result & 0xFFFF
+    return ((sr & ~(_N | _Z | _S | _C)) | ((value >> 6) & _N) | (0 if value else _Z) | ((value >> 8) & _S)
+            | (_C if result > 0xFFFF else 0)), value
+
+
+def _sub(a, b, sr, borrow=0):
+    # Carry set means no borrow; S is the signed comparison a < b (biasing
+    # both by 0x8000 orders them as signed values)
+    result = a - b - borrow
+    value = result & 0xFFFF
+    return ((sr & ~(_N | _Z | _S | _C)) | ((value >> 6) & _N) | (0 if value else _Z)
+            | (_S if (a ^ 0x8000) - (b ^ 0x8000) - borrow < 0 else 0) | (0 if result < 0 else _C)), value
+
+
+_ALU: Dict[str, Callable[[int, int, int], Tuple[int, int]]] = {
+    "ADD": _add,
+    "ADC": lambda a, b, sr: _add(a, b, sr, 1 if sr & _C else 0),
+    "SUB": _sub,
+    "SBC": lambda a, b, sr: _sub(a, b, sr, 0 if sr & _C else 1),
+    "CMP": _sub,
+    "NEG": lambda a, b, sr: _sub(0, b, sr),
+    "XOR": lambda a, b, sr: (_nz(sr, a ^ b), a ^ b),
+    "LOAD": lambda a, b, sr: (_nz(sr, b), b),
+    "OR": lambda a, b, sr: (_nz(sr, a | b), a | b),
+    "AND": lambda a, b, sr: (_nz(sr, a & b), a & b),
+    "TEST": lambda a, b, sr: (_nz(sr, a & b), a & b),
+}
+
+# ALU operations that only set flags
+_COMPARES = frozenset(("CMP", "TEST"))
+
+# Branch OP name -> (SR mask, value it must have)
+_CONDITIONS = {
+    "JCC": (_C, 0), "JCS": (_C, _C),
+    "JSC": (_S, 0), "JSS": (_S, _S),
+    "JNE": (_Z, 0), "JE": (_Z, _Z),
+    "JPL": (_N, 0), "JMI": (_N, _N),
+}
+
+# Branch conditions on more than one flag
+_COMPOUND_CONDITIONS = {
+    "JBE": lambda sr: bool(sr & _Z) or not sr & _C,
+    "JA": lambda sr: not sr & _Z and bool(sr & _C),
+    "JLE": lambda sr: bool(sr & (_Z | _S)),
+    "JG": lambda sr: not sr & (_Z | _S),
+    "JVC": lambda sr: bool(sr & _N) == bool(sr & _S),
+    "JVS": lambda sr: bool(sr & _N) != bool(sr & _S),
+}
+
+_SHIFTS = {
+    "ASR": lambda value, count: (_signed(value) >> count) & 0xFFFF,
+    "LSR": lambda value, count: value >> count,
+    "SHL": lambda value, count: (value << count) & 0xFFFF,
+    "ROL": lambda value, count: ((value << (count & 15)) | (value >> (16 - (count & 15)))) & 0xFFFF,
+}
+
+# Mode toggle instruction name -> {mode: operand}
+_MODE_TOGGLES = {
+    "FIR_MOV": {"fir_mov": "FIR"},
+    "Fraction": {"fraction": "FRA"},
+    "IRQ": {"irq": "I"},
+    "SECBANK": {"secbank": "S"},
+    "FIQ": {"fiq": "F"},
+    "IRQ Nest Mode": {"irq_nest": "N"},
+    "INT SET": {"fiq": "F", "irq": "I"},
+}
+
+
+# Handler builders. Each takes (decoder, emulator) and returns a function
+# binding (mapped operand values, raw operand values, word address, next word
+# address) to (handler, jumps). Handlers that jump are run last in a block and
+# return the next word address; the others fall through and return nothing.
+
+def _bind_alu(emulator, op, rd, next_address, immediate=0, displacement=None):
+    """Bind Rd = Rd op operand, where the operand is immediate or [BP+displacement]."""
+    regs, read = emulator._regs, emulator._read
+    operation = _ALU.get(op)
+    if operation is None:
+        return _unimplemented(f"undefined ALU operation {op}")
+    writes = op not in _COMPARES
+
+    if rd == _PC:
+        pc = next_address & 0xFFFF
+        segment = next_address & ~0xFFFF
+
+        def alu_pc():
+            operand = immediate if displacement is None else read((regs[_BP] + displacement) & 0xFFFF)
+            sr, value = operation(pc, operand, regs[_SR])
+            regs[_SR] = sr
+            return segment | value if writes else next_address
+        return alu_pc, True
+
+    if displacement is None:
+        if writes:
+            def alu_immediate():
+                regs[_SR], regs[rd] = operation(regs[rd], immediate, regs[_SR])
+        else:
+            def alu_immediate():
+                regs[_SR] = operation(regs[rd], immediate, regs[_SR])[0]
+        return alu_immediate, False
+
+    if writes:
+        def alu_memory():
+            regs[_SR], regs[rd] = operation(regs[rd], read((regs[_BP] + displacement) & 0xFFFF), regs[_SR])
+    else:
+        def alu_memory():
+            regs[_SR] = operation(regs[rd], read((regs[_BP] + displacement) & 0xFFFF), regs[_SR])[0]
+    return alu_memory, False
+
+
+def _unimplemented(message):
+    def unimplemented():
+        raise _Unimplemented(message)
+    return unimplemented, True
+
+
+def _build_alu_memory(decoder, emulator):
+    op_index, rd_index, im6_index = (decoder.field_index[name] for name in ("OP", "Rd", "IM6"))
+    regs, write = emulator._regs, emulator._write
+
+    def bind(values, operands, address, next_address):
+        op, rd, im6 = values[op_index], _REGISTER_INDEX[values[rd_index]], values[im6_index]
+        if op == "STORE":
+            pc = next_address & 0xFFFF
+
+            def store():
+                if write((regs[_BP] + im6) & 0xFFFF, pc if rd == _PC else regs[rd]):
+                    raise _CodeModified(next_address)
+            return store, False
+        return _bind_alu(emulator, op, rd, next_address, displacement=im6)
+    return bind
+
+
+def _build_alu_immediate(decoder, emulator):
+    op_index, rd_index, im6_index = (decoder.field_index[name] for name in ("OP", "Rd", "IM6"))
+
+    def bind(values, operands, address, next_address):
+        op = values[op_index]
+        if op == "STORE":
+            return _unimplemented("STORE to an immediate")
+        return _bind_alu(emulator, op, _REGISTER_INDEX[values[rd_index]], next_address, immediate=values[im6_index])
+    return bind
+
+
+def _build_branch(decoder, emulator):
+    op_index = decoder.field_index["OP"]
+    regs = emulator._regs
+
+    def bind(values, operands, address, next_address):
+        flow, target = decoder.control_flow(2 * address, operands)
+        target = (target // 2) & _ADDRESS_MASK
+        op = values[op_index]
+        if flow == FLOW_JUMP:
+            return (lambda: target), True
+
+        if op in _CONDITIONS:
+            mask, expected = _CONDITIONS[op]
+
+            def branch():
+                return target if regs[_SR] & mask == expected else next_address
+        elif op in _COMPOUND_CONDITIONS:
+            condition = _COMPOUND_CONDITIONS[op]
+
+            def branch():
+                return target if condition(regs[_SR]) else next_address
+        else:
+            return _unimplemented(f"undefined branch {op}")
+        return branch, True
+    return bind
+
+
+def _far_jump(regs, target):
+    """Set CS to the segment of a word address and return it."""
+    regs[_SR] = (regs[_SR] & ~_CS_MASK) | (target >> 16)
+    return target
+
+
+def _build_call(decoder, emulator):
+    regs, write = emulator._regs, emulator._write
+
+    def bind(values, operands, address, next_address):
+        if decoder.name == "CALLR":
+            target = None
+        else:
+            _, target = decoder.control_flow(2 * address, operands)
+            target //= 2
+
+        def call():
+            # PC is pushed before SR (RETF pops SR first)
+            sp = regs[_SP]
+            write(sp, next_address & 0xFFFF)
+            write((sp - 1) & 0xFFFF, regs[_SR])
+            regs[_SP] = (sp - 2) & 0xFFFF
+            return _far_jump(regs, ((regs[_R4] << 16) | regs[_R3]) & _ADDRESS_MASK if target is None else target)
+        return call, True
+    return bind
+
+
+def _build_jump_far(decoder, emulator):
+    regs = emulator._regs
+
+    def bind(values, operands, address, next_address):
+        _, target = decoder.control_flow(2 * address, operands)
+        target //= 2
+        return (lambda: _far_jump(regs, target)), True
+    return bind
+
+
+def _build_jump_register(decoder, emulator):
+    regs = emulator._regs
+
+    def bind(values, operands, address, next_address):
+        return (lambda: _far_jump(regs, ((regs[_R4] << 16) | regs[_R3]) & _ADDRESS_MASK)), True
+    return bind
+
+
+def _build_return(decoder, emulator):
+    regs, read = emulator._regs, emulator._read
+
+    def bind(values, operands, address, next_address):
+        def ret():
+            sp = regs[_SP]
+            sr = regs[_SR] = read((sp + 1) & 0xFFFF)
+            regs[_SP] = (sp + 2) & 0xFFFF
+            return ((sr & _CS_MASK) << 16) | read((sp + 2) & 0xFFFF)
+        return ret, True
+    return bind
+
+
+def _build_data_segment_immediate(decoder, emulator):
+    im6_index = decoder.field_index["IM6"]
+    regs = emulator._regs
+
+    def bind(values, operands, address, next_address):
+        ds = values[im6_index] << _DS_SHIFT
+
+        def set_data_segment():
+            regs[_SR] = (regs[_SR] & ~(_CS_MASK << _DS_SHIFT)) | ds
+        return set_data_segment, False
+    return bind
+
+
+def _build_special_access(register):
+    def build(decoder, emulator):
+        w_index, rs_index = decoder.field_index["W"], decoder.field_index["Rs"]
+        regs = emulator._regs
+
+        def bind(values, operands, address, next_address):
+            rs = _REGISTER_INDEX[values[rs_index]]
+            source = _operand_reader(regs, rs, False, next_address & 0xFFFF)
+            if register == "FR":
+                if values[w_index]:
+                    def access():
+                        emulator.fr = source()
+                else:
+                    def access():
+                        regs[rs] = emulator.fr
+            elif values[w_index]:
+                def access():
+                    regs[_SR] = (regs[_SR] & ~(_CS_MASK << _DS_SHIFT)) | ((source() & _CS_MASK) << _DS_SHIFT)
+            else:
+                def access():
+                    regs[rs] = regs[_SR] >> _DS_SHIFT
+            return access, False
+        return bind
+    return build
+
+
+def _build_mode_toggle(decoder, emulator):
+    fields = {mode: decoder.field_index[field] for mode, field in _MODE_TOGGLES[decoder.name].items()}
+    modes = emulator.modes
+
+    def bind(values, operands, address, next_address):
+        settings = {mode: int(values[index] in (1, "ON")) for mode, index in fields.items()}
+        return (lambda: modes.update(settings)), False
+    return bind
+
+
+def _build_exponent(decoder, emulator):
+    regs = emulator._regs
+
+    def bind(values, operands, address, next_address):
+        def exponent():
+            # R2 = the number of leading bits of R4 equal to its sign, less one
+            value = regs[_R4]
+            if value & 0x8000:
+                value ^= 0xFFFF
+            regs[_REGISTER_INDEX["R2"]] = 15 - value.bit_length()
+        return exponent, False
+    return bind
+
+
+def _build_multiply(decoder, emulator):
+    rd_index, rs_index, s_index = (decoder.field_index[name] for name in ("Rd", "Rs", "S"))
+    regs = emulator._regs
+
+    def bind(values, operands, address, next_address):
+        rd, rs = _REGISTER_INDEX[values[rd_index]], _REGISTER_INDEX[values[rs_index]]
+        # us: unsigned Rd times signed Rs; uu: both unsigned; ss, or an S value the
+        # spec does not name, both signed (as in the lifter)
+        mode = values[s_index]
+        pc = next_address & 0xFFFF
+        multiplicand = _operand_reader(regs, rd, mode != "us" and mode != "uu", pc)
+        multiplier = _operand_reader(regs, rs, mode != "uu", pc)
+
+        def multiply():
+            product = (multiplicand() * multiplier()) & 0xFFFFFFFF
+            regs[_R4] = product >> 16
+            regs[_R3] = product & 0xFFFF
+        return multiply, False
+    return bind
+
+
+def _operand_reader(regs, register, signed, pc):
+    """Return a function reading a register operand, sign-extended if signed.
+
+    PC is only stored in the registers when run() returns, so it reads as the
+    address of the next instruction, bound like in the other handlers.
+    """
+    if register == _PC:
+        value = _signed(pc) if signed else pc
+        return lambda: value
+    if signed:
+        return lambda: _signed(regs[register])
+    return lambda: regs[register]
+
+
+def _build_shift(decoder, emulator):
+    rd_index, lsft_index, rs_index = (decoder.field_index[name] for name in ("Rd", "LSFT", "Rs"))
+    regs = emulator._regs
+
+    def bind(values, operands, address, next_address):
+        shift = _SHIFTS.get(values[lsft_index])
+        if shift is None:
+            return _unimplemented(f"undefined shift {values[lsft_index]}")
+        rd, rs = _REGISTER_INDEX[values[rd_index]], _REGISTER_INDEX[values[rs_index]]
+        pc = next_address & 0xFFFF
+        amount = _operand_reader(regs, rs, False, pc)
+        if rd == _PC:
+            segment = next_address & ~0xFFFF
+
+            def shift_pc():
+                value = shift(pc, amount() & 15)
+                regs[_SR] = _nz(regs[_SR], value)
+                return segment | value
+            return shift_pc, True
+
+        def shift_register():
+            value = regs[rd] = shift(regs[rd], amount() & 15)
+            regs[_SR] = _nz(regs[_SR], value)
+        return shift_register, False
+    return bind
+
+
+def _build_bit_operation(decoder, emulator):
+    """Bind TSTB/SETB/CLRB/INVB on a register or a memory word.
+
+    The bit is a constant offset or the value of Rs. Every form sets Z from
+    the bit's previous value; all but TSTB write the word back.
+    """
+    index = decoder.field_index
+    bitop_index, rd_index, d_index = index["Bitop"], index.get("Rd"), index.get("D")
+    a16_index, offset_index, rs_index = index.get("A16"), index.get("Offset"), index.get("Rs")
+    in_memory = decoder.name.startswith("Memory")
+    regs, read, write = emulator._regs, emulator._read, emulator._write
+    updates = {"SETB": lambda word, bit: word | bit, "CLRB": lambda word, bit: word & ~bit,
+               "INVB": lambda word, bit: word ^ bit, "TSTB": None}
+
+    def bind(values, operands, address, next_address):
+        bitop = values[bitop_index]
+        if bitop not in updates:
+            return _unimplemented(f"undefined bit operation {bitop}")
+        update = updates[bitop]
+        offset = values[offset_index] if offset_index is not None else None
+        rs = _REGISTER_INDEX[values[rs_index]] if rs_index is not None else None
+        rd = _REGISTER_INDEX[values[rd_index]] if rd_index is not None else None
+        a16 = values[a16_index] if a16_index is not None else None
+        data_segment = bool(values[d_index]) if d_index is not None else False
+        if rd == _PC and not in_memory and update is not None:
+            return _unimplemented(f"{bitop} on PC")
+        pc = next_address & 0xFFFF
+        amount = _operand_reader(regs, rs, False, pc) if rs is not None else None
+
+        def bit_operation():
+            bit = 1 << (offset if amount is None else amount() & 15)
+            if in_memory:
+                word_address = a16 if a16 is not None else (pc if rd == _PC else regs[rd])
+                if data_segment:
+                    word_address |= (regs[_SR] >> _DS_SHIFT) << 16
+                word = read(word_address)
+            else:
+                word = pc if rd == _PC else regs[rd]
+            regs[_SR] = (regs[_SR] & ~_Z) | (0 if word & bit else _Z)
+            if update is None:
+                return
+            if in_memory:
+                if write(word_address, update(word, bit) & 0xFFFF):
+                    raise _CodeModified(next_address)
+            else:
+                regs[rd] = update(word, bit) & 0xFFFF
+        return bit_operation, False
+    return bind
+
+
+def _build_nop(decoder, emulator):
+    def nop():
+        pass
+
+    def bind(values, operands, address, next_address):
+        return nop, False
+    return bind
+
+
+def _build_break(decoder, emulator):
+    def bind(values, operands, address, next_address):
+        def break_():
+            raise _Break(next_address)
+        return break_, True
+    return bind
+
+
+def _build_unimplemented(decoder, emulator):
+    def bind(values, operands, address, next_address):
+        return _unimplemented(f"{decoder.name} is not emulated")
+    return bind
+
+
+# Instruction name -> handler builder
+_BUILDERS = {
+    "DSI6": _build_data_segment_immediate,
+    "CALL": _build_call,
+    "CALLR": _build_call,
+    "JMPF": _build_jump_far,
+    "JMPR": _build_jump_register,
+    "DS Access": _build_special_access("DS"),
+    "FR Access": _build_special_access("FR"),
+    "BREAK": _build_break,
+    "NOP": _build_nop,
+    "EXP": _build_exponent,
+    "MUL": _build_multiply,
+    "Register BITOP": _build_bit_operation,
+    "Memory BITOP": _build_bit_operation,
+    "16 bits Shift": _build_shift,
+    "RETI": _build_return,
+    "RETF": _build_return,
+    "Base+Disp6": _build_alu_memory,
+    "IMM6": _build_alu_immediate,
+    "Branch": _build_branch,
+}
+_BUILDERS.update((name, _build_mode_toggle) for name in _MODE_TOGGLES)
+
+
+class _Block:
+    """A cached basic block: handlers that fall through, then one that jumps.
+
+    A block cut short (at a breakpoint, the instruction limit or the end of
+    memory) ends in a synthetic jump to the next instruction, which is not
+    counted as executed.
+    """
+
+    __slots__ = ("body", "last", "count", "addresses", "start", "end")
+
+    def __init__(self, body, last, addresses, start, end, synthetic_last=False):
+        self.body = body
+        self.last = last
+        self.count = len(body) if synthetic_last else len(body) + 1   # instructions executed
+        self.addresses = addresses
+        self.start = start
+        self.end = end
+
+
+class Emulator:
+    """Executes unSP code in a flat 22-bit word address space."""
+
+    def __init__(self, disassembler: UnSPDisassembler):
+        """Create an emulator with zeroed memory and registers.
+
+        Args:
+            disassembler: The disassembler whose instruction set and decoder
+                table are used
+        """
+        self.disassembler = disassembler
+        self.memory = array('H', bytes(2 * MEMORY_WORDS))
+        self.fr = 0
+        self.modes: Dict[str, int] = dict.fromkeys(("fir_mov", "fraction", "irq", "fiq", "irq_nest", "secbank"), 0)
+        self.instructions = 0
+        self._regs = [0] * len(REGISTERS)
+        self._pc = 0
+        self._blocks: Dict[int, _Block] = {}
+        self._code = bytearray(MEMORY_WORDS)
+        self._breakpoints: Set[int] = set()
+        self._read_hooks: List[Tuple[int, int, Callable]] = []
+        self._write_hooks: List[Tuple[int, int, Callable]] = []
+        self._stop_requested = False
+        self._bind_memory()
+
+    def _bind_memory(self):
+        """Choose memory accessors (with hooks only if there are any) and rebind all handlers."""
+        memory, code = self.memory, self._code
+        read_hooks, write_hooks = self._read_hooks, self._write_hooks
+
+        if read_hooks:
+            def read(address):
+                value = memory[address]
+                for start, end, hook in read_hooks:
+                    if start <= address < end:
+                        hook(self, 2 * address, value)
+                return value
+        else:
+            read = memory.__getitem__
+
+        if write_hooks:
+            def write(address, value):
+                for start, end, hook in write_hooks:
+                    if start <= address < end:
+                        hook(self, 2 * address, value)
+                memory[address] = value
+                if code[address]:
+                    self._invalidate(address)
+                    return True
+        else:
+            def write(address, value):
+                memory[address] = value
+                if code[address]:
+                    self._invalidate(address)
+                    return True
+
+        self._read = read
+        self._write = write
+        self._binders = [_BUILDERS.get(decoder.name, _build_unimplemented)(decoder, self)
+                         for decoder in self.disassembler.decoders]
+        self.flush()
+
+    # State
+
+    @property
+    def pc(self) -> int:
+        """The byte address of the next instruction."""
+        return 2 * self._pc
+
+    @pc.setter
+    def pc(self, address: int):
+        self._pc = (address // 2) & _ADDRESS_MASK
+        self._regs[_SR] = (self._regs[_SR] & ~_CS_MASK) | (self._pc >> 16)
+
+    def reg(self, name: str) -> int:
+        """Read a register by name (PC is the low 16 bits of the word address)."""
+        if name == "PC":
+            return self._pc & 0xFFFF
+        if name == "DS":
+            return self._regs[_SR] >> _DS_SHIFT
+        if name == "FR":
+            return self.fr
+        return self._regs[_REGISTER_INDEX[name]]
+
+    def set_reg(self, name: str, value: int):
+        """Write a register by name (PC and SR keep the code segment in step)."""
+        value &= 0xFFFF
+        if name == "PC":
+            self._pc = (self._pc & ~0xFFFF) | value
+        elif name == "DS":
+            self._regs[_SR] = (self._regs[_SR] & ~(_CS_MASK << _DS_SHIFT)) | ((value & _CS_MASK) << _DS_SHIFT)
+        elif name == "FR":
+            self.fr = value
+        else:
+            self._regs[_REGISTER_INDEX[name]] = value
+            if name == "SR":
+                self._pc = ((value & _CS_MASK) << 16) | (self._pc & 0xFFFF)
+
+    @property
+    def registers(self) -> Dict[str, int]:
+        """All registers by name."""
+        return {name: self.reg(name) for name in REGISTERS + ("DS", "FR")}
+
+    # Memory
+
+    def load(self, source: Union[str, os.PathLike, bytes], address: int = 0):
+        """Copy an image (a file path or the data itself) into memory at a byte address."""
+        with mapped_words(source) as words:
+            start = address // 2
+            end = min(start + len(words), MEMORY_WORDS)
+            memoryview(self.memory)[start:end] = words[:end - start]
+        self._invalidate_range(start, end)
+
+    def reset(self):
+        """Clear the registers and start at the handler the RESET vector points to."""
+        # Handlers hold on to the register list, so it is cleared in place
+        self._regs[:] = [0] * len(REGISTERS)
+        self.fr = 0
+        self.modes.update(dict.fromkeys(self.modes, 0))
+        self.pc = 2 * self.memory[VECTORS["RESET"]]
+
+    def read_word(self, address: int) -> int:
+        """Read the word at a byte address (without running hooks)."""
+        return self.memory[(address // 2) & _ADDRESS_MASK]
+
+    def write_word(self, address: int, value: int):
+        """Write the word at a byte address (without running hooks)."""
+        word_address = (address // 2) & _ADDRESS_MASK
+        self.memory[word_address] = value & 0xFFFF
+        if self._code[word_address]:
+            self._invalidate(word_address)
+
+    def add_read_hook(self, start: int, end: int, hook: Callable[["Emulator", int, int], None]):
+        """Call hook(emulator, address, value) when code reads a word in [start, end) (byte addresses)."""
+        self._read_hooks.append((start // 2, (end + 1) // 2, hook))
+        self._bind_memory()
+
+    def add_write_hook(self, start: int, end: int, hook: Callable[["Emulator", int, int], None]):
+        """Call hook(emulator, address, value) before code writes a word in [start, end) (byte addresses)."""
+        self._write_hooks.append((start // 2, (end + 1) // 2, hook))
+        self._bind_memory()
+
+    def remove_hooks(self):
+        """Remove every memory hook."""
+        self._read_hooks.clear()
+        self._write_hooks.clear()
+        self._bind_memory()
+
+    # Breakpoints
+
+    def add_breakpoint(self, address: int):
+        """Stop before executing the instruction at a byte address."""
+        word_address = (address // 2) & _ADDRESS_MASK
+        self._breakpoints.add(word_address)
+        # Blocks end before breakpoints and are not cached at them, so blocks through it are dropped
+        self._invalidate(word_address)
+
+    def remove_breakpoint(self, address: int):
+        word_address = (address // 2) & _ADDRESS_MASK
+        self._breakpoints.discard(word_address)
+        # Blocks ending before it can now run through it
+        self._invalidate(word_address - 1)
+
+    # Block cache
+
+    def flush(self):
+        """Drop every cached block."""
+        self._blocks.clear()
+        self._code[:] = bytes(MEMORY_WORDS)
+
+    def _invalidate(self, word_address: int):
+        self._invalidate_range(word_address, word_address + 1)
+
+    def _invalidate_range(self, start: int, end: int):
+        """Drop the cached blocks decoded from any word in [start, end)."""
+        code = self._code
+        if not any(code[start:end]):
+            return
+        stale = [block for block in self._blocks.values() if block.start < end and start < block.end]
+        for block in stale:
+            del self._blocks[block.start]
+            code[block.start:block.end] = bytes(block.end - block.start)
+        # Words shared with blocks that are kept stay marked
+        for block in self._blocks.values():
+            for stale_block in stale:
+                if block.start < stale_block.end and stale_block.start < block.end:
+                    code[block.start:block.end] = b"\1" * (block.end - block.start)
+                    break
+
+    def _build_block(self, start: int) -> _Block:
+        """Decode and bind the block starting at a word address, and cache it unless it starts at a breakpoint."""
+        memory = self.memory
+        table = self.disassembler.decoder_table
+        binders = self._binders
+        breakpoints = self._breakpoints
+        body = []
+        addresses = []
+        address = start
+        synthetic_last = False
+        while True:
+            word = memory[address]
+            decoder = table[word]
+            addresses.append(address)
+            if decoder is None:
+                handler, jumps = _unimplemented(f"unknown instruction 0x{word:04x}")
+                next_address = address + 1
+            else:
+                second_word = memory[(address + 1) & _ADDRESS_MASK] if decoder.size == 4 else 0
+                next_address = (address + decoder.size // 2) & _ADDRESS_MASK
+                operands = decoder.decode(word, second_word)
+                handler, jumps = binders[decoder.index](decoder.values(operands), operands, address, next_address)
+            if jumps:
+                last = handler
+                break
+            body.append(handler)
+            if len(body) >= MAX_BLOCK_INSTRUCTIONS or next_address in breakpoints or next_address < address:
+                last = self._fall_through(next_address)
+                synthetic_last = True
+                addresses.append(next_address)
+                break
+            address = next_address
+
+        end = max(next_address, address + 1)
+        block = _Block(body, last, addresses, start, end, synthetic_last)
+        if start not in breakpoints:
+            self._code[start:end] = b"\1" * (end - start)
+            self._blocks[start] = block
+        return block
+
+    @staticmethod
+    def _fall_through(next_address):
+        return lambda: next_address
+
+    # Execution
+
+    def stop(self):
+        """Ask run() to stop at the end of the current block (e.g. from a hook)."""
+        self._stop_requested = True
+
+    def run(self, max_instructions: Optional[int] = None) -> str:
+        """Execute from the current PC.
+
+        Args:
+            max_instructions: Stop after this many instructions (default: no limit)
+
+        Returns:
+            Why execution stopped: STOP_BREAKPOINT (before the instruction
+            at a breakpoint), STOP_LIMIT, STOP_BREAK (after a BREAK
+            instruction) or STOP_REQUESTED
+
+        Raises:
+            EmulationError: An instruction could not be executed; PC is left
+                at that instruction
+        """
+        get = self._blocks.get
+        breakpoints = self._breakpoints
+        limit = sys.maxsize if max_instructions is None else max_instructions
+        remaining = limit
+        pc = self._pc
+        self._stop_requested = False
+
+        try:
+            while True:
+                # Blocks starting at breakpoints are never cached, so only a
+                # cache miss, the end of the budget or a stop request need checks
+                block = get(pc)
+                if block is None or block.count > remaining or self._stop_requested:
+                    if self._stop_requested:
+                        reason = STOP_REQUESTED
+                        break
+                    if remaining == 0:
+                        reason = STOP_LIMIT
+                        break
+                    if pc in breakpoints and remaining != limit:
+                        reason = STOP_BREAKPOINT
+                        break
+                    if block is None:
+                        block = self._build_block(pc)
+                    if block.count > remaining:
+                        # Run only what the budget allows; the rest of the block is not reached
+                        try:
+                            for handler in block.body[:remaining]:
+                                handler()
+                        except _CodeModified as e:
+                            remaining -= block.addresses.index(e.resume)
+                            pc = e.resume
+                            continue
+                        pc = block.addresses[remaining]
+                        remaining = 0
+                        continue
+
+                try:
+                    for handler in block.body:
+                        handler()
+                    pc = block.last()
+                except _CodeModified as e:
+                    remaining -= block.addresses.index(e.resume)
+                    pc = e.resume
+                    continue
+                except _Break as e:
+                    remaining -= block.count
+                    pc = e.resume
+                    reason = STOP_BREAK
+                    break
+                except _Unimplemented as e:
+                    remaining -= block.count - 1
+                    pc = block.addresses[-1]
+                    raise EmulationError(2 * pc, e.args[0]) from None
+                remaining -= block.count
+        finally:
+            self._pc = pc
+            self._regs[_PC] = pc & 0xFFFF
+            self.instructions += limit - remaining
+        return reason
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an unSP image in the emulator")
+    parser.add_argument("input", help="The binary image (loaded at word address 0)")
+    parser.add_argument("-j", "--json", default="unsp_instruction_set.json",
+                        help="Path to the instruction set JSON file")
+    parser.add_argument("-e", "--entry", type=lambda x: int(x, 0),
+                        help="Byte address to start at (default: the RESET handler)")
+    parser.add_argument("-n", "--max-instructions", type=int, default=10_000_000,
+                        help="Stop after this many instructions (default: 10000000)")
+    parser.add_argument("-B", "--breakpoint", type=lambda x: int(x, 0), action="append", default=[],
+                        help="Stop before the instruction at this byte address (repeatable)")
+
+    args = parser.parse_args()
+
+    emulator = Emulator(UnSPDisassembler(args.json))
+    emulator.load(args.input)
+    emulator.reset()
+    if args.entry is not None:
+        emulator.pc = args.entry
+    for address in args.breakpoint:
+        emulator.add_breakpoint(address)
+
+    start = time.perf_counter()
+    try:
+        reason = emulator.run(args.max_instructions)
+    except EmulationError as e:
+        reason = f"error: {e}"
+    elapsed = time.perf_counter() - start
+
+    print(f"stopped ({reason}) at {emulator.pc:08x} after {emulator.instructions} instructions in "
+          f"{elapsed:.3f} s ({emulator.instructions / elapsed / 1e6 if elapsed else 0.0:.2f} M/s)")
+    print(" ".join(f"{name}={value:04x}" for name, value in emulator.registers.items()))
+
+
+if __name__ == "__main__":
+    main()
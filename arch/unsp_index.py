@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+Inverted instruction index and pattern search for unSP images.
+
+An image is decoded once (with the NumPy bulk decoder) into, for every
+instruction of the instruction set, the sorted addresses where it occurs and
+the raw operand values at each of them, and for every operand an inverted
+list of those occurrences ordered by value, so an operand constraint is a
+binary search rather than a scan. The index is saved next to the dump and
+reloaded while the dump, its base address and the instruction set are
+unchanged; only the instructions and operands a query names are read from it.
+
+Patterns name an instruction and constrain its operands::
+
+    "INT SET" FI=FIQ
+    IMM6 OP=LOAD|CMP Rd=R1
+    "Memory BITOP" A16=0x2800..0x3fff
+    CALL A22=0x8000..0xffff
+
+Names may use shell-style wildcards and are matched case-insensitively
+(``Unknown`` matches words that do not decode). Operand values are register
+or value names, numbers, ``lo..hi`` ranges of raw values, or alternatives
+separated by ``|``; ``A22`` combines the two halves of a 22-bit target.
+Patterns separated by ``;`` match consecutive instructions; sequences are
+found by intersecting the address lists of each step rather than by
+rescanning the image.
+
+Dependencies:
+    - numpy
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import shlex
+import zipfile
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from unsp_bulk import decode_array
+from unsp_disassembler import UnSPDisassembler, mapped_words, UNKNOWN_OPCODE
+
+
+# Index files are saved next to the dump with this suffix
+INDEX_SUFFIX = ".unspidx.npz"
+
+# Format version of index files
+INDEX_VERSION = 2
+
+# The name instructions that do not decode are indexed under
+UNKNOWN_NAME = "Unknown"
+
+_A22_FIELDS = ("A22[21:16]", "A22[15:0]")
+
+# Operand key of the combined 22-bit target in the inverted lists
+_A22_KEY = "a22"
+
+
+def index_path(dump_path: Union[str, os.PathLike]) -> str:
+    """Return the path of the index saved for a dump."""
+    return os.fspath(dump_path) + INDEX_SUFFIX
+
+
+def _parse_number(text: str) -> int:
+    try:
+        return int(text, 0)
+    except ValueError:
+        raise ValueError(f"{text!r} is not a number") from None
+
+
+class InstructionPattern:
+    """One instruction name pattern with operand constraints."""
+
+    def __init__(self, name: str, constraints: Sequence[Tuple[str, str]] = ()):
+        """Create a pattern.
+
+        Args:
+            name: A (wildcard) instruction name
+            constraints: (field, value) pairs the operands must all satisfy
+        """
+        self.name = name
+        self.constraints = list(constraints)
+
+    @classmethod
+    def parse(cls, text: str) -> "InstructionPattern":
+        """Parse ``NAME field=value ...`` (quote names that contain spaces)."""
+        tokens = shlex.split(text)
+        if not tokens:
+            raise ValueError("Empty instruction pattern")
+        constraints = []
+        for token in tokens[1:]:
+            field, sep, value = token.partition("=")
+            if not sep or not field or not value:
+                raise ValueError(f"Operand constraint {token!r} is not of the form field=value")
+            constraints.append((field, value))
+        return cls(tokens[0], constraints)
+
+    def __repr__(self) -> str:
+        return f"InstructionPattern({self.name!r}, {self.constraints!r})"
+
+
+def parse_sequence(text: str) -> List[InstructionPattern]:
+    """Parse patterns separated by ';' into a sequence of consecutive instructions."""
+    patterns = [InstructionPattern.parse(part) for part in text.split(";") if part.strip()]
+    if not patterns:
+        raise ValueError("Empty pattern")
+    return patterns
+
+
+def _value_ranges(disassembler: UnSPDisassembler, decoder_index: int, field: str, value: str
+                  ) -> Optional[List[Tuple[int, int]]]:
+    """Translate an operand constraint into inclusive ranges of raw values.
+
+    Returns:
+        The ranges (empty if nothing can match), or None if the instruction
+        has no such operand
+    """
+    if decoder_index == UNKNOWN_OPCODE:
+        if field != "word":
+            return None
+        table, mask = None, 0xFFFF
+    elif field == "A22":
+        decoder = disassembler.decoders[decoder_index]
+        if not all(name in decoder.field_index for name in _A22_FIELDS):
+            return None
+        table, mask = None, 0x3FFFFF
+    else:
+        decoder = disassembler.decoders[decoder_index]
+        column = decoder.field_index.get(field)
+        if column is None:
+            return None
+        table, mask = decoder.value_table(column), decoder.fields[column][2]
+
+    ranges = []
+    for alternative in value.split("|"):
+        low, sep, high = alternative.partition("..")
+        if sep:
+            ranges.append((_parse_number(low), _parse_number(high)))
+            continue
+        try:
+            number = _parse_number(alternative)
+        except ValueError:
+            number = None
+        if table is None:
+            if number is None:
+                raise ValueError(f"{field} takes numbers, not {alternative!r}")
+            ranges.append((number, number))
+            continue
+        # Match register and value names (or the numbers a table leaves unnamed)
+        wanted = alternative.casefold()
+        for raw, mapped in enumerate(table):
+            if mapped == number if isinstance(mapped, int) else mapped.casefold() == wanted:
+                ranges.append((raw, raw))
+    return [(low, min(high, mask)) for low, high in ranges if low <= high and low <= mask]
+
+
+class _SavedArrays:
+    """The arrays of a saved index, each read from the file on request.
+
+    The file is only open while an array is read, so an index kept for the
+    life of a process does not hold a file handle.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        with np.load(self.path) as data:
+            return data[key]
+
+
+class InstructionIndex:
+    """Addresses and operand values of every instruction in an image, by instruction."""
+
+    def __init__(self, disassembler: UnSPDisassembler, groups, meta: Dict[str, object]):
+        """Wrap index data (use ``build``, ``load`` or ``open_index``).
+
+        Args:
+            disassembler: The disassembler whose instruction set was used
+            groups: Mapping-like source of the ``a<id>`` (addresses) and
+                ``f<id>`` (operands) arrays of each instruction id, and of the
+                ``v<id>_<operand>`` (sorted values) and ``r<id>_<operand>``
+                (their rows) inverted list of each operand
+            meta: The index metadata
+        """
+        self.disassembler = disassembler
+        self.meta = meta
+        self._groups = groups
+        self._loaded: Dict[str, np.ndarray] = {}
+        self._names = [(UNKNOWN_OPCODE, UNKNOWN_NAME)] + [(d.index, d.name) for d in disassembler.decoders]
+
+    @classmethod
+    def build(cls, disassembler: UnSPDisassembler, source: Union[str, os.PathLike, bytes],
+              base_address: int = 0) -> "InstructionIndex":
+        """Decode an image and index it.
+
+        Incomplete instructions at the end of the image are not indexed.
+        """
+        decoded = decode_array(disassembler, source, base_address)
+        ids = decoded["id"]
+        sizes = np.array([decoder.size for decoder in disassembler.decoders] + [2], dtype=np.uint8)
+        complete = decoded["size"] == sizes[ids]
+
+        groups: Dict[str, np.ndarray] = {}
+        for instr_id in [UNKNOWN_OPCODE] + [decoder.index for decoder in disassembler.decoders]:
+            rows = decoded[(ids == instr_id) & complete]
+            if instr_id == UNKNOWN_OPCODE:
+                fields = rows["word"].reshape(-1, 1)
+            else:
+                decoder = disassembler.decoders[instr_id]
+                # Operands narrower than a byte (all but A16 and A22) are stored as bytes
+                narrow = all(mask <= 0xFF for _, _, mask in decoder.fields)
+                fields = rows["fields"][:, :len(decoder.fields)].astype(np.uint8 if narrow else np.uint16)
+            groups[f"a{instr_id}"] = np.ascontiguousarray(rows["address"])
+            groups[f"f{instr_id}"] = np.ascontiguousarray(fields)
+            for key in _operand_keys(disassembler, instr_id):
+                column = _operand_column(disassembler, instr_id, fields, key)
+                order = np.argsort(column, kind="stable").astype(np.uint32)
+                groups[f"v{instr_id}_{key}"] = column[order]
+                groups[f"r{instr_id}_{key}"] = order
+
+        meta = {
+            "version": INDEX_VERSION,
+            "spec_hash": disassembler.spec_hash,
+            "base_address": base_address,
+            "instructions": int(len(decoded)),
+        }
+        if isinstance(source, (str, os.PathLike)):
+            stat = os.stat(source)
+            meta.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        return cls(disassembler, groups, meta)
+
+    def save(self, path: str):
+        """Write the index (uncompressed, so each array can be read on its own)."""
+        arrays = {key: self._array(key) for key in self._keys()}
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        try:
+            np.savez(tmp_path, meta=np.array(json.dumps(self.meta)), **arrays)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def load(cls, disassembler: UnSPDisassembler, path: str) -> "InstructionIndex":
+        """Open a saved index; arrays are read when a query first needs them.
+
+        Raises:
+            OSError, ValueError, KeyError or zipfile.BadZipFile if the file is missing or damaged
+        """
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+        return cls(disassembler, _SavedArrays(path), meta)
+
+    def _keys(self) -> List[str]:
+        keys = []
+        for instr_id, _ in self._names:
+            keys += [f"a{instr_id}", f"f{instr_id}"]
+            for key in _operand_keys(self.disassembler, instr_id):
+                keys += [f"v{instr_id}_{key}", f"r{instr_id}_{key}"]
+        return keys
+
+    def _array(self, key: str) -> np.ndarray:
+        array = self._loaded.get(key)
+        if array is None:
+            array = self._loaded[key] = self._groups[key]
+        return array
+
+    def is_current(self, source: Union[str, os.PathLike], base_address: int = 0) -> bool:
+        """Whether the index still describes a dump file."""
+        try:
+            stat = os.stat(source)
+        except OSError:
+            return False
+        meta = self.meta
+        return (meta.get("version") == INDEX_VERSION and meta.get("spec_hash") == self.disassembler.spec_hash
+                and meta.get("base_address") == base_address and meta.get("size") == stat.st_size
+                and meta.get("mtime_ns") == stat.st_mtime_ns)
+
+    def addresses(self, name: str) -> np.ndarray:
+        """Return the sorted addresses of every instruction with this (wildcard) name."""
+        return self.match(InstructionPattern(name))[0]
+
+    def match(self, pattern: InstructionPattern) -> Tuple[np.ndarray, np.ndarray]:
+        """Find the instructions matching one pattern.
+
+        Returns:
+            Their sorted addresses and their sizes in bytes
+        """
+        wanted = pattern.name.casefold()
+        addresses = []
+        sizes = []
+        for instr_id, name in self._names:
+            if not fnmatch.fnmatchcase(name.casefold(), wanted):
+                continue
+            rows = self._rows(instr_id, pattern.constraints)
+            if rows is None:
+                continue
+            selected = self._array(f"a{instr_id}")
+            if rows is not Ellipsis:
+                selected = selected[rows]
+            addresses.append(selected)
+            size = 2 if instr_id == UNKNOWN_OPCODE else self.disassembler.decoders[instr_id].size
+            sizes.append(np.full(len(selected), size, dtype=np.uint8))
+
+        if not addresses:
+            return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint8)
+        addresses = np.concatenate(addresses)
+        sizes = np.concatenate(sizes)
+        order = np.argsort(addresses, kind="stable")
+        return addresses[order], sizes[order]
+
+    def _rows(self, instr_id: int, constraints: Sequence[Tuple[str, str]]):
+        """Select the rows of one instruction that satisfy every constraint.
+
+        Each constraint's ranges are looked up in the operand's inverted list,
+        and only the rows found there are marked.
+
+        Returns:
+            Ellipsis for all rows, a boolean row mask, or None if the
+            instruction cannot match
+        """
+        if not constraints:
+            return Ellipsis
+        selected = None
+        for field, value in constraints:
+            ranges = _value_ranges(self.disassembler, instr_id, field, value)
+            if ranges is None:
+                return None
+            if field == "A22":
+                key = _A22_KEY
+            elif instr_id == UNKNOWN_OPCODE:
+                key = 0
+            else:
+                key = self.disassembler.decoders[instr_id].field_index[field]
+            values = self._array(f"v{instr_id}_{key}")
+            order = self._array(f"r{instr_id}_{key}")
+            matches = np.zeros(len(order), dtype=bool)
+            for low, high in ranges:
+                matches[order[np.searchsorted(values, low, "left"):np.searchsorted(values, high, "right")]] = True
+            selected = matches if selected is None else selected & matches
+        return selected
+
+    def find(self, patterns: Union[str, Sequence[InstructionPattern]]) -> np.ndarray:
+        """Find where a sequence of consecutive instructions matches.
+
+        Each step's addresses are intersected with the addresses following
+        the previous step's matches.
+
+        Args:
+            patterns: Patterns (or their text, separated by ';')
+
+        Returns:
+            The sorted addresses where the sequence starts
+        """
+        if isinstance(patterns, str):
+            patterns = parse_sequence(patterns)
+        starts, sizes = self.match(patterns[0])
+        ends = starts.astype(np.int64) + sizes
+        for pattern in patterns[1:]:
+            if len(starts) == 0:
+                break
+            addresses, sizes = self.match(pattern)
+            _, previous, current = np.intersect1d(ends, addresses, assume_unique=True, return_indices=True)
+            starts = starts[previous]
+            ends = addresses[current].astype(np.int64) + sizes[current]
+        return starts
+
+    def counts(self) -> Dict[str, int]:
+        """Count the indexed instructions by name, most common first."""
+        counts: Dict[str, int] = {}
+        for instr_id, name in self._names:
+            counts[name] = counts.get(name, 0) + len(self._array(f"a{instr_id}"))
+        return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+
+
+def _operand_keys(disassembler: UnSPDisassembler, instr_id: int) -> List[Union[int, str]]:
+    """Return the keys of an instruction's inverted operand lists: its columns, and A22 if it has one."""
+    if instr_id == UNKNOWN_OPCODE:
+        return [0]
+    decoder = disassembler.decoders[instr_id]
+    keys: List[Union[int, str]] = list(range(len(decoder.fields)))
+    if all(name in decoder.field_index for name in _A22_FIELDS):
+        keys.append(_A22_KEY)
+    return keys
+
+
+def _operand_column(disassembler: UnSPDisassembler, instr_id: int, fields: np.ndarray,
+                    key: Union[int, str]) -> np.ndarray:
+    """Return the values of one operand (or of the combined A22 target) of every row."""
+    if key == _A22_KEY:
+        decoder = disassembler.decoders[instr_id]
+        high, low = (decoder.field_index[name] for name in _A22_FIELDS)
+        return (fields[:, high].astype(np.uint32) << 16) | fields[:, low]
+    return np.ascontiguousarray(fields[:, key])
+
+
+def open_index(disassembler: UnSPDisassembler, dump_path: Union[str, os.PathLike], base_address: int = 0,
+               rebuild: bool = False) -> InstructionIndex:
+    """Load the index saved next to a dump, building and saving it if missing or stale."""
+    path = index_path(dump_path)
+    if not rebuild and os.path.exists(path):
+        try:
+            index = InstructionIndex.load(disassembler, path)
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            # A damaged index is rebuilt
+            index = None
+        if index is not None and index.is_current(dump_path, base_address):
+            return index
+
+    index = InstructionIndex.build(disassembler, dump_path, base_address)
+    try:
+        index.save(path)
+    except OSError:
+        # A read-only location only costs the rebuild next time
+        pass
+    return index
+
+
+def main():
+    from unsp_batch import expand_inputs
+
+    parser = argparse.ArgumentParser(description="Search unSP images for instruction patterns")
+    parser.add_argument("pattern", help="Instruction pattern(s), e.g. '\"INT SET\" FI=FIQ' or "
+                                        "'IMM6 OP=CMP; Branch OP=JE' for a sequence")
+    parser.add_argument("inputs", nargs="+", help="Binary files or glob patterns")
+    parser.add_argument("-b", "--base-address", type=lambda x: int(x, 0), default=0,
+                        help="The base address of the images (default: 0)")
+    parser.add_argument("-j", "--json", default="unsp_instruction_set.json",
+                        help="Path to the instruction set JSON file")
+    parser.add_argument("-c", "--count", action="store_true", help="Only print the number of matches per file")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the indexes even if they are current")
+
+    args = parser.parse_args()
+
+    try:
+        patterns = parse_sequence(args.pattern)
+    except ValueError as e:
+        parser.error(str(e))
+
+    disassembler = UnSPDisassembler(args.json)
+    files = expand_inputs(args.inputs)
+    for path in files:
+        index = open_index(disassembler, path, args.base_address, args.rebuild)
+        try:
+            starts = index.find(patterns)
+        except ValueError as e:
+            parser.error(str(e))
+
+        tag = f"{path}:" if len(files) > 1 else ""
+        if args.count:
+            print(f"{tag}{len(starts)}")
+            continue
+
+        with mapped_words(path) as words, memoryview(words).cast("B") as data:
+            for start in starts.tolist():
+                offset = start - args.base_address
+                texts = []
+                for _ in patterns:
+                    text, size = disassembler.disassemble_instruction(data, offset + args.base_address, offset)
+                    texts.append(text)
+                    offset += size
+                print(f"{tag}{start:08x}: {'; '.join(texts)}")
+
+
+if __name__ == "__main__":
+    main()
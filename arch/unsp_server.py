@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""
+Local unSP disassembly server.
+
+Editors and scripts that ask for small parts of the same dumps over and over
+pay for process start-up, loading the instruction set and reading the image
+on every run. The server keeps compiled instruction sets and memory-mapped
+images resident, and caches decoded pages of listing text in LRU order, so a
+query only costs a round trip and, at worst, decoding one page.
+
+Clients connect over a Unix socket (or TCP on localhost where there are no
+Unix sockets) and exchange JSON objects, one per line. Each request has an
+``op`` and may carry an ``id``, which is echoed in the response::
+
+    {"id": 1, "op": "range", "image": "/dumps/a.bin", "start": 32768, "end": 32896}
+    {"id": 1, "result": {"lines": ["00008000: ...", "00008002: ..."], "next": null}}
+
+Operations (addresses are byte addresses; ``spec`` and ``base`` are optional):
+    range: Listing lines of the instructions starting in [start, end), at most
+        ``limit`` of them; ``next`` is where to continue, or null at the end
+    xrefs: References to (``to``) or from (``from``) an address, up to ``end``
+    search: Start addresses of an unsp_index pattern, up to ``limit`` of them
+    stats: Cache and residency counters
+    ping: Liveness check
+
+Failures are answered with ``{"id": ..., "error": "message"}``. Connections
+are served concurrently; pages are decoded, and cross-reference and search
+indexes built (once per image), in threads while other requests are answered.
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import mmap
+import os
+import signal
+import socket
+import stat
+import sys
+import tempfile
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from unsp_disassembler import UnSPDisassembler, word_view
+
+
+# Words of listing decoded and cached at a time
+PAGE_WORDS = 2048
+
+# Default number of decoded pages kept (a page is typically 50-80 KB of text)
+DEFAULT_CACHE_PAGES = 1024
+
+# Images kept mapped at once
+MAX_IMAGES = 64
+
+# Most listing lines returned by one range request
+MAX_RANGE_LINES = 8192
+
+# Upper bound on the length of a request line
+MAX_REQUEST_SIZE = 1 << 20
+
+# Where the server listens and clients connect by default: a per-user Unix
+# socket, or a localhost port where Unix sockets are unavailable
+if hasattr(socket, "AF_UNIX"):
+    DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), f"unsp-server-{os.getuid()}.sock")
+else:
+    DEFAULT_ADDRESS = "127.0.0.1:47405"
+
+
+class ServerError(Exception):
+    """The server could not answer a request."""
+
+
+class ServerUnavailable(ServerError):
+    """No server is listening at the address."""
+
+
+def _parse_address(address: str) -> Tuple[Optional[str], Optional[int]]:
+    """Split "host:port" into (host, port); anything else is a Unix socket path (None, None)."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address and os.sep not in address:
+        return host or "127.0.0.1", int(port)
+    return None, None
+
+
+class _Image:
+    """A memory-mapped image and what has been derived from it."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            info = os.fstat(f.fileno())
+            self.identity = (info.st_size, info.st_mtime_ns, info.st_ino)
+            # mmap cannot map an empty file
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if info.st_size else None
+        self.words = word_view(self._map if self._map is not None else b"")
+        # (kind, spec hash, base address) -> task building a cross-reference or search index
+        self.derived: Dict[Tuple[str, str, int], asyncio.Future] = {}
+
+    def close(self):
+        try:
+            if isinstance(self.words, memoryview):
+                self.words.release()
+            if self._map is not None:
+                self._map.close()
+        except BufferError:
+            # A page is still being decoded from it; the mapping goes with the last view
+            pass
+
+
+class DisassemblyServer:
+    """Resident instruction sets, images and decoded pages, answering JSON-lines requests."""
+
+    def __init__(self, instruction_set_file: str = "unsp_instruction_set.json",
+                 cache_pages: int = DEFAULT_CACHE_PAGES):
+        """Create a server.
+
+        Args:
+            instruction_set_file: The instruction set used when a request names none
+            cache_pages: The number of decoded pages to keep
+        """
+        self.default_spec = os.path.abspath(instruction_set_file)
+        self.cache_pages = cache_pages
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+        self._disassemblers: Dict[str, UnSPDisassembler] = {}
+        self._images: "OrderedDict[str, _Image]" = OrderedDict()
+        # (spec hash, image identity, base address, page) -> (instruction addresses, listing lines)
+        self._pages: "OrderedDict[tuple, Tuple[array, List[str]]]" = OrderedDict()
+        # Keys of the pages being decoded -> their futures
+        self._decoding: Dict[tuple, asyncio.Future] = {}
+
+    # Resident state
+
+    def _disassembler(self, spec: Optional[str]) -> UnSPDisassembler:
+        path = os.path.abspath(spec) if spec else self.default_spec
+        disassembler = self._disassemblers.get(path)
+        if disassembler is None:
+            disassembler = self._disassemblers[path] = UnSPDisassembler(path)
+        return disassembler
+
+    def _image(self, path: str) -> _Image:
+        """Return the mapped image at path, remapping it if the file changed."""
+        path = os.path.abspath(path)
+        info = os.stat(path)
+        image = self._images.get(path)
+        if image is not None and image.identity != (info.st_size, info.st_mtime_ns, info.st_ino):
+            del self._images[path]
+            image.close()
+            image = None
+        if image is None:
+            image = self._images[path] = _Image(path)
+            while len(self._images) > MAX_IMAGES:
+                _, oldest = self._images.popitem(last=False)
+                oldest.close()
+        else:
+            self._images.move_to_end(path)
+        return image
+
+    async def _page(self, disassembler: UnSPDisassembler, image: _Image, base_address: int, page: int
+                    ) -> Tuple[array, List[str]]:
+        """Return the addresses and listing lines of the instructions starting in a page."""
+        key = (disassembler.spec_hash, image.path, image.identity, base_address, page)
+        entry = self._pages.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._pages.move_to_end(key)
+            return entry
+
+        # Requests for a page that is already being decoded wait for that decode
+        pending = self._decoding.get(key)
+        if pending is not None:
+            return await pending
+
+        self.misses += 1
+        pending = self._decoding[key] = asyncio.get_running_loop().run_in_executor(
+            None, _decode_page, disassembler, image.words, base_address, page)
+        try:
+            entry = await pending
+        finally:
+            del self._decoding[key]
+
+        self._pages[key] = entry
+        while len(self._pages) > self.cache_pages:
+            self._pages.popitem(last=False)
+        return entry
+
+    async def _derived(self, image: _Image, kind: str, disassembler: UnSPDisassembler, base_address: int):
+        """Build (once, in a thread) or return a cross-reference or search index of an image."""
+        key = (kind, disassembler.spec_hash, base_address)
+        task = image.derived.get(key)
+        if task is None:
+            if kind == "xrefs":
+                from unsp_analysis import build_xrefs
+                build = (build_xrefs, disassembler, image.path, base_address)
+            else:
+                from unsp_index import open_index
+                build = (open_index, disassembler, image.path, base_address)
+            task = image.derived[key] = asyncio.ensure_future(asyncio.to_thread(*build))
+        try:
+            return await task
+        except BaseException:
+            image.derived.pop(key, None)
+            raise
+
+    # Operations
+
+    def op_ping(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        return {"pid": os.getpid()}
+
+    def op_stats(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "specs": len(self._disassemblers),
+            "images": len(self._images),
+            "pages": len(self._pages),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    async def op_range(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        disassembler = self._disassembler(request.get("spec"))
+        image = self._image(request["image"])
+        base_address = request.get("base", 0)
+        limit = min(request.get("limit") or MAX_RANGE_LINES, MAX_RANGE_LINES)
+        count = len(image.words)
+        start = request.get("start")
+        end = request.get("end")
+        first = 0 if start is None else min(max((start - base_address + 1) // 2, 0), count)
+        stop = count if end is None else min(max((end - base_address + 1) // 2, 0), count)
+        start = base_address + 2 * first
+        end = base_address + 2 * stop
+
+        lines: List[str] = []
+        for page in range(first // PAGE_WORDS, (stop + PAGE_WORDS - 1) // PAGE_WORDS):
+            addresses, page_lines = await self._page(disassembler, image, base_address, page)
+            low = bisect.bisect_left(addresses, start)
+            high = bisect.bisect_left(addresses, end)
+            if len(lines) + high - low > limit:
+                high = low + limit - len(lines)
+                lines.extend(page_lines[low:high])
+                return {"lines": lines, "next": addresses[high]}
+            lines.extend(page_lines[low:high])
+        return {"lines": lines, "next": None}
+
+    async def op_xrefs(self, request: Dict[str, Any]) -> List[Tuple[int, int, str]]:
+        from unsp_analysis import XREF_NAMES
+
+        disassembler = self._disassembler(request.get("spec"))
+        image = self._image(request["image"])
+        xrefs = await self._derived(image, "xrefs", disassembler, request.get("base", 0))
+        if "to" in request:
+            refs = xrefs.refs_to(request["to"], request.get("end"))
+        else:
+            refs = xrefs.refs_from(request["from"], request.get("end"))
+        return [(source, target, XREF_NAMES[kind]) for source, target, kind in refs]
+
+    async def op_search(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        disassembler = self._disassembler(request.get("spec"))
+        image = self._image(request["image"])
+        index = await self._derived(image, "index", disassembler, request.get("base", 0))
+        starts = index.find(request["pattern"])
+        limit = request.get("limit")
+        return {"count": len(starts), "addresses": starts[:limit].tolist()}
+
+    async def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer one request."""
+        self.requests += 1
+        response: Dict[str, Any] = {"id": request.get("id")}
+        handler = getattr(self, f"op_{request.get('op')}", None)
+        if handler is None:
+            response["error"] = f"unknown op {request.get('op')!r}"
+            return response
+        try:
+            result = handler(request)
+            if asyncio.iscoroutine(result):
+                result = await result
+            response["result"] = result
+        except KeyError as e:
+            response["error"] = f"missing parameter {e.args[0]}"
+        except (OSError, ValueError, TypeError) as e:
+            response["error"] = str(e)
+        except Exception as e:
+            # Keep serving: a request that trips over a bug fails on its own
+            response["error"] = f"{type(e).__name__}: {e}"
+        return response
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(b'{"id": null, "error": "request too long"}\n')
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("a request must be a JSON object")
+                except ValueError as e:
+                    response = {"id": None, "error": f"bad request: {e}"}
+                else:
+                    response = await self.handle(request)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, address: str = DEFAULT_ADDRESS):
+        """Listen at an address ("host:port" or a Unix socket path) until cancelled."""
+        host, port = _parse_address(address)
+        if port is not None:
+            server = await asyncio.start_server(self._serve_client, host, port, limit=MAX_REQUEST_SIZE)
+        else:
+            # A socket left behind by a server that did not shut down cleanly;
+            # anything else at the path is not ours to remove
+            if os.path.lexists(address) and not _is_listening(address):
+                if not stat.S_ISSOCK(os.lstat(address).st_mode):
+                    raise ServerError(f"{address} exists and is not a socket")
+                os.unlink(address)
+            server = await asyncio.start_unix_server(self._serve_client, address, limit=MAX_REQUEST_SIZE)
+
+        # Shut down cleanly (removing the socket) when terminated
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, task.cancel)
+            except (NotImplementedError, RuntimeError):
+                pass
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if port is None:
+                try:
+                    os.unlink(address)
+                except OSError:
+                    pass
+            for image in self._images.values():
+                image.close()
+            self._images.clear()
+
+
+def _decode_page(disassembler: UnSPDisassembler, words, base_address: int, page: int
+                 ) -> Tuple[array, List[str]]:
+    """Decode the instructions starting in a page, returning their addresses and listing lines."""
+    start = page * PAGE_WORDS
+    stop = min(start + PAGE_WORDS, len(words))
+    addresses = array("I")
+    lines = []
+    for instr in disassembler.decode_range(words, base_address, disassembler.sweep_start(words, start), stop):
+        addresses.append(instr.address)
+        lines.append(f"{instr.address:08x}: {instr.text}")
+    return addresses, lines
+
+
+def _connect(address: str, timeout: Optional[float] = None) -> socket.socket:
+    host, port = _parse_address(address)
+    try:
+        if port is not None:
+            return socket.create_connection((host, port), timeout)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(address)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+    except (FileNotFoundError, ConnectionRefusedError) as e:
+        raise ServerUnavailable(f"no server at {address}: {e}") from None
+
+
+def _is_listening(address: str) -> bool:
+    try:
+        _connect(address, 1.0).close()
+    except (ServerUnavailable, OSError):
+        return False
+    return True
+
+
+class DisassemblyClient:
+    """A connection to a running DisassemblyServer."""
+
+    def __init__(self, address: str = DEFAULT_ADDRESS, timeout: Optional[float] = None):
+        """Connect to a server.
+
+        Raises:
+            ServerUnavailable: No server is listening at the address
+        """
+        self._socket = _connect(address, timeout)
+        self._file = self._socket.makefile("rwb")
+        self._next_id = 0
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self) -> "DisassemblyClient":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def request(self, op: str, **params) -> Any:
+        """Send a request and return its result.
+
+        Raises:
+            ServerError: The server answered with an error or closed the connection
+        """
+        self._next_id += 1
+        params.update(op=op, id=self._next_id)
+        self._file.write(json.dumps(params).encode() + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ServerError("the server closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise ServerError(response["error"])
+        return response["result"]
+
+    def iter_listing(self, image: str, spec: Optional[str] = None, base_address: int = 0,
+                     start: Optional[int] = None, end: Optional[int] = None) -> Iterator[str]:
+        """Yield the listing lines of part or all of an image, requesting them a page at a time."""
+        params: Dict[str, Any] = {"image": os.path.abspath(image), "base": base_address}
+        if spec is not None:
+            params["spec"] = os.path.abspath(spec)
+        if start is not None:
+            params["start"] = start
+        if end is not None:
+            params["end"] = end
+        while True:
+            result = self.request("range", **params)
+            yield from result["lines"]
+            if result["next"] is None:
+                return
+            params["start"] = result["next"]
+
+    def listing(self, image: str, spec: Optional[str] = None, base_address: int = 0,
+                start: Optional[int] = None, end: Optional[int] = None) -> str:
+        """Return the listing text (lines separated by newlines) of part or all of an image."""
+        return "\n".join(self.iter_listing(image, spec, base_address, start, end))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve unSP disassembly over a local socket")
+    parser.add_argument("-a", "--address", default=DEFAULT_ADDRESS,
+                        help=f"Unix socket path or host:port to listen at (default: {DEFAULT_ADDRESS})")
+    parser.add_argument("-j", "--json", default="unsp_instruction_set.json",
+                        help="Path to the default instruction set JSON file")
+    parser.add_argument("--cache-pages", type=int, default=DEFAULT_CACHE_PAGES,
+                        help=f"Number of decoded pages of {PAGE_WORDS} words to keep "
+                             f"(default: {DEFAULT_CACHE_PAGES})")
+
+    args = parser.parse_args()
+
+    server = DisassemblyServer(args.json, args.cache_pages)
+    # Compile the default spec before accepting connections
+    server._disassembler(None)
+    print(f"listening at {args.address}", file=sys.stderr)
+    try:
+        asyncio.run(server.serve(args.address))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    except ServerError as e:
+        sys.exit(f"error: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Instrumented unSP disassembly for finding where the time goes.
+
+The statistics wrap the disassembler's real path rather than a copy of it:
+``UnSPDisassembler.write_listing`` runs as usual, with its instruction
+iterator and its output stream wrapped. Instructions are pulled from the
+decoder in batches of STATS_BATCH instructions (matching: the opcode table
+lookup and instruction boundaries), and the operands of each batch are
+extracted up front (extraction) and handed to the instructions to render
+from. Writes are collected and passed on once per batch (output, including
+the final flush). The remaining time is spent rendering and building the
+listing lines (formatting). Timing whole batches keeps the timer overhead to
+a few calls per batch.
+
+Only an instrumented run pays for any of this; the disassembler's normal
+path has no timers.
+"""
+
+import sys
+import time
+from collections import Counter
+from itertools import islice
+from operator import attrgetter
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO
+
+from unsp_disassembler import UnSPDisassembler, Instruction
+
+
+# Number of instructions taken through each stage at a time (larger batches keep
+# enough objects alive to trigger extra garbage collections)
+STATS_BATCH = 1 << 10
+
+# Stages of disassembly that are timed, in order
+PHASES = ("matching", "extraction", "formatting", "output")
+
+_decoder_and_size = attrgetter("decoder", "size")
+
+
+class _TimedOutput:
+    """A text stream wrapper that collects writes and passes them on in timed batches."""
+
+    def __init__(self, stats: "DisassemblyStats", output: TextIO):
+        self._stats = stats
+        self._output = output
+        self._pending: List[str] = []
+        # Writing is just an append; the tracked instructions pass writes on per batch
+        self.write = self._pending.append
+
+    def write_pending(self):
+        if not self._pending:
+            return
+        started = time.perf_counter()
+        self._output.write("".join(self._pending))
+        self._pending.clear()
+        self._stats.times["output"] += time.perf_counter() - started
+
+    def flush(self):
+        self.write_pending()
+        started = time.perf_counter()
+        self._output.flush()
+        self._stats.times["output"] += time.perf_counter() - started
+
+
+class DisassemblyStats:
+    """Instruction counts and stage timings of a disassembly run."""
+
+    def __init__(self, batch: int = STATS_BATCH):
+        self.batch = batch
+        self.words = 0
+        self.instructions = 0
+        self.unknown = 0
+        self.incomplete = 0
+        self.counts: Dict[str, int] = {}
+        self.times: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.elapsed = 0.0
+        self._decoder_counts: Dict[int, int] = {}
+        self._decoders = ()
+        self._output: Optional[_TimedOutput] = None
+
+    def track_instructions(self, disassembler: UnSPDisassembler, instructions: Iterable[Instruction]
+                           ) -> Iterator[Instruction]:
+        """Pass instructions through in timed batches, counting them."""
+        self._decoders = disassembler.decoders
+        counts = self._decoder_counts
+        clock = time.perf_counter
+        iterator = iter(instructions)
+        while True:
+            if self._output is not None:
+                self._output.write_pending()
+            started = clock()
+            batch = list(islice(iterator, self.batch))
+            matched = clock()
+            if not batch:
+                self.times["matching"] += matched - started
+                return
+
+            # Instructions served with their text (cache hits, worker output) need no extraction
+            extracted = [(instr, instr.decoder.decode(instr.word, instr.second_word)) for instr in batch
+                         if not instr.rendered and instr.complete]
+            self.times["matching"] += matched - started
+            self.times["extraction"] += clock() - matched
+            for instr, operands in extracted:
+                instr.render(operands)
+
+            # Counted by (decoder, size) pairs, which there are few of
+            self.instructions += len(batch)
+            for (decoder, size), n in Counter(map(_decoder_and_size, batch)).items():
+                self.words += n * (size // 2)
+                if decoder is None:
+                    self.unknown += n
+                else:
+                    counts[decoder.index] = counts.get(decoder.index, 0) + n
+                    if size < decoder.size:
+                        self.incomplete += n
+            yield from batch
+
+    def track_output(self, output: TextIO) -> _TimedOutput:
+        """Wrap a text stream so that the time spent writing to it is measured."""
+        self._output = _TimedOutput(self, output)
+        return self._output
+
+    def finish(self, elapsed: float):
+        """Record the duration of the run and total the counts by instruction name."""
+        self.elapsed += elapsed
+        # Instructions sharing a name (e.g. the BITOP forms) are counted together
+        for index, n in sorted(self._decoder_counts.items()):
+            name = self._decoders[index].name
+            self.counts[name] = self.counts.get(name, 0) + n
+        self._decoder_counts.clear()
+        self._output = None
+
+    def report(self, stream: Optional[TextIO] = None):
+        """Print the statistics (to stderr by default)."""
+        stream = stream or sys.stderr
+        size = 2 * self.words
+        rate = size / self.elapsed if self.elapsed else 0.0
+        print(f"stats: {size} bytes, {self.instructions} instructions in {self.elapsed:.3f} s "
+              f"({rate / 1e6:.2f} MB/s)", file=stream)
+
+        unknown = 100.0 * self.unknown / self.words if self.words else 0.0
+        print(f"  unknown: {self.unknown} words ({unknown:.1f}%), incomplete: {self.incomplete}", file=stream)
+
+        # Whatever is not matching, extraction or output is spent rendering and building the lines
+        timed = self.times["matching"] + self.times["extraction"] + self.times["output"]
+        times = dict(self.times, formatting=max(self.elapsed - timed, 0.0))
+        parts = [f"{phase} {seconds:.3f} s ({100.0 * seconds / self.elapsed if self.elapsed else 0.0:.0f}%)"
+                 for phase, seconds in times.items()]
+        print(f"  time: {', '.join(parts)}", file=stream)
+
+        print("  instructions:", file=stream)
+        width = max((len(name) for name in self.counts), default=0)
+        for name, n in sorted(self.counts.items(), key=lambda item: item[1], reverse=True):
+            share = 100.0 * n / self.instructions if self.instructions else 0.0
+            print(f"    {name:<{width}}  {n:>10}  {share:5.1f}%", file=stream)
@@ -1,93 +1,175 @@
-from binaryninja.architecture import Architecture, InstructionInfo, InstructionTextToken, InstructionTextTokenType
-from binaryninja.enums import BranchType, Endianness
+import os
+import re
+import sys
+from functools import lru_cache
+from typing import Optional
+
+from binaryninja.architecture import Architecture, InstructionInfo, InstructionTextToken, InstructionTextTokenType, \
+    RegisterInfo
+from binaryninja.enums import BranchType, Endianness, FlagRole
+
+# The instruction set and its compiled decoder live with the disassembler
+_ARCH_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "arch")
+if _ARCH_DIR not in sys.path:
+    sys.path.insert(0, _ARCH_DIR)
+
+from unsp_disassembler import (UnSPDisassembler, Instruction, FLOW_CALL, FLOW_JUMP, FLOW_BRANCH, FLOW_RETURN,
+                               FLOW_INDIRECT_JUMP)
+
+from .lifter import FLAGS, FLAG_WRITE_TYPES, INTRINSICS, build_lifters, lift_signed_flag
+from .view import BitzeeView
+
+_disassembler = UnSPDisassembler(os.path.join(_ARCH_DIR, "unsp_instruction_set.json"))
+
+# Number of decoded instructions kept for the info, text and IL callbacks
+DECODE_CACHE_SIZE = 1 << 16
+
+# Splits operand text into numbers, names and single separator characters
+_OPERAND_TOKEN = re.compile(r"0x[0-9a-fA-F]+|\d+|[A-Za-z_][A-Za-z0-9_]*|\s+|.")
+
+# Registers of the instruction set, plus the data segment and FR special registers
+_REGISTER_NAMES = frozenset([name for registers in _disassembler.registers.values() for name in registers.values()]
+                            + ["DS", "FR"])
+
+# Lifting functions indexed by instruction index
+_LIFTERS = build_lifters(_disassembler.decoders)
+
+
+class DecodedInstruction:
+    """A decoded instruction with its text tokens built on first use."""
+
+    __slots__ = ("instruction", "_tokens")
+
+    def __init__(self, instruction: Instruction):
+        self.instruction = instruction
+        self._tokens = None
+
+    @property
+    def tokens(self):
+        """The instruction text as Binary Ninja tokens."""
+        if self._tokens is None:
+            self._tokens = _tokenize(self.instruction)
+        return self._tokens
+
+
+def _tokenize(instruction: Instruction):
+    """Split rendered instruction text into tokens."""
+    text = instruction.text
+    if not instruction.complete:
+        return [InstructionTextToken(InstructionTextTokenType.TextToken, text)]
+
+    name = instruction.name
+    tokens = [InstructionTextToken(InstructionTextTokenType.InstructionToken, name)]
+    _, target = instruction.control_flow
+    for match in _OPERAND_TOKEN.finditer(text, len(name)):
+        part = match.group()
+        if part[0].isdigit():
+            value = int(part, 16) if part.startswith("0x") else int(part)
+            # Direct targets are shown as word addresses; navigate to the byte address
+            if target is not None and 2 * value == target:
+                tokens.append(InstructionTextToken(InstructionTextTokenType.PossibleAddressToken, part, value=target))
+            else:
+                tokens.append(InstructionTextToken(InstructionTextTokenType.IntegerToken, part, value=value))
+        elif part in _REGISTER_NAMES:
+            tokens.append(InstructionTextToken(InstructionTextTokenType.RegisterToken, part))
+        elif part == ",":
+            tokens.append(InstructionTextToken(InstructionTextTokenType.OperandSeparatorToken, part))
+        else:
+            tokens.append(InstructionTextToken(InstructionTextTokenType.TextToken, part))
+    return tokens
+
+
+def _decode(addr: int, data):
+    """Decode the instruction at addr, or return None if there is not a whole word.
+
+    Binary Ninja asks for the info, text and IL of the same instruction many
+    times during analysis, so decodes are shared through a cache keyed on
+    just the words the instruction consists of.
+    """
+    if len(data) < 2:
+        return None
+    word = data[0] | (data[1] << 8)
+    decoder = _disassembler.decoder_for(word)
+    if decoder is not None and decoder.size == 4 and len(data) >= 4:
+        return _decode_words(addr, word, data[2] | (data[3] << 8))
+    return _decode_words(addr, word, None)
+
+
+@lru_cache(maxsize=DECODE_CACHE_SIZE)
+def _decode_words(addr: int, word: int, second_word: Optional[int]):
+    """Decode the instruction made of word and (for complete two-word instructions) second_word."""
+    decoder = _disassembler.decoder_for(word)
+    if second_word is not None:
+        return DecodedInstruction(Instruction(addr, 4, word, second_word, decoder))
+    return DecodedInstruction(Instruction(addr, 2, word, 0, decoder))
+
 
 class UnSP(Architecture):
     name = "unSP"
     address_size = 4
-    default_int_size = 4
-    max_instr_length = 4  # unSP uses fixed 32-bit instructions
-
-    # Registers as defined in the SLEIGH specification:
-    regs = {
-        "r0": 0,  "r1": 1,  "r2": 2,  "r3": 3,
-        "r4": 4,  "r5": 5,  "r6": 6,  "r7": 7,
-        "r8": 8,  "r9": 9,  "r10": 10, "r11": 11,
-        "r12": 12, "r13": 13, "r14": 14, "r15": 15,
-        "pc": 16, "sp": 17, "psw": 18,
-    }
-    stack_pointer = "sp"
+    default_int_size = 2
+    max_instr_length = 4  # unSP instructions are one or two 16-bit words
+    instr_alignment = 2
+
+    # Registers as named in the instruction set; MR is the R4:R3 pair
+    regs = {name: RegisterInfo(name, 2) for name in sorted(_REGISTER_NAMES)}
+    stack_pointer = "SP"
     endianness = Endianness.LittleEndian
 
-    # The following opcode mappings follow the unSP SLEIGH specification.
-    # For example:
-    #   0x00 => nop
-    #   0x10 => mov rD, rS, with rD in low nibble and rS in high nibble of the second byte.
-    #   0x20 => movi rD, imm16, with rD in low nibble of the second byte and a 16-bit immediate in bytes 2–3.
+    # Flags are only computed where they are read, from the flag-write type of the instruction that set them
+    flags = FLAGS
+    flag_write_types = list(FLAG_WRITE_TYPES)
+    flags_written_by_flag_write_type = FLAG_WRITE_TYPES
+    flag_roles = {
+        "N": FlagRole.NegativeSignFlagRole,
+        "Z": FlagRole.ZeroFlagRole,
+        "S": FlagRole.SpecialFlagRole,
+        "C": FlagRole.CarryFlagWithInvertedSubtractRole,
+    }
+    intrinsics = INTRINSICS
 
     def get_instruction_info(self, data, addr):
-        if len(data) < 4:
+        decoded = _decode(addr, data)
+        if decoded is None or not decoded.instruction.complete:
             return None
+        instruction = decoded.instruction
         info = InstructionInfo()
-        info.length = 4
+        info.length = instruction.size
 
-        # Example: if a branch instruction is decoded,
-        # set info.add_branch(BranchType.TrueBranch, target) accordingly.
-        opcode = data[0]
-        # (Expand with branch target calculations if needed.)
+        flow, target = instruction.control_flow
+        if flow == FLOW_CALL and target is not None:
+            info.add_branch(BranchType.CallDestination, target)
+        elif flow == FLOW_JUMP and target is not None:
+            info.add_branch(BranchType.UnconditionalBranch, target)
+        elif flow == FLOW_BRANCH and target is not None:
+            info.add_branch(BranchType.TrueBranch, target)
+            info.add_branch(BranchType.FalseBranch, addr + instruction.size)
+        elif flow == FLOW_RETURN:
+            info.add_branch(BranchType.FunctionReturn)
+        elif flow in (FLOW_JUMP, FLOW_INDIRECT_JUMP):
+            info.add_branch(BranchType.IndirectBranch)
         return info
 
     def get_instruction_text(self, data, addr):
-        tokens = []
-        if len(data) < 4:
-            tokens.append(InstructionTextToken(InstructionTextTokenType.TextToken, "invalid"))
-            return tokens, 1
-
-        opcode = data[0]
-        if opcode == 0x00:
-            tokens.append(InstructionTextToken(InstructionTextTokenType.InstructionToken, "nop"))
-        elif opcode == 0x10:
-            # According to the unSP SLEIGH spec, MOV is encoded in a single byte:
-            # data[1]: lower 4 bits = destination (rD), upper 4 bits = source (rS)
-            rd = data[1] & 0x0F
-            rs = (data[1] >> 4) & 0x0F
-            tokens.append(InstructionTextToken(InstructionTextTokenType.InstructionToken, "mov"))
-            tokens.append(InstructionTextToken(InstructionTextTokenType.OperandSeparatorToken, " "))
-            tokens.append(InstructionTextToken(InstructionTextTokenType.RegisterToken, f"r{rd}"))
-            tokens.append(InstructionTextToken(InstructionTextTokenType.OperandSeparatorToken, ", "))
-            tokens.append(InstructionTextToken(InstructionTextTokenType.RegisterToken, f"r{rs}"))
-        elif opcode == 0x20:
-            # MOVI instruction: destination register is in the low nibble of data[1],
-            # immediate is stored in bytes 2 and 3 (little-endian)
-            rd = data[1] & 0x0F
-            imm = int.from_bytes(data[2:4], byteorder="little")
-            tokens.append(InstructionTextToken(InstructionTextTokenType.InstructionToken, "movi"))
-            tokens.append(InstructionTextToken(InstructionTextTokenType.OperandSeparatorToken, " "))
-            tokens.append(InstructionTextToken(InstructionTextTokenType.RegisterToken, f"r{rd}"))
-            tokens.append(InstructionTextToken(InstructionTextTokenType.OperandSeparatorToken, ", "))
-            tokens.append(InstructionTextToken(InstructionTextTokenType.IntegerToken, f"{imm:#x}", value=imm))
-        else:
-            tokens.append(InstructionTextToken(InstructionTextTokenType.TextToken, "unknown"))
-        return tokens, 4
+        decoded = _decode(addr, data)
+        if decoded is None:
+            return [InstructionTextToken(InstructionTextTokenType.TextToken, "invalid")], 1
+        return decoded.tokens, decoded.instruction.size
 
     def get_instruction_low_level_il(self, data, addr, il):
-        if len(data) < 4:
+        decoded = _decode(addr, data)
+        if decoded is None or not decoded.instruction.complete:
             return None
-        opcode = data[0]
-        if opcode == 0x00:
-            # nop – no operation
-            return il.no_expr()
-        elif opcode == 0x10:
-            # mov rD, rS
-            rd = data[1] & 0x0F
-            rs = (data[1] >> 4) & 0x0F
-            return il.set_reg(4, f"r{rd}", il.reg(4, f"r{rs}"))
-        elif opcode == 0x20:
-            # movi rD, imm16
-            rd = data[1] & 0x0F
-            imm = int.from_bytes(data[2:4], byteorder="little")
-            return il.set_reg(4, f"r{rd}", il.const(4, imm))
-        # (Implement additional opcodes per the SLEIGH spec as needed.)
-        return None
+        instruction = decoded.instruction
+        decoder = instruction.decoder
+        _LIFTERS[decoder.index](il, instruction, decoder.values(instruction.operands))
+        return instruction.size
+
+    def get_flag_write_low_level_il(self, op, size, write_type, flag, operands, il):
+        if flag == "S":
+            return lift_signed_flag(self, op, size, operands, il)
+        return Architecture.get_flag_write_low_level_il(self, op, size, write_type, flag, operands, il)
 
-# Register the unSP architecture with Binary Ninja.
+# Register the unSP architecture and the Bitzee flash image view with Binary Ninja.
 UnSP.register()
+BitzeeView.register()
@@ -0,0 +1,450 @@
+"""
+Table-driven LLIL lifting for unSP.
+
+Every instruction in the instruction set is mapped once, by name, to a lifting
+function with its operand positions already resolved, and lifting an
+instruction is a lookup by its index. ALU operations only name the flags they
+write (a flag-write type); Binary Ninja computes a flag only where something
+reads it.
+
+Registers are 16 bits and memory is addressed in words, while addresses in
+the view are byte addresses, so word addresses are doubled when accessed.
+"""
+
+from binaryninja.architecture import IntrinsicInfo
+from binaryninja.enums import FlagRole, LowLevelILOperation
+from binaryninja.lowlevelil import LLIL_TEMP, LowLevelILLabel
+from binaryninja.types import Type
+
+from unsp_disassembler import FLOW_CALL, FLOW_JUMP, FLOW_BRANCH
+
+# Flags of SR: negative, zero, signed less-than and carry
+FLAGS = ["N", "Z", "S", "C"]
+
+# The flags written by each flag-write type
+FLAG_WRITE_TYPES = {
+    "nzsc": ["N", "Z", "S", "C"],
+    "nz": ["N", "Z"],
+}
+
+# Mode toggles and multi-step arithmetic without an LLIL equivalent
+INTRINSICS = {
+    "fir_mov": IntrinsicInfo([Type.int(1, False)], []),
+    "fraction": IntrinsicInfo([Type.int(1, False)], []),
+    "int_set": IntrinsicInfo([Type.int(1, False)], []),
+    "irq": IntrinsicInfo([Type.int(1, False)], []),
+    "secbank": IntrinsicInfo([Type.int(1, False)], []),
+    "fiq": IntrinsicInfo([Type.int(1, False)], []),
+    "irq_nest": IntrinsicInfo([Type.int(1, False)], []),
+    "divs": IntrinsicInfo([Type.int(2), Type.int(2), Type.int(2)], [Type.int(2), Type.int(2)]),
+    "divq": IntrinsicInfo([Type.int(2), Type.int(2), Type.int(2)], [Type.int(2), Type.int(2)]),
+    "exp": IntrinsicInfo([Type.int(2)], [Type.int(2)]),
+    "muls": IntrinsicInfo([Type.int(4), Type.int(4), Type.int(1, False)], [Type.int(2), Type.int(2)]),
+}
+
+# Mode toggle instruction name -> (intrinsic, operand)
+_MODE_TOGGLES = {
+    "FIR_MOV": ("fir_mov", "FIR"),
+    "Fraction": ("fraction", "FRA"),
+    "INT SET": ("int_set", "FI"),
+    "IRQ": ("irq", "I"),
+    "SECBANK": ("secbank", "S"),
+    "FIQ": ("fiq", "F"),
+    "IRQ Nest Mode": ("irq_nest", "N"),
+}
+
+# ALU operations that set the carry and signed flags as well as N and Z
+_ARITHMETIC = frozenset(("ADD", "ADC", "SUB", "SBC", "CMP", "NEG"))
+
+
+def _flag_is(il, flag, value):
+    return il.compare_equal(0, il.flag(flag), il.const(0, value))
+
+
+# Branch OP name -> condition builder (JMP is unconditional)
+_CONDITIONS = {
+    "JCC": lambda il: _flag_is(il, "C", 0),
+    "JCS": lambda il: _flag_is(il, "C", 1),
+    "JSC": lambda il: _flag_is(il, "S", 0),
+    "JSS": lambda il: _flag_is(il, "S", 1),
+    "JNE": lambda il: _flag_is(il, "Z", 0),
+    "JE": lambda il: _flag_is(il, "Z", 1),
+    "JPL": lambda il: _flag_is(il, "N", 0),
+    "JMI": lambda il: _flag_is(il, "N", 1),
+    "JBE": lambda il: il.or_expr(0, _flag_is(il, "Z", 1), _flag_is(il, "C", 0)),
+    "JA": lambda il: il.and_expr(0, _flag_is(il, "Z", 0), _flag_is(il, "C", 1)),
+    "JLE": lambda il: il.or_expr(0, _flag_is(il, "Z", 1), _flag_is(il, "S", 1)),
+    "JG": lambda il: il.and_expr(0, _flag_is(il, "Z", 0), _flag_is(il, "S", 0)),
+    "JVC": lambda il: il.compare_equal(0, il.flag("N"), il.flag("S")),
+    "JVS": lambda il: il.compare_not_equal(0, il.flag("N"), il.flag("S")),
+}
+
+
+def _byte_address(il, word_address):
+    """Convert a 32-bit word address expression to a byte address."""
+    return il.shift_left(4, word_address, il.const(1, 1))
+
+
+def _data_address(il, offset, data_segment):
+    """The byte address of a data word, optionally in the DS segment."""
+    address = il.zero_extend(4, offset)
+    if data_segment:
+        address = il.or_expr(4, il.shift_left(4, il.zero_extend(4, il.reg(2, "DS")), il.const(1, 16)), address)
+    return _byte_address(il, address)
+
+
+def _mr(il):
+    return il.reg_split(2, "R4", "R3")
+
+
+def _jump(il, target):
+    """Jump to a constant byte address, as a goto when it is in this function."""
+    label = il.get_label_for_address(il.arch, target)
+    if label is None:
+        il.append(il.jump(il.const_pointer(4, target)))
+    else:
+        il.append(il.goto(label))
+
+
+def _branch(il, condition, target, fall_through):
+    """Branch to target when condition holds, otherwise continue."""
+    true_label = il.get_label_for_address(il.arch, target)
+    false_label = il.get_label_for_address(il.arch, fall_through)
+    true_missing = true_label is None
+    false_missing = false_label is None
+    if true_missing:
+        true_label = LowLevelILLabel()
+    if false_missing:
+        false_label = LowLevelILLabel()
+
+    il.append(il.if_expr(condition, true_label, false_label))
+    if true_missing:
+        il.mark_label(true_label)
+        il.append(il.jump(il.const_pointer(4, target)))
+    if false_missing:
+        il.mark_label(false_label)
+
+
+def _set_register(il, register, value, flags=None):
+    """Write a register; writing PC is a jump to the word address it holds."""
+    if register == "PC":
+        il.append(il.jump(_byte_address(il, il.zero_extend(4, value))))
+    else:
+        il.append(il.set_reg(2, register, value, flags=flags))
+
+
+def _alu(il, op, rd, operand):
+    """Lift Rd = Rd op operand, or the compare and test forms of it.
+
+    Args:
+        op: The OP name, or a raw value for undefined operations
+        rd: The destination register name
+        operand: A function returning the source operand expression
+    """
+    flags = "nzsc" if op in _ARITHMETIC else "nz"
+    if op == "ADD":
+        _set_register(il, rd, il.add(2, il.reg(2, rd), operand(), flags=flags))
+    elif op == "ADC":
+        _set_register(il, rd, il.add_carry(2, il.reg(2, rd), operand(), il.flag("C"), flags=flags))
+    elif op == "SUB":
+        _set_register(il, rd, il.sub(2, il.reg(2, rd), operand(), flags=flags))
+    elif op == "SBC":
+        # Carry clear means borrow
+        _set_register(il, rd, il.sub_borrow(2, il.reg(2, rd), operand(), _flag_is(il, "C", 0), flags=flags))
+    elif op == "CMP":
+        il.append(il.sub(2, il.reg(2, rd), operand(), flags=flags))
+    elif op == "NEG":
+        _set_register(il, rd, il.neg_expr(2, operand(), flags=flags))
+    elif op == "XOR":
+        _set_register(il, rd, il.xor_expr(2, il.reg(2, rd), operand(), flags=flags))
+    elif op == "LOAD":
+        _set_register(il, rd, operand(), flags=flags)
+    elif op == "OR":
+        _set_register(il, rd, il.or_expr(2, il.reg(2, rd), operand(), flags=flags))
+    elif op == "AND":
+        _set_register(il, rd, il.and_expr(2, il.reg(2, rd), operand(), flags=flags))
+    elif op == "TEST":
+        il.append(il.and_expr(2, il.reg(2, rd), operand(), flags=flags))
+    else:
+        il.append(il.unimplemented())
+
+
+def _build_alu_memory(decoder):
+    op_index, rd_index, im6_index = (decoder.field_index[name] for name in ("OP", "Rd", "IM6"))
+
+    def lift(il, instruction, values):
+        op, rd, im6 = values[op_index], values[rd_index], values[im6_index]
+
+        def address():
+            return _data_address(il, il.add(2, il.reg(2, "BP"), il.const(2, im6)), False)
+
+        if op == "STORE":
+            il.append(il.store(2, address(), il.reg(2, rd)))
+        else:
+            _alu(il, op, rd, lambda: il.load(2, address()))
+    return lift
+
+
+def _build_alu_immediate(decoder):
+    op_index, rd_index, im6_index = (decoder.field_index[name] for name in ("OP", "Rd", "IM6"))
+
+    def lift(il, instruction, values):
+        op, rd, im6 = values[op_index], values[rd_index], values[im6_index]
+        if op == "STORE":
+            # There is nowhere to store to with an immediate operand
+            il.append(il.undefined())
+        else:
+            _alu(il, op, rd, lambda: il.const(2, im6))
+    return lift
+
+
+def _build_branch(decoder):
+    op_index = decoder.field_index["OP"]
+
+    def lift(il, instruction, values):
+        flow, target = instruction.control_flow
+        if flow == FLOW_JUMP:
+            _jump(il, target)
+            return
+        condition = _CONDITIONS.get(values[op_index])
+        if condition is None or flow != FLOW_BRANCH:
+            il.append(il.unimplemented())
+            return
+        _branch(il, condition(il), target, instruction.address + instruction.size)
+    return lift
+
+
+def _build_call(decoder):
+    def lift(il, instruction, values):
+        flow, target = instruction.control_flow
+        if flow == FLOW_CALL:
+            il.append(il.call(il.const_pointer(4, target)))
+        else:
+            il.append(il.call(_byte_address(il, _mr(il))))
+    return lift
+
+
+def _build_jump_far(decoder):
+    def lift(il, instruction, values):
+        _, target = instruction.control_flow
+        _jump(il, target)
+    return lift
+
+
+def _build_jump_register(decoder):
+    def lift(il, instruction, values):
+        il.append(il.jump(_byte_address(il, _mr(il))))
+    return lift
+
+
+def _build_return(decoder):
+    def lift(il, instruction, values):
+        # SR (with the code segment in its low 6 bits) is popped before PC
+        il.append(il.set_reg(2, "SR", il.pop(2)))
+        segment = il.shift_left(4, il.zero_extend(4, il.and_expr(2, il.reg(2, "SR"), il.const(2, 0x3f))),
+                                il.const(1, 16))
+        il.append(il.ret(_byte_address(il, il.or_expr(4, segment, il.zero_extend(4, il.pop(2))))))
+    return lift
+
+
+def _build_data_segment_immediate(decoder):
+    im6_index = decoder.field_index["IM6"]
+
+    def lift(il, instruction, values):
+        il.append(il.set_reg(2, "DS", il.const(2, values[im6_index])))
+    return lift
+
+
+def _build_special_access(register):
+    def build(decoder):
+        w_index, rs_index = decoder.field_index["W"], decoder.field_index["Rs"]
+
+        def lift(il, instruction, values):
+            # W set writes the special register, clear reads it
+            if values[w_index]:
+                il.append(il.set_reg(2, register, il.reg(2, values[rs_index])))
+            else:
+                _set_register(il, values[rs_index], il.reg(2, register))
+        return lift
+    return build
+
+
+def _build_mode_toggle(decoder):
+    intrinsic, field = _MODE_TOGGLES[decoder.name]
+    index = decoder.field_index[field]
+
+    def lift(il, instruction, values):
+        il.append(il.intrinsic([], intrinsic, [il.const(1, instruction.operands[index])]))
+    return lift
+
+
+def _build_divide(decoder):
+    intrinsic = decoder.name.lower()
+
+    def lift(il, instruction, values):
+        il.append(il.intrinsic(["R4", "R3"], intrinsic, [il.reg(2, "R4"), il.reg(2, "R3"), il.reg(2, "R2")]))
+    return lift
+
+
+def _build_exponent(decoder):
+    def lift(il, instruction, values):
+        il.append(il.intrinsic(["R2"], "exp", [il.reg(2, "R4")]))
+    return lift
+
+
+def _build_multiply(decoder):
+    rd_index, rs_index, s_index = (decoder.field_index[name] for name in ("Rd", "Rs", "S"))
+
+    def lift(il, instruction, values):
+        a, b = il.reg(2, values[rd_index]), il.reg(2, values[rs_index])
+        if values[s_index] == "uu":
+            product = il.mult_double_prec_unsigned(2, a, b)
+        else:
+            product = il.mult_double_prec_signed(2, a, b)
+        il.append(il.set_reg_split(2, "R4", "R3", product))
+    return lift
+
+
+def _build_multiply_accumulate(decoder):
+    rd_index, rs_index, size_index = (decoder.field_index[name] for name in ("Rd", "Rs", "Size"))
+
+    def lift(il, instruction, values):
+        il.append(il.intrinsic(["R4", "R3"], "muls", [
+            _data_address(il, il.reg(2, values[rd_index]), False),
+            _data_address(il, il.reg(2, values[rs_index]), False),
+            il.const(1, values[size_index]),
+        ]))
+    return lift
+
+
+def _build_shift(decoder):
+    rd_index, lsft_index, rs_index = (decoder.field_index[name] for name in ("Rd", "LSFT", "Rs"))
+    operations = {"ASR": "arith_shift_right", "LSR": "logical_shift_right", "SHL": "shift_left", "ROL": "rotate_left"}
+
+    def lift(il, instruction, values):
+        operation = operations.get(values[lsft_index])
+        if operation is None:
+            il.append(il.unimplemented())
+            return
+        rd = values[rd_index]
+        value = getattr(il, operation)(2, il.reg(2, rd), il.reg(2, values[rs_index]), flags="nz")
+        _set_register(il, rd, value)
+    return lift
+
+
+def _build_bit_operation(decoder):
+    """Lift TSTB/SETB/CLRB/INVB on a register or a memory word.
+
+    The bit is a constant offset or the value of Rs. Every form sets Z from
+    the bit's previous value; all but TSTB write the word back. The word and
+    the bit mask are used twice, so they are kept in temporary registers.
+    """
+    index = decoder.field_index
+    bitop_index = index["Bitop"]
+    rd_index = index.get("Rd")
+    d_index = index.get("D")
+    a16_index = index.get("A16")
+    offset_index = index.get("Offset")
+    rs_index = index.get("Rs")
+    in_memory = decoder.name.startswith("Memory")
+
+    def lift(il, instruction, values):
+        if offset_index is not None:
+            bit = il.const(2, 1 << values[offset_index])
+        else:
+            bit = il.shift_left(2, il.const(2, 1), il.reg(2, values[rs_index]))
+
+        if in_memory:
+            offset = il.const(2, values[a16_index]) if a16_index is not None else il.reg(2, values[rd_index])
+            address = _data_address(il, offset, bool(values[d_index]))
+            word = il.load(2, address)
+        else:
+            word = il.reg(2, values[rd_index])
+
+        # LLIL expressions cannot be reused, so each use reads the temporaries again
+        il.append(il.set_reg(2, LLIL_TEMP(0), word))
+        il.append(il.set_reg(2, LLIL_TEMP(1), bit))
+        il.append(il.set_flag("Z", il.compare_equal(2, il.and_expr(2, il.reg(2, LLIL_TEMP(0)), il.reg(2, LLIL_TEMP(1))),
+                                                    il.const(2, 0))))
+
+        bitop = values[bitop_index]
+        word = il.reg(2, LLIL_TEMP(0))
+        bit = il.reg(2, LLIL_TEMP(1))
+        if bitop == "SETB":
+            value = il.or_expr(2, word, bit)
+        elif bitop == "CLRB":
+            value = il.and_expr(2, word, il.not_expr(2, bit))
+        elif bitop == "INVB":
+            value = il.xor_expr(2, word, bit)
+        else:
+            return
+
+        if in_memory:
+            # The address is rebuilt for the same reason
+            offset = il.const(2, values[a16_index]) if a16_index is not None else il.reg(2, values[rd_index])
+            il.append(il.store(2, _data_address(il, offset, bool(values[d_index])), value))
+        else:
+            _set_register(il, values[rd_index], value)
+    return lift
+
+
+def _build_simple(expression):
+    def build(decoder):
+        def lift(il, instruction, values):
+            il.append(getattr(il, expression)())
+        return lift
+    return build
+
+
+# Instruction name -> lifter builder
+_BUILDERS = {
+    "DSI6": _build_data_segment_immediate,
+    "CALL": _build_call,
+    "CALLR": _build_call,
+    "JMPF": _build_jump_far,
+    "JMPR": _build_jump_register,
+    "DS Access": _build_special_access("DS"),
+    "FR Access": _build_special_access("FR"),
+    "BREAK": _build_simple("breakpoint"),
+    "NOP": _build_simple("nop"),
+    "DIVS": _build_divide,
+    "DIVQ": _build_divide,
+    "EXP": _build_exponent,
+    "MUL": _build_multiply,
+    "MULS": _build_multiply_accumulate,
+    "Register BITOP": _build_bit_operation,
+    "Memory BITOP": _build_bit_operation,
+    "16 bits Shift": _build_shift,
+    "RETI": _build_return,
+    "RETF": _build_return,
+    "Base+Disp6": _build_alu_memory,
+    "IMM6": _build_alu_immediate,
+    "Branch": _build_branch,
+}
+_BUILDERS.update((name, _build_mode_toggle) for name in _MODE_TOGGLES)
+
+
+def _lift_unimplemented(il, instruction, values):
+    il.append(il.unimplemented())
+
+
+def build_lifters(decoders):
+    """Build the lifting function of every instruction, indexed like the decoders.
+
+    Args:
+        decoders: The compiled decoders of the instruction set
+
+    Returns:
+        A list of functions taking (il, instruction, mapped operand values)
+    """
+    return [_BUILDERS[decoder.name](decoder) if decoder.name in _BUILDERS else _lift_unimplemented
+            for decoder in decoders]
+
+
+def lift_signed_flag(arch, op, size, operands, il):
+    """Compute S: signed less-than for subtractions, the result's sign otherwise."""
+    if op in (LowLevelILOperation.LLIL_SUB, LowLevelILOperation.LLIL_SBB) and len(operands) >= 2:
+        left, right = (il.const(size, operand) if isinstance(operand, int) else il.reg(size, operand)
+                       for operand in operands[:2])
+        return il.compare_signed_less_than(size, left, right)
+    return arch.get_default_flag_write_low_level_il(op, size, FlagRole.NegativeSignFlagRole, operands, il)
@@ -0,0 +1,178 @@
+"""
+BinaryView for Bitzee/GPCE flash dumps.
+
+unSP addresses 16-bit words over a 22-bit space. As in the disassembler,
+addresses in the view are byte addresses (twice the word address), and a dump
+is laid out so that the word at word address N is word N of the file. The
+first 0x4000 words are taken by RAM and I/O registers, which shadow the start
+of the dump; ROM follows up to the end of the dump.
+
+The dump is not copied into the view. Reads are forwarded to the parent view
+at the same offset (byte addresses are file offsets), so only the pages
+analysis touches are ever loaded, and databases, moved originals and
+transformed containers work alike.
+"""
+
+import bisect
+import struct
+
+from binaryninja.architecture import Architecture
+from binaryninja.binaryview import BinaryView
+from binaryninja.enums import Endianness, SectionSemantics, SegmentFlag, SymbolType
+from binaryninja.types import Symbol
+
+from unsp_analysis import VECTORS
+
+# Memory map in word addresses: (name, start, end, backed by the dump)
+WORD_MEMORY_MAP = (
+    ("RAM", 0x000000, 0x002800, False),
+    ("IO", 0x002800, 0x004000, False),
+    ("ROM", 0x004000, 0x400000, True),
+)
+
+# The same map in byte addresses, computed once
+_BYTE_MEMORY_MAP = tuple((name, 2 * start, 2 * end, backed) for name, start, end, backed in WORD_MEMORY_MAP)
+_REGION_STARTS = [start for _, start, _, _ in _BYTE_MEMORY_MAP]
+_ROM_START = _BYTE_MEMORY_MAP[-1][1]
+
+# Size limits of a recognized dump: it must reach the end of the vector table,
+# and the 22-bit space bounds the ROM. Trimmed dumps are accepted.
+MIN_IMAGE_SIZE = 2 * (max(VECTORS.values()) + 1)
+MAX_IMAGE_SIZE = 2 * 0x400000
+
+_SEGMENT_FLAGS = {
+    "RAM": SegmentFlag.SegmentReadable | SegmentFlag.SegmentWritable | SegmentFlag.SegmentContainsData,
+    "IO": SegmentFlag.SegmentReadable | SegmentFlag.SegmentWritable | SegmentFlag.SegmentContainsData,
+    "ROM": SegmentFlag.SegmentReadable | SegmentFlag.SegmentExecutable | SegmentFlag.SegmentContainsCode
+    | SegmentFlag.SegmentContainsData,
+}
+_SECTION_SEMANTICS = {
+    "RAM": SectionSemantics.ReadWriteDataSectionSemantics,
+    "IO": SectionSemantics.ReadWriteDataSectionSemantics,
+    "ROM": SectionSemantics.ReadOnlyCodeSectionSemantics,
+}
+
+
+def _looks_like_dump(length: int, read_word) -> bool:
+    """Check the size of a dump and that all of its vectors point into ROM."""
+    if length < MIN_IMAGE_SIZE or length > MAX_IMAGE_SIZE:
+        return False
+    _, rom_start, rom_end, _ = WORD_MEMORY_MAP[-1]
+    return all(rom_start <= read_word(2 * vector) < rom_end for vector in VECTORS.values())
+
+
+class BitzeeView(BinaryView):
+    name = "Bitzee"
+    long_name = "Bitzee/GPCE unSP flash image"
+
+    @classmethod
+    def is_valid_for_data(cls, data):
+        length = len(data)
+
+        def read_word(offset):
+            return struct.unpack("<H", data.read(offset, 2))[0]
+
+        return _looks_like_dump(length, read_word)
+
+    def __init__(self, data):
+        BinaryView.__init__(self, parent_view=data, file_metadata=data.file)
+        self.raw = data
+
+    def init(self):
+        self.arch = Architecture["unSP"]
+        self.platform = self.arch.standalone_platform
+
+        dump_end = self._dump_end()
+        for name, start, end, backed in _BYTE_MEMORY_MAP:
+            if backed:
+                end = max(start, dump_end)
+            length = end - start
+            if length == 0:
+                continue
+            self.add_auto_segment(start, length, start if backed else 0, length if backed else 0,
+                                  _SEGMENT_FLAGS[name])
+            self.add_auto_section(name, start, length, _SECTION_SEMANTICS[name])
+
+        handlers = set()
+        for name, vector in VECTORS.items():
+            address = 2 * vector
+            self.define_auto_symbol(Symbol(SymbolType.DataSymbol, address, f"{name}_vector"))
+            handler = 2 * self._read_word(address)
+            # Unused vectors point at a shared default handler or at erased flash
+            if handler in handlers or not self.perform_is_offset_executable(handler):
+                continue
+            handlers.add(handler)
+            self.define_auto_symbol(Symbol(SymbolType.FunctionSymbol, handler, f"{name.lower()}_handler"))
+            if name == "RESET":
+                self.add_entry_point(handler)
+            else:
+                self.add_function(handler)
+        return True
+
+    def _dump_end(self) -> int:
+        """Return the end of the dump (data beyond the 22-bit space is ignored)."""
+        return min(len(self.parent_view), MAX_IMAGE_SIZE)
+
+    def _read_word(self, address: int) -> int:
+        return struct.unpack_from("<H", self.perform_read(address, 2).ljust(2, b"\0"))[0]
+
+    def _region(self, address: int):
+        """Return the memory map entry containing a byte address, or None."""
+        index = bisect.bisect_right(_REGION_STARTS, address) - 1
+        if index < 0:
+            return None
+        region = _BYTE_MEMORY_MAP[index]
+        end = self._dump_end() if region[3] else region[2]
+        return region if address < end else None
+
+    def perform_read(self, addr, length):
+        dump_end = self._dump_end()
+        if _ROM_START <= addr and addr + length <= dump_end:
+            return self.parent_view.read(addr, length)
+
+        result = bytearray()
+        while length > 0:
+            region = self._region(addr)
+            if region is None:
+                break
+            _, _, end, backed = region
+            if backed:
+                end = dump_end
+            count = min(length, end - addr)
+            # RAM and I/O have no contents in a dump
+            result += self.parent_view.read(addr, count) if backed else bytes(count)
+            addr += count
+            length -= count
+        return bytes(result)
+
+    def perform_is_valid_offset(self, addr):
+        return self._region(addr) is not None
+
+    def perform_is_offset_readable(self, addr):
+        return self._region(addr) is not None
+
+    def perform_is_offset_writable(self, addr):
+        region = self._region(addr)
+        return region is not None and not region[3]
+
+    def perform_is_offset_executable(self, addr):
+        region = self._region(addr)
+        return region is not None and region[3]
+
+    def perform_get_start(self):
+        return 0
+
+    def perform_get_length(self):
+        return max(self._dump_end(), _ROM_START)
+
+    def perform_get_entry_point(self):
+        return 2 * self._read_word(2 * VECTORS["RESET"])
+
+    def perform_is_executable(self):
+        return True
+
+    def perform_get_default_endianness(self):
+        return Endianness.LittleEndian
+
+    def perform_get_address_size(self):
+        return 4